@@ -0,0 +1,119 @@
+# bench_acheter.py
+
+# -------------------------------
+# Concurrency benchmark for the /acheter purchase path
+# -------------------------------
+# Fires N simultaneous single-unit purchases against one stock row, first with
+# the old read-then-write path, then with the conditional decrement used by
+# /acheter. Runs against a scratch `bench_stock` table, never the real stock.
+#
+#   python bench/bench_acheter.py --buyers 500 --stock 200
+import argparse
+import asyncio
+import os
+import time
+
+import aiomysql
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+async def legacy_purchase(pool, item_id, qty, buyer_id):
+    """Old /acheter: SELECT, check in Python, UPDATE with the computed value, second checkout for the email."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT item, size, quantity, prix FROM bench_stock WHERE id = %s", (item_id,))
+            item, size, stock_qty, prix = await cur.fetchone()
+            if qty > stock_qty:
+                return False
+            await cur.execute("UPDATE bench_stock SET quantity = %s WHERE id = %s", (stock_qty - qty, item_id))
+
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT email FROM users WHERE discord_id = %s", (buyer_id,))
+            await cur.fetchone()
+    return True
+
+
+async def atomic_purchase(pool, item_id, qty, buyer_id):
+    """Current /acheter: conditional decrement + item/email lookup on one checkout."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "UPDATE bench_stock SET quantity = quantity - %s WHERE id = %s AND quantity >= %s",
+                (qty, item_id, qty)
+            )
+            bought = cur.rowcount == 1
+            await cur.execute(
+                """
+                SELECT s.item, s.size, s.quantity, s.prix, u.email
+                FROM bench_stock s
+                LEFT JOIN users u ON u.discord_id = %s
+                WHERE s.id = %s
+                """,
+                (buyer_id, item_id)
+            )
+            await cur.fetchone()
+    return bought
+
+
+async def run(pool, purchase, buyers, stock):
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("DELETE FROM bench_stock")
+            await cur.execute(
+                "INSERT INTO bench_stock (id, item, size, quantity, prix) VALUES (1, 'Maillot', 'M', %s, 50.00)",
+                (stock,)
+            )
+
+    start   = time.perf_counter()
+    results = await asyncio.gather(*(purchase(pool, 1, 1, buyer) for buyer in range(buyers)))
+    elapsed = time.perf_counter() - start
+
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT quantity FROM bench_stock WHERE id = 1")
+            (left,) = await cur.fetchone()
+
+    sold = sum(results)
+    print(f"{purchase.__name__:<16} confirmed={sold:<5} stock_left={left:<5} "
+          f"oversold={max(0, sold - (stock - left)):<5} "
+          f"elapsed={elapsed * 1000:8.1f} ms  throughput={buyers / elapsed:8.1f} achats/s")
+    return sold, left
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Concurrency benchmark for /acheter")
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--stock", type=int, default=200)
+    parser.add_argument("--pool", type=int, default=20, help="pool maxsize")
+    args = parser.parse_args()
+
+    pool = await aiomysql.create_pool(
+        user=os.getenv("DB_USER", "discord_bot"),
+        password=os.getenv("DB_PASS"),
+        unix_socket=os.getenv("DB_SOCKET", "/var/run/mysqld/mysqld-bot.sock"),
+        db=os.getenv("DB_NAME", "team_inventory"),
+        autocommit=True,
+        maxsize=args.pool,
+    )
+    try:
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("CREATE TABLE IF NOT EXISTS bench_stock LIKE stock")
+
+        await run(pool, legacy_purchase, args.buyers, args.stock)
+        sold, left = await run(pool, atomic_purchase, args.buyers, args.stock)
+        assert sold == min(args.buyers, args.stock) and sold + left == args.stock, "oversell detected"
+        print("✅ conditional decrement: no oversell")
+    finally:
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("DROP TABLE IF EXISTS bench_stock")
+        pool.close()
+        await pool.wait_closed()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
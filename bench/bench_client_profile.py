@@ -0,0 +1,172 @@
+# bench_client_profile.py
+
+# -------------------------------
+# Memory / startup benchmark for the gateway client profile
+# -------------------------------
+# Builds the client the bot used to run (commands.Bot, default intents +
+# message_content, default caches) and the lean one from discordbot.py, then
+# feeds both the same synthetic gateway traffic: one GUILD_CREATE per guild
+# (the startup burst), then channel chatter. Each client only parses the
+# events its intents would make Discord send. No network, no token.
+#
+# Timings run under tracemalloc, so compare them with each other, not with
+# production numbers.
+#
+#   python bench/bench_client_profile.py --guilds 5 --members 200 --messages 20000
+import argparse
+import asyncio
+import gc
+import random
+import time
+import tracemalloc
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+
+
+def legacy_client():
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.dm_messages = True
+    return commands.Bot(command_prefix="!", intents=intents, help_command=None)
+
+
+def lean_client():
+    # Mirrors the client built in discordbot.py
+    intents = discord.Intents.none()
+    intents.guilds = True
+    client = discord.Client(
+        intents=intents,
+        max_messages=None,
+        member_cache_flags=discord.MemberCacheFlags.none(),
+        chunk_guilds_at_startup=False,
+    )
+    client.tree = app_commands.CommandTree(client)
+    return client
+
+
+PROFILES = {"legacy": legacy_client, "lean": lean_client}
+
+
+# -------------------------------
+# Synthetic gateway payloads
+# -------------------------------
+def snowflake(n):
+    return str(100_000_000_000_000_000 + n)
+
+
+def user_payload(uid):
+    return {"id": snowflake(uid), "username": f"user{uid}", "discriminator": "0", "avatar": None, "global_name": None}
+
+
+def guild_payload(gid, channels, members):
+    base = gid * 100_000
+    return {
+        "id": snowflake(base),
+        "name": f"guild {gid}",
+        "owner_id": snowflake(base + 1),
+        "member_count": members,
+        "roles": [{"id": snowflake(base), "name": "@everyone", "permissions": "0", "position": 0,
+                   "color": 0, "hoist": False, "managed": False, "mentionable": False}],
+        "channels": [
+            {"id": snowflake(base + 10 + c), "type": 0, "name": f"salon-{c}", "position": c,
+             "permission_overwrites": [], "guild_id": snowflake(base)}
+            for c in range(channels)
+        ],
+        # Without the members intent Discord only sends a handful of members
+        # here; a cache that keeps them still grows with the chatter below
+        "members": [
+            {"user": user_payload(base + 1000 + m), "roles": [], "joined_at": "2024-01-01T00:00:00+00:00",
+             "deaf": False, "mute": False, "flags": 0}
+            for m in range(members)
+        ],
+        "emojis": [], "stickers": [], "threads": [], "voice_states": [], "presences": [],
+        "features": [], "unavailable": False, "large": members > 250,
+    }
+
+
+def message_payload(n, gid, channels, members):
+    base = gid * 100_000
+    author = base + 1000 + random.randrange(members)
+    return {
+        "id": snowflake(10_000_000 + n),
+        "channel_id": snowflake(base + 10 + random.randrange(channels)),
+        "guild_id": snowflake(base),
+        "author": user_payload(author),
+        "member": {"roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0},
+        "content": "salut l'équipe, quelqu'un a vu les clés du local ? " * 2,
+        "timestamp": "2026-01-01T12:00:00+00:00",
+        "edited_timestamp": None,
+        "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [],
+        "attachments": [], "embeds": [], "pinned": False, "type": 0,
+    }
+
+
+def typing_payload(msg):
+    return {"channel_id": msg["channel_id"], "guild_id": msg["guild_id"],
+            "user_id": msg["author"]["id"], "timestamp": 1767268800, "member": {**msg["member"], "user": msg["author"]}}
+
+
+# -------------------------------
+# Run
+# -------------------------------
+async def run(profile, args):
+    random.seed(0)
+    gc.collect()
+    tracemalloc.start()
+
+    started = time.perf_counter()
+    client  = PROFILES[profile]()
+    state   = client._connection
+    await client._async_setup_hook()    # binds the loop, as login() does
+    build_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for gid in range(args.guilds):
+        state.parse_guild_create(guild_payload(gid, args.channels, args.members))
+    startup_s = time.perf_counter() - started
+
+    # Message-ish events only reach clients holding the matching intents
+    wants_messages = client.intents.guild_messages
+    wants_typing   = client.intents.guild_typing
+    parsed, traffic_s = 0, 0.0
+    for n in range(args.messages):
+        msg = message_payload(n, n % args.guilds, args.channels, args.members)
+        started = time.perf_counter()
+        if wants_messages:
+            state.parse_message_create(msg)
+            parsed += 1
+        if wants_typing and n % 3 == 0:
+            state.parse_typing_start(typing_payload(msg))
+            parsed += 1
+        if n % 500 == 0:
+            await asyncio.sleep(0)      # let the dispatched handlers (prefix parsing) run
+        traffic_s += time.perf_counter() - started
+
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    cached = len(state._messages) if state._messages is not None else 0
+    members = sum(len(g._members) for g in client.guilds)
+    print(f"{profile:>7}: build {build_s * 1000:7.1f} ms | startup burst {startup_s * 1000:7.1f} ms | "
+          f"{parsed:6d} events parsed in {traffic_s * 1000:7.1f} ms | "
+          f"held {current / 1024 / 1024:6.2f} MiB (peak {peak / 1024 / 1024:6.2f} MiB) | "
+          f"{cached} messages, {members} members, {len(state._users)} users cached")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare the legacy and lean gateway client profiles")
+    parser.add_argument("--guilds", type=int, default=3)
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--members", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+
+    for profile in PROFILES:
+        await run(profile, args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,356 @@
+# loadtest.py
+
+# -------------------------------
+# Load-testing harness: fake interactions, throwaway database
+# -------------------------------
+# Runs the real command callbacks from `discordbot.bot.tree` (and the
+# /validation buttons) with fake Interaction objects that record every
+# response instead of calling Discord. N virtual users run a weighted mix of
+# scenarios for a fixed duration; the report gives throughput and p50 / p95 /
+# p99 latency per scenario, time to first response, and how often the
+# auto-defer guard fired.
+#
+# The database is a throwaway MySQL schema (never the bot's DB_NAME) or a
+# temporary SQLite file: the migrations create the tables, the harness wipes
+# them and seeds users, stock and receipts. The mail outbox only enqueues, owner
+# DMs go to fake channels.
+#
+#   python bench/loadtest.py --backend sqlite --concurrency 50 --duration 30     # nothing to set up
+#   python bench/loadtest.py --db-name bot_loadtest --concurrency 50 --duration 30 \
+#       --mix stock=40 contact=15 acheter=10 recu_info=15 recu_inspect=10 recus_admin=1 validation=2 validation_click=7
+#
+# MySQL needs a server where DB_USER may create tables in --db-name.
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+load_dotenv()
+
+# A throwaway receipt store, before the bot module reads RECEIPTS_DIR
+os.environ.setdefault("RECEIPTS_DIR", tempfile.mkdtemp(prefix="loadtest-receipts-"))
+
+import discordbot  # noqa: E402
+from metrics import metrics  # noqa: E402
+from storage import BACKENDS, open_storage  # noqa: E402
+
+# 1x1 transparent PNG, shared by every seeded receipt (content-addressed)
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+# -------------------------------
+# Fake Discord objects
+# -------------------------------
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+        self.last_view = None
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append((content, kwargs))
+        if kwargs.get("view") is not None:
+            self.last_view = kwargs["view"]
+
+
+class FakeUser:
+    def __init__(self, discord_id, name):
+        self.id           = discord_id
+        self.name         = name
+        self.display_name = name
+        self.mention      = f"<@{discord_id}>"
+        self.dm           = FakeChannel()
+
+    async def create_dm(self):
+        return self.dm
+
+
+class FakeDMClient:
+    """Stands in for the bot in OwnerNotifier: summary DMs land in fake channels."""
+
+    def __init__(self):
+        self.channels = defaultdict(FakeChannel)
+
+    def get_user(self, user_id):
+        return None
+
+    async def create_dm(self, user):
+        return self.channels[user.id]
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def _respond(self, kind, content=None, **kwargs):
+        if self._done:
+            raise RuntimeError("interaction already responded")
+        self._done = True
+        self._interaction.record(kind, content, kwargs)
+
+    async def send_message(self, content=None, **kwargs):
+        await self._respond("send_message", content, **kwargs)
+
+    async def defer(self, **kwargs):
+        await self._respond("defer", **kwargs)
+
+    async def edit_message(self, **kwargs):
+        await self._respond("edit_message", **kwargs)
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        self._interaction.record("followup", content, kwargs)
+
+
+class FakeInteraction:
+    """The parts of discord.Interaction the command callbacks use."""
+
+    def __init__(self, user, command=None):
+        self.user      = user
+        self.command   = command
+        self.channel   = user.dm
+        self.guild_id  = None
+        self.extras    = {"started": time.perf_counter()}
+        self.response  = FakeResponse(self)
+        self.followup  = FakeFollowup(self)
+        self.calls     = []
+        self.first_at  = None
+
+    def record(self, kind, content, kwargs):
+        if self.first_at is None:
+            self.first_at = time.perf_counter()
+        self.calls.append((kind, content, kwargs))
+
+    async def edit_original_response(self, **kwargs):
+        self.record("edit_original_response", None, kwargs)
+
+
+# -------------------------------
+# Harness
+# -------------------------------
+class Harness:
+    def __init__(self, users, admins, item_ids, receipt_ids):
+        self.users       = users
+        self.admins      = admins
+        self.item_ids    = item_ids
+        self.receipt_ids = receipt_ids
+        self.latency     = defaultdict(list)
+        self.ack         = defaultdict(list)
+        self.errors      = defaultdict(int)
+
+    async def command(self, name, user, **params):
+        command = discordbot.bot.tree.get_command(name)
+        interaction = FakeInteraction(user, command)
+        await discordbot.bot.tree.interaction_check(interaction)
+        await command.callback(interaction, **params)
+        return interaction
+
+    async def click(self, admin):
+        # Accept the receipt currently shown in this admin's DM, if any
+        view = admin.dm.last_view
+        if view is None:
+            return await self.command("validation", admin)
+        button = next(item for item in view.children if item.custom_id.startswith("recu:accept:"))
+        admin.dm.last_view = None
+        interaction = FakeInteraction(admin)
+        await button.callback(interaction)
+        return interaction
+
+    def scenarios(self):
+        rnd = random.Random()
+        return {
+            "stock":            lambda: self.command("stock", rnd.choice(self.users)),
+            "contact":          lambda: self.command("contact", rnd.choice(self.users)),
+            "contact_table":    lambda: self.command("contact_table", rnd.choice(self.users)),
+            "acheter":          lambda: self.command("acheter", rnd.choice(self.users), id=rnd.choice(self.item_ids), quantité=1),
+            "recu_info":        lambda: self.command("recu_info", rnd.choice(self.users)),
+            "recu_inspect":     lambda: self.command("recu_inspect", rnd.choice(self.admins), id=rnd.choice(self.receipt_ids)),
+            "recus_admin":      lambda: self.command("recus_admin", rnd.choice(self.admins)),
+            "stats":            lambda: self.command("stats", rnd.choice(self.admins)),
+            "validation":       lambda: self.command("validation", rnd.choice(self.admins)),
+            "validation_click": lambda: self.click(rnd.choice(self.admins)),
+        }
+
+    async def virtual_user(self, mix, deadline):
+        scenarios = self.scenarios()
+        names, weights = zip(*mix.items())
+        while time.perf_counter() < deadline:
+            name = random.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                interaction = await scenarios[name]()
+            except Exception as e:
+                self.errors[name] += 1
+                if self.errors[name] == 1:
+                    print(f"⚠️  {name}: {type(e).__name__}: {e}")
+                continue
+            self.latency[name].append(time.perf_counter() - started)
+            if interaction.first_at is not None:
+                self.ack[name].append(interaction.first_at - started)
+
+    def report(self, elapsed):
+        print(f"\n{'scénario':<17}{'n':>7}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ack p95':>10}{'err':>6}")
+        total = 0
+        for name in sorted(set(self.latency) | set(self.errors)):
+            samples = sorted(self.latency[name])
+            total += len(samples)
+            p50, p95, p99 = percentiles(samples)
+            ack95 = percentiles(sorted(self.ack[name]))[1]
+            print(f"{name:<17}{len(samples):>7}{len(samples) / elapsed:>9.1f}"
+                  f"{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}{p99 * 1000:>10.1f}{ack95 * 1000:>10.1f}{self.errors[name]:>6}")
+        print(f"{'total':<17}{total:>7}{total / elapsed:>9.1f}")
+
+        deferred = metrics.counters.get("auto_defer", {})
+        if deferred:
+            print("\nAuto-defer: " + ", ".join(f"{dict(key)['command']}={n}" for key, n in deferred.items()))
+
+
+def percentiles(samples):
+    if not samples:
+        return 0.0, 0.0, 0.0
+    if len(samples) == 1:
+        return samples[0], samples[0], samples[0]
+    q = statistics.quantiles(samples, n=100, method="inclusive")
+    return q[49], q[94], q[98]
+
+
+async def execute(storage, sql, rows=None, *, fetch=False):
+    """Run seeding SQL (%s placeholders) on either backend."""
+    if storage.backend == "sqlite":
+        sql = sql.replace("%s", "?")
+        if fetch:
+            return await storage.db.fetchall(sql)
+        if rows is None:
+            return await storage.db.execute(sql)
+        return await storage.db.executemany(sql, rows)
+
+    async with storage.db.acquire() as conn:
+        async with conn.cursor() as cur:
+            if rows is None:
+                await cur.execute(sql)
+            else:
+                await cur.executemany(sql, rows)
+            if fetch:
+                return await cur.fetchall()
+
+
+async def seed(storage, args):
+    rnd = random.Random(args.seed)
+    digest, size = discordbot.bot.receipts.put_bytes(PNG)
+    for table in ("factures", "stock", "users", "mail_outbox"):
+        await execute(storage, f"DELETE FROM {table}")
+
+    users = [(10_000 + i, f"Prénom{i}", f"Nom{i}", f"418-555-{i:04d}", f"user{i}@example.test",
+              "ADMIN" if i < args.admins else "MEMBER") for i in range(args.users)]
+    await execute(
+        storage,
+        "INSERT INTO users (discord_id, first_name, last_name, tel, email, role) VALUES (%s, %s, %s, %s, %s, %s)",
+        users
+    )
+    await execute(
+        storage,
+        "INSERT INTO stock (item, size, quantity, prix) VALUES (%s, %s, %s, %s)",
+        [(f"Article {i // 4}", ("S", "M", "L", "XL")[i % 4], 1_000_000, 25 + i % 40) for i in range(args.items)]
+    )
+    now = datetime.now().replace(microsecond=0)
+    await execute(
+        storage,
+        """
+        INSERT INTO factures (discord_id, amount, description, state, image_sha256, image_size, image_mime, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, 'image/png', %s)
+        """,
+        [(rnd.choice(users)[0], rnd.randint(5, 500), f"Reçu de test {i}",
+          rnd.choice(("pending", "pending", "accepted", "refused")), digest, size, now - timedelta(minutes=i))
+         for i in range(args.receipts)]
+    )
+    item_ids    = [row[0] for row in await execute(storage, "SELECT id FROM stock", fetch=True)]
+    receipt_ids = [row[0] for row in await execute(storage, "SELECT id FROM factures", fetch=True)]
+
+    all_users = [FakeUser(u[0], f"{u[1]} {u[2]}") for u in users]
+    return Harness(all_users, all_users[:args.admins], item_ids, receipt_ids)
+
+
+def parse_mix(entries):
+    mix = {}
+    for entry in entries:
+        name, _, weight = entry.partition("=")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test the bot's commands with fake interactions")
+    parser.add_argument("--backend", choices=BACKENDS, default=os.getenv("DB_BACKEND", "mysql"))
+    parser.add_argument("--sqlite-path", help="SQLite file (default: a temporary one), wiped and reseeded")
+    parser.add_argument("--db-name", default="bot_loadtest", help="throwaway MySQL schema, wiped and reseeded")
+    parser.add_argument("--db-socket", default=os.getenv("DB_SOCKET"))
+    parser.add_argument("--db-host", help="TCP instead of the unix socket")
+    parser.add_argument("--db-port", type=int, default=3306)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--admins", type=int, default=5)
+    parser.add_argument("--items", type=int, default=40)
+    parser.add_argument("--receipts", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mix", nargs="+", default=["stock=40", "contact=15", "acheter=10", "recu_info=15",
+                                                      "recu_inspect=10", "validation=2", "validation_click=8"])
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    if args.backend == "sqlite":
+        path = args.sqlite_path or os.path.join(tempfile.mkdtemp(prefix="loadtest-db-"), "bot.sqlite3")
+        storage = await open_storage("sqlite", path=path)
+    else:
+        if args.db_name == os.getenv("DB_NAME", "team_inventory"):
+            parser.error(f"--db-name {args.db_name} is the bot's database; use a throwaway schema")
+        overrides = {"db": args.db_name, "maxsize": int(os.getenv("DB_POOL_MAX", "10"))}
+        if args.db_host:
+            overrides.update(unix_socket=None, host=args.db_host, port=args.db_port)
+        elif args.db_socket:
+            overrides.update(unix_socket=args.db_socket)
+        storage = await open_storage("mysql", password=os.getenv("DB_PASS"), **overrides)
+
+    try:
+        # Migrations create the tables, then the harness reseeds them
+        await discordbot.init_services(storage, deliver_mail=False, dm_client=FakeDMClient())
+        harness = await seed(storage, args)
+        discordbot.bot.stock_cache.invalidate()
+        await discordbot.bot.directory.load()
+        discordbot.bot.roles.invalidate()
+        await discordbot.bot.roles.warm()
+
+        print(f"🗄️   {storage.describe()}")
+        print(f"🏁  {args.concurrency} utilisateurs virtuels, {args.duration:.0f}s, mix {mix}")
+        started  = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(harness.virtual_user(mix, deadline) for _ in range(args.concurrency)))
+        harness.report(time.perf_counter() - started)
+    finally:
+        await discordbot.bot.notifier.close()
+        await discordbot.bot.outbox.stop()
+        await discordbot.bot.http_session.close()
+        await storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,182 @@
+# replay_interactions.py
+
+# -------------------------------
+# Replay signed sample interactions against the HTTP endpoint
+# -------------------------------
+# Signs sample payloads (PING, slash commands, a /validation button) with a
+# local Ed25519 key, the way Discord does, and POSTs them concurrently to an
+# interactions endpoint. Reports status codes and ACK latency.
+#
+#   python bench/replay_interactions.py keygen
+#       -> start the bot with INTERACTIONS_MODE=http INTERACTIONS_PUBLIC_KEY=<public>
+#   python bench/replay_interactions.py replay --key <private> --url http://127.0.0.1:8080/interactions
+#   python bench/replay_interactions.py local      # in-process server, no bot / DB / network
+#
+# `local` runs InteractionServer with an empty command tree: it measures the
+# verify + ACK path only (the handlers log "command not found").
+# Needs PyNaCl.
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+import aiohttp
+import discord
+from discord import app_commands
+from nacl.signing import SigningKey
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interactions_http import InteractionServer  # noqa: E402
+
+APPLICATION_ID = "1363106545449304144"
+GUILD_ID       = "1000000000000000000"
+CHANNEL_ID     = "1000000000000000001"
+USER_ID        = "1000000000000000002"
+
+
+# -------------------------------
+# Sample payloads
+# -------------------------------
+def base_interaction(n, kind):
+    return {
+        "id": str(2_000_000_000_000_000_000 + n),
+        "application_id": APPLICATION_ID,
+        "type": kind,
+        "token": f"replay-token-{n}",
+        "version": 1,
+        "guild_id": GUILD_ID,
+        "channel_id": CHANNEL_ID,
+        "channel": {"id": CHANNEL_ID, "type": 0, "guild_id": GUILD_ID, "name": "général", "position": 0,
+                    "permission_overwrites": [], "nsfw": False, "parent_id": None, "permissions": "2147483647"},
+        "member": {
+            "user": {"id": USER_ID, "username": "replay", "discriminator": "0", "avatar": None, "global_name": None},
+            "roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0,
+            "permissions": "2147483647",
+        },
+        "app_permissions": "2147483647",
+        "locale": "fr",
+        "guild_locale": "fr",
+        "entitlements": [],
+        "authorizing_integration_owners": {},
+        "context": 0,
+    }
+
+
+def command(n, name, options=()):
+    payload = base_interaction(n, 2)
+    payload["data"] = {"id": str(3_000_000_000_000_000_000 + n), "name": name, "type": 1,
+                       "options": [{"name": k, "type": t, "value": v} for k, t, v in options]}
+    return payload
+
+
+def button(n, custom_id):
+    payload = base_interaction(n, 3)
+    payload["data"] = {"custom_id": custom_id, "component_type": 2}
+    payload["message"] = {
+        "id": str(4_000_000_000_000_000_000 + n), "channel_id": CHANNEL_ID, "type": 0, "content": "",
+        "author": {"id": APPLICATION_ID, "username": "bot", "discriminator": "0", "avatar": None},
+        "timestamp": "2026-01-01T12:00:00+00:00", "edited_timestamp": None, "tts": False,
+        "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [], "embeds": [],
+        "pinned": False, "flags": 0,
+        "components": [{"type": 1, "components": [{"type": 2, "style": 2, "label": "Skip", "custom_id": custom_id}]}],
+    }
+    return payload
+
+
+SAMPLES = {
+    "ping":       lambda n: {"id": str(n), "application_id": APPLICATION_ID, "type": 1, "token": "ping", "version": 1},
+    "stock":      lambda n: command(n, "stock"),
+    "contact":    lambda n: command(n, "contact"),
+    "acheter":    lambda n: command(n, "acheter", [("id", 4, 1), ("quantité", 4, 1)]),
+    "validation": lambda n: button(n, f"recu:skip:{n}"),
+}
+
+
+def sign(key, body):
+    timestamp = str(int(time.time()))
+    signature = key.sign(timestamp.encode() + body).signature.hex()
+    return {"X-Signature-Ed25519": signature, "X-Signature-Timestamp": timestamp, "Content-Type": "application/json"}
+
+
+# -------------------------------
+# Replay
+# -------------------------------
+async def replay(url, key, samples, requests, concurrency):
+    statuses, latencies = Counter(), []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(session, n):
+        body = json.dumps(SAMPLES[samples[n % len(samples)]](n)).encode()
+        async with semaphore:
+            started = time.perf_counter()
+            async with session.post(url, data=body, headers=sign(key, body)) as resp:
+                await resp.read()
+                latencies.append(time.perf_counter() - started)
+                statuses[resp.status] += 1
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(one(session, n) for n in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    print(f"{requests} requêtes en {elapsed:.2f}s ({requests / elapsed:.0f}/s), statuts {dict(statuses)}")
+    print(f"ACK p50 {q[49] * 1000:.2f} ms | p95 {q[94] * 1000:.2f} ms | p99 {q[98] * 1000:.2f} ms")
+
+
+async def local(args):
+    key    = SigningKey.generate()
+    client = discord.Client(intents=discord.Intents.none())
+    client.tree = app_commands.CommandTree(client)
+    await client._async_setup_hook()    # binds the loop, as login() does
+    client._connection.user = discord.ClientUser(
+        state=client._connection,
+        data={"id": APPLICATION_ID, "username": "bot", "discriminator": "0", "avatar": None, "bot": True},
+    )
+    server = InteractionServer(client, key.verify_key.encode().hex(), port=args.port)
+    await server.start()
+    try:
+        await replay(f"http://127.0.0.1:{args.port}/interactions", key, args.samples, args.requests, args.concurrency)
+
+        # A bad signature must be refused
+        async with aiohttp.ClientSession() as session:
+            body = json.dumps(SAMPLES["ping"](0)).encode()
+            headers = sign(SigningKey.generate(), body)
+            async with session.post(f"http://127.0.0.1:{args.port}/interactions", data=body, headers=headers) as resp:
+                print(f"Signature invalide -> {resp.status}")
+    finally:
+        await server.stop()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Replay signed sample interactions")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("keygen")
+    for name in ("replay", "local"):
+        p = sub.add_parser(name)
+        p.add_argument("--samples", nargs="+", choices=sorted(SAMPLES), default=["ping", "stock", "validation"])
+        p.add_argument("--requests", type=int, default=1000)
+        p.add_argument("--concurrency", type=int, default=50)
+    sub.choices["replay"].add_argument("--url", default="http://127.0.0.1:8080/interactions")
+    sub.choices["replay"].add_argument("--key", required=True, help="private key (hex) from keygen")
+    sub.choices["local"].add_argument("--port", type=int, default=8089)
+    args = parser.parse_args()
+
+    if args.command == "keygen":
+        key = SigningKey.generate()
+        print(f"private: {key.encode().hex()}")
+        print(f"public:  {key.verify_key.encode().hex()}")
+    elif args.command == "replay":
+        await replay(args.url, SigningKey(bytes.fromhex(args.key)), args.samples, args.requests, args.concurrency)
+    else:
+        await local(args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
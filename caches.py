@@ -0,0 +1,135 @@
+# caches.py
+
+# -------------------------------
+# In-process read caches
+# -------------------------------
+import asyncio
+import time
+from collections import OrderedDict
+
+from metrics import metrics
+
+
+class StockCache:
+    """Rows of `stock.in_stock()` and their rendered text, keyed by a data version.
+
+    Every write to `stock` calls `invalidate()`, which bumps the version; the
+    next read reloads from the DB once and re-renders once. Between writes
+    `/stock` never touches the DB nor re-formats anything.
+    """
+
+    def __init__(self, stock, render):
+        self.stock   = stock      # storage.stock
+        self.render  = render     # rows -> message text
+        self.version = 0
+        self._loaded = -1         # version the cached rows/text belong to
+        self._rows   = ()
+        self._text   = None
+        self._lock   = asyncio.Lock()
+
+    def invalidate(self):
+        self.version += 1
+
+    async def text(self) -> str:
+        if self._loaded == self.version:
+            metrics.inc("stock_cache_hits")
+            return self._text
+
+        async with self._lock:
+            # Another caller may have reloaded while we waited for the lock
+            if self._loaded != self.version:
+                metrics.inc("stock_cache_misses")
+                version = self.version
+                self._rows   = await self.stock.in_stock()
+                self._text   = self.render(self._rows)
+                # A write that landed during the SELECT bumped self.version past
+                # `version`, so the next call reloads again
+                self._loaded = version
+            return self._text
+
+
+class DirectoryCache:
+    """Team directory (`users` contact columns) with both renderings precomputed.
+
+    Loaded once at startup. `/update_tel` and `/update_mail` patch the single
+    affected entry in place, which bumps the version and re-renders; the
+    read commands only ever return the precomputed strings.
+    """
+
+    def __init__(self, users, renderers):
+        self.users     = users        # storage.users
+        self.renderers = renderers    # name -> (rows -> message text)
+        self.version   = 0
+        self._entries  = {}           # discord_id -> [first_name, last_name, tel, email], in display order
+        self._views    = {}
+
+    async def load(self):
+        rows = await self.users.directory()
+        self._entries = {discord_id: list(rest) for discord_id, *rest in rows}
+        self._rebuild()
+
+    def update(self, discord_id, *, tel=None, email=None):
+        entry = self._entries.get(discord_id)
+        if entry is None:
+            return
+        if tel is not None:
+            entry[2] = tel
+        if email is not None:
+            entry[3] = email
+        self._rebuild()
+
+    def name(self, discord_id) -> str:
+        entry = self._entries.get(discord_id)
+        return f"{entry[0]} {entry[1]}" if entry else str(discord_id)
+
+    def view(self, name) -> str:
+        metrics.inc("directory_cache_reads")
+        return self._views[name]
+
+    def _rebuild(self):
+        self.version += 1
+        rows = [tuple(entry) for entry in self._entries.values()]
+        self._views = {name: render(rows) for name, render in self.renderers.items()}
+
+
+class RoleCache:
+    """Bounded LRU of `users.role` per discord_id, entries expire after `ttl` seconds.
+
+    Unknown users are cached too (as None) so a non-member spamming an admin
+    command does not hit the DB either. Role edits are made by hand in the DB:
+    /roles_refresh calls `invalidate()` (one id or everything); with several
+    HTTP workers the others drop theirs on each cache refresh.
+    """
+
+    def __init__(self, users, maxsize=1024, ttl=300.0):
+        self.users   = users      # storage.users
+        self.maxsize = maxsize
+        self.ttl     = ttl
+        self._roles  = OrderedDict()    # discord_id -> (role, expires_at)
+
+    async def warm(self):
+        rows = await self.users.roles(self.maxsize)
+        expires = time.monotonic() + self.ttl
+        for discord_id, role in rows:
+            self._roles[discord_id] = (role, expires)
+
+    async def get(self, discord_id):
+        cached = self._roles.get(discord_id)
+        if cached is not None and cached[1] > time.monotonic():
+            self._roles.move_to_end(discord_id)
+            metrics.inc("role_cache_hits")
+            return cached[0]
+
+        metrics.inc("role_cache_misses")
+        role = await self.users.role(discord_id)
+        self._roles[discord_id] = (role, time.monotonic() + self.ttl)
+        self._roles.move_to_end(discord_id)
+        while len(self._roles) > self.maxsize:
+            self._roles.popitem(last=False)
+        return role
+
+    def invalidate(self, discord_id=None):
+        if discord_id is None:
+            self._roles.clear()
+        else:
+            self._roles.pop(discord_id, None)
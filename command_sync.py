@@ -0,0 +1,110 @@
+# command_sync.py
+
+# -------------------------------
+# Slash-command sync, only when the tree changed
+# -------------------------------
+# `tree.sync()` is a rate-limited REST call that replaces the whole command
+# set. The serialized tree is hashed and the hash of the last successful sync
+# is kept in a small JSON file (per application and per scope), so startups
+# and reconnects with an unchanged tree skip it.
+#
+# Guild scope (DEV_GUILD_ID) copies the global commands to one guild, where
+# changes show up instantly instead of after the global propagation delay.
+#
+#   python command_sync.py                 # force a sync of the configured scope
+#   python command_sync.py --guild <id>    # force a sync to one guild
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+
+import discord
+
+from metrics import metrics
+
+
+class CommandSync:
+    def __init__(self, tree, path):
+        self.tree = tree
+        self.path = path
+
+    def payload(self, guild=None) -> list:
+        commands = self.tree.get_commands(guild=guild)
+        return sorted((command.to_dict(self.tree) for command in commands), key=lambda c: (c["type"], c["name"]))
+
+    def digest(self, guild=None) -> str:
+        blob = json.dumps(self.payload(guild), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    async def sync(self, guild=None, *, force=False):
+        """Sync the global tree (or a copy of it to `guild`) if it changed since the last sync.
+
+        Returns the synced commands, or None when the stored hash matched.
+        """
+        if guild is not None:
+            self.tree.copy_global_to(guild=guild)
+
+        key    = f"{self.tree.client.application_id}:{guild.id if guild else 'global'}"
+        digest = self.digest(guild)
+        if not force and self._load().get(key) == digest:
+            metrics.inc("command_sync_skipped")
+            return None
+
+        synced = await self.tree.sync(guild=guild)
+        state = self._load()
+        state[key] = digest
+        self._save(state)
+        metrics.inc("command_sync_runs")
+        return synced
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, state):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+def default_path() -> str:
+    return os.getenv("COMMAND_SYNC_STATE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".command_sync.json"))
+
+
+def dev_guild():
+    guild_id = os.getenv("DEV_GUILD_ID")
+    return discord.Object(id=int(guild_id)) if guild_id else None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Force a slash-command sync without starting the bot")
+    parser.add_argument("--guild", type=int, help="sync to this guild instead of DEV_GUILD_ID / global")
+    args = parser.parse_args()
+
+    # The tree lives in the bot module; only its REST client is used here
+    from discordbot import TOKEN, bot
+
+    guild = discord.Object(id=args.guild) if args.guild else dev_guild()
+    await bot.http.static_login(TOKEN)
+    try:
+        bot._connection.application_id = (await bot.application_info()).id
+        synced = await CommandSync(bot.tree, default_path()).sync(guild, force=True)
+        scope  = f"guild {guild.id}" if guild else "global"
+        print(f"🔄  Synced {len(synced)} slash commands ({scope})")
+    finally:
+        await bot.http.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
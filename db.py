@@ -0,0 +1,148 @@
+# db.py
+
+# -------------------------------
+# MySQL connection pool
+# -------------------------------
+import contextlib
+import os
+import re
+import time
+
+import aiomysql
+
+from metrics import metrics
+from slow_queries import slow_queries
+
+
+def query_label(sql) -> str:
+    """Whitespace-collapsed statement, cut short: a stable, readable metrics label."""
+    text = re.sub(r"\s+", " ", sql).strip()
+    return text if len(text) <= 72 else text[:71] + "…"
+
+
+class TimedCursor(aiomysql.Cursor):
+    """Cursor that records every execute / executemany in `db_query_seconds{query=...}`
+    and hands it to the slow-query log."""
+
+    async def execute(self, query, args=None):
+        started = time.perf_counter()
+        try:
+            return await super().execute(query, args)
+        finally:
+            self._record(query, args, time.perf_counter() - started)
+
+    async def executemany(self, query, args):
+        started = time.perf_counter()
+        try:
+            return await super().executemany(query, args)
+        finally:
+            self._record(query, args, time.perf_counter() - started)
+
+    @staticmethod
+    def _record(query, args, seconds):
+        metrics.observe("db_query_seconds", seconds, query=query_label(query))
+        slow_queries.observe(query, args, seconds)
+
+
+class TimedSSCursor(TimedCursor, aiomysql.SSCursor):
+    """Unbuffered variant, for streaming big result sets (fetch time is not included)."""
+
+
+class Database:
+    """aiomysql pool with a liveness check on checkout.
+
+    `acquire()` is a drop-in replacement for `pool.acquire()`: a connection
+    that sat idle longer than `ping_after` seconds is pinged (and reconnected
+    if MySQL dropped it) before being handed out.
+    """
+
+    placeholder = "%s"
+
+    def __init__(self, pool, ping_after=30.0):
+        self.pool       = pool
+        self.ping_after = ping_after
+
+        metrics.gauge("db_pool_size",   lambda: self.pool.size)
+        metrics.gauge("db_pool_free",   lambda: self.pool.freesize)
+        metrics.gauge("db_pool_in_use", lambda: self.pool.size - self.pool.freesize)
+
+    @classmethod
+    async def create(cls, password, **overrides):
+        """Build the pool from the DB_* environment variables."""
+        options = dict(
+            user=os.getenv("DB_USER", "discord_bot"),
+            password=password,
+            unix_socket=os.getenv("DB_SOCKET", "/var/run/mysqld/mysqld-bot.sock"),
+            db=os.getenv("DB_NAME", "team_inventory"),
+            minsize=int(os.getenv("DB_POOL_MIN", "1")),
+            maxsize=int(os.getenv("DB_POOL_MAX", "10")),
+            # Recycle before MySQL's wait_timeout (8h by default) closes idle connections
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "3600")),
+            autocommit=True,
+            cursorclass=TimedCursor,
+        )
+        options.update(overrides)
+        pool = await aiomysql.create_pool(**options)
+        return cls(pool, ping_after=float(os.getenv("DB_PING_AFTER", "30")))
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        started = time.perf_counter()
+        async with self.pool.acquire() as conn:
+            metrics.observe("db_pool_wait_seconds", time.perf_counter() - started)
+            if conn.loop.time() - conn.last_usage > self.ping_after:
+                await conn.ping(reconnect=True)
+            yield conn
+
+    async def execute(self, sql, params=None) -> int:
+        """One statement on a pooled connection; returns the affected row count."""
+        async with self.acquire() as conn:
+            async with conn.cursor() as cur:
+                return await cur.execute(sql, params)
+
+    async def fetchall(self, sql, params=None):
+        async with self.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(sql, params)
+                return await cur.fetchall()
+
+    async def close(self):
+        self.pool.close()
+        await self.pool.wait_closed()
+
+
+class PinnedConnection:
+    """execute() / fetchall() like Database, on one connection already checked out
+    (e.g. the one holding a named lock)."""
+
+    placeholder = "%s"
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def execute(self, sql, params=None) -> int:
+        async with self.conn.cursor() as cur:
+            return await cur.execute(sql, params)
+
+    async def fetchall(self, sql, params=None):
+        async with self.conn.cursor() as cur:
+            await cur.execute(sql, params)
+            return await cur.fetchall()
+
+
+async def ensure_columns(db, table, columns):
+    """Add the missing `columns` (name -> DDL) to `table`. Returns the columns that existed before."""
+    rows = await db.fetchall(
+        """
+        SELECT COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """,
+        (table,)
+    )
+    existing = {name: (ctype, nullable) for name, ctype, nullable in rows}
+
+    for name, ddl in columns.items():
+        if name not in existing:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+    return existing
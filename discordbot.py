@@ -4,17 +4,37 @@
 # https://discord.com/api/oauth2/authorize?client_id=1363106545449304144&permissions=2147485696&scope=bot%20applications.commands
 
 import os, asyncio
-import subprocess
+import functools
+import multiprocessing
+import signal
+import tempfile
+from collections import defaultdict
 from datetime import datetime
 import discord
-from discord.ext import commands
-import aiomysql
+from discord import app_commands
+import aiohttp
 from dotenv import load_dotenv
 import io
 from discord import File, Embed, Interaction, ButtonStyle
 from discord.ui import View, button
 import logging
 import decimal
+from caches import DirectoryCache, RoleCache, StockCache
+from command_sync import CommandSync, default_path as command_sync_path, dev_guild
+import gateway_session
+from instrumentation import InstrumentedTree, rest_trace
+from interactions_http import serve as serve_interactions
+from metrics import metrics, start_server as start_metrics_server
+from notifier import OwnerNotifier
+from outbox import MailOutbox
+from prefetch import LookaheadCache
+from replies import auto_defer, defer, edit, reply
+from slow_queries import current_command, default_path as slow_query_path, slow_queries
+from receipt_store import (MIME_EXTENSIONS, ReceiptRejected, ReceiptStore, default_root,
+                           extension_for, sniff_mime, stream_to_store)
+from migrations import describe_plan
+from storage import open_storage
+from validation_queue import ReviewQueue
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -36,34 +56,143 @@ print("🔧  Starting bot …")
 # -------------------------------
 load_dotenv()
 TOKEN    = os.getenv("DISCORD_TOKEN")
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql")   # "mysql" or "sqlite" (SQLITE_PATH)
 DB_PASS  = os.getenv("DB_PASS")
-SOCKET   = "/var/run/mysqld/mysqld-bot.sock"
+SOCKET   = os.getenv("DB_SOCKET", "/var/run/mysqld/mysqld-bot.sock")
+RECU_MAX_BYTES = int(os.getenv("RECU_MAX_MB", "10")) * 1024 * 1024
+VALIDATION_PREFETCH       = int(os.getenv("VALIDATION_PREFETCH", "3"))
+VALIDATION_PREFETCH_BYTES = int(os.getenv("VALIDATION_PREFETCH_MB", "32")) * 1024 * 1024
+VALIDATION_BATCH          = int(os.getenv("VALIDATION_BATCH", "10"))
+VALIDATION_LEASE_SECONDS  = int(os.getenv("VALIDATION_LEASE_SECONDS", "900"))
+# "gateway" (websocket) or "http" (Discord POSTs interactions to our endpoint)
+INTERACTIONS_MODE    = os.getenv("INTERACTIONS_MODE", "gateway")
+INTERACTIONS_WORKERS = int(os.getenv("INTERACTIONS_WORKERS", "1"))
+WORKER_INDEX         = 0   # set in each forked HTTP worker
 
 # -------------------------------
 # Show diagnostic info
 # -------------------------------
-print("🔍 Trying to connect with socket:", SOCKET)
-print("🔍 DB_PASS (first 5 chars):", DB_PASS[:5])
-print("🔍 Socket exists:", os.path.exists(SOCKET))
+if DB_BACKEND == "mysql":
+    print("🔍 Trying to connect with socket:", SOCKET)
+    print("🔍 DB_PASS (first 5 chars):", DB_PASS[:5] if DB_PASS else None)
+    print("🔍 Socket exists:", os.path.exists(SOCKET))
 
 # -------------------------------
 # Bot setup
 # -------------------------------
-intents = discord.Intents.default()
-intents.message_content = True
-intents.dm_messages = True  # <-- Essential to send and manage DMs
-bot = commands.Bot(command_prefix="!", intents=intents, help_command=None)
+# Slash commands, buttons and outgoing DMs only: interactions arrive whatever
+# the intents, and sending a DM needs none. `guilds` keeps the guild/channel
+# cache interactions resolve against; no message, member or presence caches.
+intents = discord.Intents.none()
+intents.guilds = True
+bot = discord.Client(
+    intents=intents,
+    max_messages=None,
+    member_cache_flags=discord.MemberCacheFlags.none(),
+    chunk_guilds_at_startup=False,
+    http_trace=rest_trace(),    # REST timings and rate-limit hits in /stats and /metrics
+)
+bot.tree = InstrumentedTree(bot)
+
+# Restarts RESUME the previous gateway session when it was saved on shutdown
+gateway_session.install()
+bot.keep_gateway_session = False
+bot.saved_session = None
 
 
 # -------------------------------
 # Helper to see if user is admin
 # -------------------------------
 async def is_admin(discord_id: int) -> bool:
-    async with bot.db.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("SELECT role FROM users WHERE discord_id = %s", (discord_id,))
-            row = await cur.fetchone()
-            return row and row[0].upper() == "ADMIN"
+    role = await bot.roles.get(discord_id)
+    return role is not None and role.upper() == "ADMIN"
+
+# -------------------------------
+# Setup hook — runs once, before the gateway connects
+# -------------------------------
+@bot.event
+async def setup_hook():
+    # Gateway session saved by the previous process (login() set bot.user)
+    bot.gateway_sessions = gateway_session.SessionFile(
+        gateway_session.default_path(), window=float(os.getenv("GATEWAY_RESUME_WINDOW", "120"))
+    )
+    bot.saved_session = bot.gateway_sessions.take(bot.user.id)
+
+    # Storage backend (MySQL pool sized / recycled through DB_POOL_*, or SQLite)
+    # HTTP workers: only the first one sends the queued emails
+    await init_services(await open_storage(DB_BACKEND, password=DB_PASS), deliver_mail=WORKER_INDEX == 0)
+    print(f"🗄️   DB ready ({bot.storage.describe()})")
+    print(f"📬  Outbox ready ({bot.outbox.depth} email(s) en attente)")
+
+    # Prometheus endpoint (one port per HTTP worker)
+    bot.metrics_server = None
+    if os.getenv("METRICS_PORT"):
+        port = int(os.getenv("METRICS_PORT")) + WORKER_INDEX
+        bot.metrics_server = await start_metrics_server(os.getenv("METRICS_HOST", "127.0.0.1"), port)
+        print(f"📈  Metrics sur http://{os.getenv('METRICS_HOST', '127.0.0.1')}:{port}/metrics")
+
+    # Several HTTP workers: a write made by another process cannot invalidate
+    # our caches, so reload them periodically instead
+    if INTERACTIONS_WORKERS > 1:
+        bot.cache_refresher = asyncio.create_task(refresh_caches(float(os.getenv("CACHE_REFRESH", "10"))))
+
+    # Persistent components (state in the custom_id or the DB) survive restarts
+    # and can be clicked on any HTTP worker: /validation (recu:<action>:<id>),
+    # /recu_info pages (recus:...) and /validation_lot (lot:...)
+    bot.add_dynamic_items(ValidationButton, RecuPageButton, LotPicker, LotButton)
+
+    # Slash commands: login() already set the application id, so sync here
+    # once instead of on every READY, and only if the tree changed
+    bot.command_sync = CommandSync(bot.tree, command_sync_path())
+    if WORKER_INDEX == 0:
+        try:
+            synced = await bot.command_sync.sync(dev_guild())
+            if synced is None:
+                print("🔄  Slash commands à jour, sync ignorée")
+            else:
+                print(f"🔄  Synced {len(synced)} slash commands")
+        except discord.HTTPException as e:
+            logger.error(f"Sync des slash commands échouée: {e}")
+
+async def init_services(storage, *, deliver_mail=True, dm_client=None):
+    """Everything the commands use besides Discord: shared by setup_hook and bench/loadtest.py."""
+    bot.storage = storage
+    await bot.storage.prepare()
+
+    # Receipt images on disk, digests in `factures`
+    bot.receipts = ReceiptStore(default_root())
+    bot.http_session = aiohttp.ClientSession()
+
+    # In-memory read caches
+    bot.stock_cache = StockCache(bot.storage.stock, render_stock)
+    bot.directory   = DirectoryCache(bot.storage.users, {"cell": render_contact, "table": render_contact_table})
+    await bot.directory.load()
+    bot.roles       = RoleCache(bot.storage.users, ttl=float(os.getenv("ROLE_CACHE_TTL", "300")))
+    await bot.roles.warm()
+
+    # Email outbox
+    bot.outbox = MailOutbox(bot.storage.mail)
+    await bot.outbox.start(deliver=deliver_mail)
+
+    # Coalesced DMs to receipt owners after validation decisions
+    bot.notifier = OwnerNotifier(dm_client or bot, debounce=float(os.getenv("NOTIFY_DEBOUNCE", "30")))
+    bot.notifier.start()
+
+    # Per-admin /validation look-ahead
+    bot.review_lookahead = {}
+
+    # Slow-query log, EXPLAINs run against this storage
+    slow_queries.configure(slow_query_path(WORKER_INDEX), explainer=functools.partial(describe_plan, bot.storage))
+
+async def refresh_caches(every):
+    while True:
+        await asyncio.sleep(every)
+        bot.stock_cache.invalidate()
+        bot.roles.invalidate()
+        try:
+            await bot.directory.load()
+        except Exception as e:
+            logger.error(f"Rechargement de l'annuaire impossible: {e}")
 
 # -------------------------------
 # On ready event
@@ -72,44 +201,50 @@ async def is_admin(discord_id: int) -> bool:
 async def on_ready():
     print(f"✅  Logged in as {bot.user} (ID {bot.user.id})")
 
-    # DB connection pool
-    bot.db = await aiomysql.create_pool(
-        user="discord_bot",
-        password=DB_PASS,
-        unix_socket=SOCKET,
-        db="team_inventory",
-        autocommit=True
-    )
-
-    print("🗄️   DB pool ready")
+@bot.event
+async def on_app_command_completion(interaction, command):
+    bot.tree.completed(interaction, "ok")
 
-    # Sync slash commands
-    synced = await bot.tree.sync()
-    print(f"🔄  Synced {len(synced)} slash commands")
+@bot.event
+async def on_resumed():
+    print(f"🔁  Session gateway reprise ({bot.ws.session_id})")
 
 # -------------------------------
 # Clean shutdown
 # -------------------------------
-@bot.event
-async def on_close():
-    bot.db.close()
-    await bot.db.wait_closed()
+async def stop():
+    # Queued owner DMs need the Discord connection: send them before closing it
+    if getattr(bot, "notifier", None) is not None:
+        await bot.notifier.close()
+
+    # Close without ending the gateway session, and leave it for the next start
+    bot.keep_gateway_session = True
+    ws, user = bot.ws, bot.user
+    await bot.close()
+    if user is not None and getattr(bot, "gateway_sessions", None) is not None:
+        if bot.gateway_sessions.save(ws, user.id):
+            print(f"💾  Session gateway sauvegardée (seq {ws.sequence})")
+
+async def shutdown():
+    if not bot.is_closed():
+        await bot.close()
+    if getattr(bot, "outbox", None) is not None:
+        await bot.outbox.stop()
+    if getattr(bot, "http_session", None) is not None:
+        await bot.http_session.close()
+    if getattr(bot, "storage", None) is not None:
+        await bot.storage.close()
+    if getattr(bot, "metrics_server", None) is not None:
+        await bot.metrics_server.cleanup()
+    print("👋  Bot arrêté proprement")
 
 # -------------------------------
 # /stock — Show inventory
 # -------------------------------
-@bot.tree.command(description="Afficher l'inventaire (visible seulement par toi)")
-async def stock(interaction: discord.Interaction):
-    async with bot.db.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("SELECT id, item, size, quantity, prix FROM stock WHERE quantity > 0 ORDER BY item, size")
-            rows = await cur.fetchall()
-
+def render_stock(rows) -> str:
     if not rows:
-        await interaction.response.send_message("📦 Aucun article en stock.", ephemeral=True)
-        return
+        return "📦 Aucun article en stock."
 
-    from collections import defaultdict
     grouped = defaultdict(list)
     for id, item, size, qty, prix in rows:
         grouped[item, prix].append((id, size, qty))
@@ -120,48 +255,97 @@ async def stock(interaction: discord.Interaction):
         for id, size, qty in entries:
             lines.append(f"`#{id}` Taille {size} — Qte: `{qty}`")
 
-    message = "\n".join(lines)
-    await interaction.response.send_message(message, ephemeral=True)
+    return "\n".join(lines)
+
+@bot.tree.command(description="Afficher l'inventaire (visible seulement par toi)")
+@auto_defer
+async def stock(interaction: discord.Interaction):
+    # Served from memory, reloaded only after a purchase / stock edit
+    message = await bot.stock_cache.text()
+    await reply(interaction, message, ephemeral=True)
+
+# -------------------------------
+# /stock_refresh — Reload inventory after a manual edit (admin)
+# -------------------------------
+@bot.tree.command(description="🔄 Recharger l'inventaire après une modification manuelle (admin seulement)")
+@auto_defer
+async def stock_refresh(interaction: discord.Interaction):
+    if not await is_admin(interaction.user.id):
+        await reply(interaction, "❌ Admin seulement.", ephemeral=True)
+        return
+
+    bot.stock_cache.invalidate()
+    await reply(interaction, "🔄 Inventaire rechargé.", ephemeral=True)
+
+# -------------------------------
+# /roles_refresh — Reload roles after a manual DB edit (admin)
+# -------------------------------
+@bot.tree.command(description="🔄 Recharger les rôles après une modification manuelle (admin seulement)")
+@app_commands.describe(membre="Seulement ce membre (sinon tous les rôles)")
+@auto_defer
+async def roles_refresh(interaction: discord.Interaction, membre: discord.User | None = None):
+    if not await is_admin(interaction.user.id):
+        await reply(interaction, "❌ Admin seulement.", ephemeral=True)
+        return
+
+    if membre is not None:
+        bot.roles.invalidate(membre.id)
+        await reply(interaction, f"🔄 Rôle de {membre.mention} rechargé.", ephemeral=True)
+        return
+    bot.roles.invalidate()
+    await bot.roles.warm()
+    await reply(interaction, "🔄 Rôles rechargés.", ephemeral=True)
+
+# -------------------------------
+# /sync_commands — Force a slash-command sync (admin)
+# -------------------------------
+@bot.tree.command(description="🔄 Forcer la synchronisation des slash commands (admin seulement)")
+@app_commands.describe(ici="Synchroniser sur ce serveur seulement (propagation immédiate, pour le dev)")
+@auto_defer
+async def sync_commands(interaction: discord.Interaction, ici: bool = False):
+    if not await is_admin(interaction.user.id):
+        await reply(interaction, "❌ Admin seulement.", ephemeral=True)
+        return
+
+    guild = discord.Object(id=interaction.guild_id) if ici and interaction.guild_id else dev_guild()
+    await defer(interaction, ephemeral=True)
+    synced = await bot.command_sync.sync(guild, force=True)
+    scope  = f"serveur {guild.id}" if guild else "global"
+    await interaction.followup.send(f"🔄 {len(synced)} slash commands synchronisées ({scope}).", ephemeral=True)
 
 # -------------------------------
 # /acheter — Buy an item
 # -------------------------------
 @bot.tree.command(description="Acheter un item")
+@auto_defer
 async def acheter(interaction: discord.Interaction, id: int, quantité: int):
     user = interaction.user
 
-    async with bot.db.acquire() as conn:
-        async with conn.cursor() as cur:
-            # Get item info
-            await cur.execute("SELECT item, size, quantity, prix FROM stock WHERE id = %s", (id,))
-            row = await cur.fetchone()
+    if quantité <= 0:
+        await reply(interaction, "❌ Quantité invalide.", ephemeral=True)
+        return
 
-            if not row:
-                await interaction.response.send_message("❌ Article introuvable.", ephemeral=True)
-                return
+    # Conditional decrement (never oversells), then item info + buyer email
+    bought, row = await bot.storage.stock.buy(id, quantité, user.id)
+    if bought:
+        bot.stock_cache.invalidate()
 
-            item, size, stock_qty, prix = row
+    if not row:
+        await reply(interaction, "❌ Article introuvable.", ephemeral=True)
+        return
 
-            if quantité > stock_qty:
-                await interaction.response.send_message(f"❌ Stock insuffisant: seulement {stock_qty} en inventaire.", ephemeral=True)
-                return
+    item, size, stock_qty, prix, user_email = row
 
-            # Update quantity
-            new_qty = stock_qty - quantité
-            await cur.execute("UPDATE stock SET quantity = %s WHERE id = %s", (new_qty, id))
+    if not bought:
+        await reply(interaction, f"❌ Stock insuffisant: seulement {stock_qty} en inventaire.", ephemeral=True)
+        return
 
     total = round(prix * quantité, 2)
-    await interaction.response.send_message(
+    await reply(
+        interaction,
         f"✅ Achat confirmé pour **{item}** ({size}) x{quantité} — Total: `{total:.2f} $`", ephemeral=True
     )
 
-    # Get buyer email from users table
-    async with bot.db.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("SELECT email FROM users WHERE discord_id = %s", (user.id,))
-            email_row = await cur.fetchone()
-
-    user_email = email_row[0] if email_row else None
     username   = f"{user.name} (ID: {user.id})"
     now        = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
@@ -182,28 +366,18 @@ async def acheter(interaction: discord.Interaction, id: int, quantité: int):
     if user_email:
         recipients.append(user_email)
 
-    # Send the email
+    # Queue the email, the outbox worker sends it in the background
     try:
-        sendmail_cmd = ["/usr/sbin/sendmail", "-v", "-F", "Siboire - Café William"] + recipients
-        subprocess.run(sendmail_cmd, input=report.encode(), check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Erreur d'envoi de l'email: {e}")
+        await bot.outbox.enqueue(recipients, report)
+    except Exception as e:
+        logger.error(f"❌ Erreur d'ajout de l'email à la file: {e}")
 
 # -------------------------------
-# /contact_table — Info coureur (table)
+# Team directory renderings (precomputed by bot.directory)
 # -------------------------------
-@bot.tree.command(description="💻 Voir les contacts dans un tableau (vue bureau)")
-async def contact_table(interaction: discord.Interaction):
-    async with bot.db.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                "SELECT first_name, last_name, tel, email FROM users ORDER BY last_name, first_name"
-            )
-            rows = await cur.fetchall()
-
+def render_contact_table(rows) -> str:
     if not rows:
-        await interaction.response.send_message("❌ Aucun contact trouvé.", ephemeral=True)
-        return
+        return "❌ Aucun contact trouvé."
 
     # Format as fixed-width table
     lines = [
@@ -213,24 +387,11 @@ async def contact_table(interaction: discord.Interaction):
     for first_name, last_name, tel, email in rows:
         lines.append(f"{first_name:<15} {last_name:<20} {tel or '-':<18} {email or '-'}")
 
-    message = "```\n" + "\n".join(lines) + "\n```"
-    await interaction.response.send_message(message, ephemeral=True)
-
-# -------------------------------
-# /contact — Info coureur (cell)
-# -------------------------------
-@bot.tree.command(description="📇 Voir les contacts de l'équipe (copie facile)")
-async def contact(interaction: discord.Interaction):
-    async with bot.db.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                "SELECT first_name, last_name, tel, email FROM users ORDER BY last_name, first_name"
-            )
-            rows = await cur.fetchall()
+    return "```\n" + "\n".join(lines) + "\n```"
 
+def render_contact(rows) -> str:
     if not rows:
-        await interaction.response.send_message("❌ Aucun contact trouvé.", ephemeral=True)
-        return
+        return "❌ Aucun contact trouvé."
 
     lines = ["📇 **Contacts de l'équipe:**"]
     for first, last, tel, email in rows:
@@ -242,35 +403,70 @@ async def contact(interaction: discord.Interaction):
             f"{email_display}\n"
         )
 
-    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+    return "\n".join(lines)
+
+# -------------------------------
+# /contact_table — Info coureur (table)
+# -------------------------------
+@bot.tree.command(description="💻 Voir les contacts dans un tableau (vue bureau)")
+@auto_defer
+async def contact_table(interaction: discord.Interaction):
+    await reply(interaction, bot.directory.view("table"), ephemeral=True)
+
+# -------------------------------
+# /contact — Info coureur (cell)
+# -------------------------------
+@bot.tree.command(description="📇 Voir les contacts de l'équipe (copie facile)")
+@auto_defer
+async def contact(interaction: discord.Interaction):
+    await reply(interaction, bot.directory.view("cell"), ephemeral=True)
 
 # -------------------------------
 # /recu — Enter a receipt with image
 # -------------------------------
 @bot.tree.command(name="recu", description="Ajouter un reçu à son compte")
+@auto_defer
 async def recu(
     interaction: discord.Interaction,
     amount: float,
     description: str,
     image: discord.Attachment,
 ):
-    """Store a receipt record with its image in the DB."""
-    # Download the attachment bytes
-    img_bytes = await image.read()
-
-    # Insert into DB (make sure your `factures` table has an `image_blob` BLOB column)
-    async with bot.db.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                """
-                INSERT INTO factures
-                  (discord_id, amount, description, image_blob, created_at)
-                VALUES (%s, %s, %s, %s, NOW())
-                """,
-                (interaction.user.id, amount, description, img_bytes)
-            )
+    """Store a receipt record; the image goes to the receipt store, the DB keeps its digest."""
+    # Reject early on what Discord tells us, before downloading anything
+    content_type = (image.content_type or "").split(";")[0].strip()
+    if image.size > RECU_MAX_BYTES:
+        await reply(
+            interaction,
+            f"❌ Fichier trop gros (max {RECU_MAX_BYTES // (1024 * 1024)} Mo).", ephemeral=True
+        )
+        return
+    if content_type not in MIME_EXTENSIONS:
+        await reply(
+            interaction,
+            "❌ Format non supporté (JPEG, PNG, GIF, WEBP ou PDF).", ephemeral=True
+        )
+        return
+
+    # The download can outlast the 3 s interaction window
+    await defer(interaction, ephemeral=True, thinking=True)
+
+    # Stream the attachment to disk, the row is only inserted once the file is there
+    try:
+        digest, size, mime = await stream_to_store(
+            bot.http_session, image.url, bot.receipts, RECU_MAX_BYTES
+        )
+    except ReceiptRejected as e:
+        await interaction.followup.send(str(e), ephemeral=True)
+        return
+    except aiohttp.ClientError as e:
+        logger.error(f"Téléchargement du reçu impossible: {e}")
+        await interaction.followup.send("❌ Téléchargement de l'image impossible, réessaie.", ephemeral=True)
+        return
+
+    await bot.storage.factures.add(interaction.user.id, amount, description, digest, size, mime)
 
-    await interaction.response.send_message(
+    await interaction.followup.send(
         "✅ Reçu enregistré avec image !", ephemeral=True
     )
 
@@ -278,31 +474,24 @@ async def recu(
 # -------------------------------
 # /recu_info — Info sur tous les reçus
 # -------------------------------
-@bot.tree.command(description="Voir tous tes reçus")
-async def recu_info(interaction: discord.Interaction):
-    async with bot.db.acquire() as conn:
-        async with conn.cursor() as cur:
-            # Fetch receipts with their state
-            await cur.execute("""
-                SELECT id, amount, description, created_at, state
-                FROM factures
-                WHERE discord_id = %s
-                ORDER BY created_at DESC
-            """, (interaction.user.id,))
-            rows = await cur.fetchall()
-
-            # Calculate total only for accepted receipts
-            await cur.execute("""
-                SELECT SUM(amount) FROM factures
-                WHERE discord_id = %s AND state = 'accepted'
-            """, (interaction.user.id,))
-            total = await cur.fetchone()
-
-    if not rows:
-        await interaction.response.send_message("🧾 Aucun reçu trouvé.", ephemeral=True)
-        return
-
-    lines = [f"🧾 **Reçus de {interaction.user.display_name}**"]
+# The page buttons are persistent and carry their whole state: the page
+# number, the accepted total (in cents) and the (created_at, id) keyset
+# cursor of the page on screen. Any process can serve the next click.
+# DATETIME holds whole seconds on both backends, so the cursor is exact.
+RECU_PAGE_SIZE = 12   # 12 rows with descriptions capped at 80 chars stay under Discord's 2000
+
+async def fetch_recu_page(discord_id, after=None):
+    """One page of a user's receipts, newest first, keyset-paginated on (created_at, id).
+
+    The first page also carries the accepted total (over every receipt of the
+    user, not just this page). Returns (rows, has_more, total).
+    """
+    rows = await bot.storage.factures.page(discord_id, RECU_PAGE_SIZE + 1, after)
+    total = rows[0][5] if rows else None
+    return [row[:5] for row in rows[:RECU_PAGE_SIZE]], len(rows) > RECU_PAGE_SIZE, total
+
+def render_recu_page(name, rows, page, total) -> str:
+    lines = [f"🧾 **Reçus de {name}** (page {page + 1})"]
     for fid, amount, desc, created, state in rows:
         state_label = {
             "pending": "🕐 Pending",
@@ -310,58 +499,120 @@ async def recu_info(interaction: discord.Interaction):
             "refused": "❌ Refusé"
         }.get(state, "❓ Inconnu")
 
-        lines.append(f"`#{fid}` {created:%Y-%m-%d} - {desc}: {amount:.2f} $ [{state_label}]")
+        desc_short = desc if len(desc) <= 80 else desc[:78] + ".."
+        lines.append(f"`#{fid}` {created:%Y-%m-%d} - {desc_short}: {amount:.2f} $ [{state_label}]")
 
     # Handle NULL total (if no accepted receipts)
-    total_amount = total[0] if total[0] is not None else 0.0
+    total_amount = total if total is not None else 0.0
     lines.append(f"\n**Total dû**: `{total_amount:.2f} $`")
+    return "\n".join(lines)
+
+class RecuPageButton(discord.ui.DynamicItem[discord.ui.Button],
+                     template=r"recus:(?P<to>prev|next):(?P<page>[0-9]+):(?P<total>-?[0-9]+):(?P<at>[0-9]{14}):(?P<id>[0-9]+)"):
+    def __init__(self, to, page, total_cents, cursor):
+        created, fid = cursor
+        super().__init__(discord.ui.Button(
+            label="◀ Précédent" if to == "prev" else "Suivant ▶", style=ButtonStyle.secondary,
+            custom_id=f"recus:{to}:{page}:{total_cents}:{created:%Y%m%d%H%M%S}:{fid}",
+        ))
+        self.to          = to
+        self.page        = page       # the page on screen
+        self.total_cents = total_cents
+        self.cursor      = cursor     # its first row (prev) or last row (next)
+
+    @classmethod
+    async def from_custom_id(cls, interaction: Interaction, item, match):
+        cursor = (datetime.strptime(match["at"], "%Y%m%d%H%M%S"), int(match["id"]))
+        return cls(match["to"], int(match["page"]), int(match["total"]), cursor)
+
+    async def callback(self, interaction: Interaction):
+        current_command.set(f"recus:{self.to}")
+        with metrics.timer("component_seconds", component=f"recus:{self.to}"):
+            await self.handle(interaction)
+
+    async def handle(self, interaction: Interaction):
+        # Ephemeral message: the clicker is the owner of the receipts
+        user = interaction.user
+        if self.to == "next":
+            rows, has_more, _ = await fetch_recu_page(user.id, after=self.cursor)
+            page = self.page + 1
+        else:
+            rows = await bot.storage.factures.page(user.id, RECU_PAGE_SIZE, before=self.cursor)
+            rows = [row[:5] for row in rows]
+            # Less than a page before the cursor: we are back on the first one
+            page = self.page - 1 if len(rows) == RECU_PAGE_SIZE else 0
+            has_more = True
+
+        if not rows:
+            # Receipts deleted since: nothing more this way
+            self.item.disabled = True
+            await edit(interaction, view=self.view)
+            return
+
+        total = decimal.Decimal(self.total_cents).scaleb(-2)
+        await edit(interaction, content=render_recu_page(user.display_name, rows, page, total),
+                   view=recu_page_view(rows, page, total, has_more))
+
+def recu_page_view(rows, page, total, has_more) -> View:
+    total_cents = int((total or 0) * 100)
+    first, last = rows[0], rows[-1]
+    previous = RecuPageButton("prev", page, total_cents, (first[3], first[0]))
+    following = RecuPageButton("next", page, total_cents, (last[3], last[0]))
+    previous.item.disabled  = page == 0
+    following.item.disabled = not has_more
+
+    view = View(timeout=None)
+    view.add_item(previous)
+    view.add_item(following)
+    return view
+
+@bot.tree.command(description="Voir tous tes reçus")
+@auto_defer
+async def recu_info(interaction: discord.Interaction):
+    rows, has_more, total = await fetch_recu_page(interaction.user.id)
+
+    if not rows:
+        await reply(interaction, "🧾 Aucun reçu trouvé.", ephemeral=True)
+        return
 
-    await interaction.response.send_message("\n".join(lines), ephemeral=True)
+    content = render_recu_page(interaction.user.display_name, rows, 0, total)
+    if not has_more:
+        # Everything fits on one page, no buttons needed
+        await reply(interaction, content, ephemeral=True)
+        return
+    await reply(interaction, content, view=recu_page_view(rows, 0, total, has_more), ephemeral=True)
 
 # -------------------------------
 # /recu_enleve - Enleve un recu
 # -------------------------------
 @bot.tree.command(description="Supprimer un reçu")
+@auto_defer
 async def recu_enleve(interaction: discord.Interaction, id: int):
-    async with bot.db.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("""
-                DELETE FROM factures
-                WHERE id = %s AND discord_id = %s
-            """, (id, interaction.user.id))
-            if cur.rowcount == 0:
-                await interaction.response.send_message("❌ Reçu introuvable ou non autorisé.", ephemeral=True)
-                return
+    if not await bot.storage.factures.delete(id, interaction.user.id):
+        await reply(interaction, "❌ Reçu introuvable ou non autorisé.", ephemeral=True)
+        return
 
-    await interaction.response.send_message("🗑️ Reçu supprimée avec succès.", ephemeral=True)
+    await reply(interaction, "🗑️ Reçu supprimée avec succès.", ephemeral=True)
 
 # -------------------------------
 # /recu_inspect — Inspect a receipt (owner or admin)
 # -------------------------------
 @bot.tree.command(name="recu_inspect", description="Inspecter un reçu avec image (propriétaire ou admin)")
+@auto_defer
 async def recu_inspect(interaction: discord.Interaction, id: int):
     # 1) Récupérer le reçu
-    async with bot.db.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                """
-                SELECT id, discord_id, amount, description, created_at, state
-                FROM factures
-                WHERE id = %s
-                """,
-                (id,)
-            )
-            row = await cur.fetchone()
+    row = await bot.storage.factures.get(id)
 
     if not row:
-        await interaction.response.send_message("❌ Reçu introuvable.", ephemeral=True)
+        await reply(interaction, "❌ Reçu introuvable.", ephemeral=True)
         return
 
     rec_id, owner_id, amount, description, created_at, state = row
 
     # 2) Vérifier les permissions
     if interaction.user.id != owner_id and not await is_admin(interaction.user.id):
-        await interaction.response.send_message(
+        await reply(
+            interaction,
             "❌ Vous n'êtes pas autorisé à voir ce reçu.", ephemeral=True
         )
         return
@@ -383,90 +634,76 @@ async def recu_inspect(interaction: discord.Interaction, id: int):
 
     # 4) Envoyer le résultat
     if file:
-        await interaction.response.send_message(embed=embed, file=file, ephemeral=True)
+        await reply(interaction, embed=embed, file=file, ephemeral=True)
     else:
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await reply(interaction, embed=embed, ephemeral=True)
 
 
 # -------------------------------
 # /recus_admin - Voir tous les reçus (admin seulement)
 # -------------------------------
 @bot.tree.command(description="📋 Voir tous les reçus (admin seulement)")
+@auto_defer
 async def recus_admin(interaction: discord.Interaction):
     # 1) Admin check
     if not await is_admin(interaction.user.id):
-        await interaction.response.send_message("❌ Admin seulement.", ephemeral=True)
+        await reply(interaction, "❌ Admin seulement.", ephemeral=True)
         return
 
     # 2) Immediate acknowledgement
-    await interaction.response.send_message(
+    await reply(
+        interaction,
         "⏳ Préparation du rapport des reçus, veuillez patienter…",
         ephemeral=True
     )
 
-    # 3) Fetch users + receipts
-    async with bot.db.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                "SELECT discord_id, first_name, last_name FROM users ORDER BY last_name, first_name"
-            )
-            users = await cur.fetchall()
-
-            await cur.execute("""
-                SELECT id, discord_id, amount, description, created_at, state
-                FROM factures
-                ORDER BY created_at ASC
-            """)
-            all_receipts = await cur.fetchall()
-
-    # 4) Organize receipts per user
-    receipt_map: dict[int, list] = {}
-    for rid, uid, amt, desc, created, state in all_receipts:
-        receipt_map.setdefault(uid, []).append((rid, amt, desc, created, state))
-
-    # 5) Build the report in-memory
-    buf = io.StringIO()
-    buf.write("🧾 Résumé des reçus par personne\n")
-    buf.write("=" * 80 + "\n\n")
-
-    total_global = decimal.Decimal("0")
-
-    for discord_id, first, last in users:
-        recs = receipt_map.get(discord_id, [])
-        # sum only accepted receipts (amt is Decimal)
-        total_user = sum(
-            (amount for (_id, amount, _desc, _created, state) in recs if state == "accepted"),
-            decimal.Decimal("0")
-        )
-        total_global += total_user
-
-        buf.write(f"👤 {first} {last} — Total accepté: {total_user:.2f} $\n")
-        buf.write("-" * 80 + "\n")
-        if recs:
-            buf.write(f"{'Id':<3}  {'Date':<12} {'Description':<35} {'Montant':>10} {'État':>15}\n")
-            buf.write("-" * 80 + "\n")
-            for rid, amt, desc, created, state in recs:
-                date = created.strftime("%Y-%m-%d")
-                desc_short = desc if len(desc) <= 34 else desc[:32] + ".."
-                emoji_state = {
-                    "pending": "🕐 Pending",
-                    "accepted": "✅ Accepté",
-                    "refused": "❌ Refusé"
-                }[state]
-                buf.write(f"#{rid:<3d} {date:<12} {desc_short:<35} {amt:>8.2f} {emoji_state:>15}\n")
-        else:
-            buf.write("  _Aucun reçu._\n")
-        buf.write("\n")
-
-    buf.write("=" * 80 + "\n")
-    buf.write(f"🧾 Total général: {total_global:.2f} $\n")
-    buf.seek(0)
-
-    # 6) Send the completed report as a file
-    file = discord.File(
-        io.BytesIO(buf.getvalue().encode("utf-8")),
-        filename="recus_admin.txt"
-    )
+    # 3) Report goes to a spooled temp file: in memory while small, on disk past 1 MiB
+    report = tempfile.SpooledTemporaryFile(max_size=1024 * 1024, mode="w+b")
+
+    def write(lines):
+        report.write("".join(lines).encode("utf-8"))
+
+    write(["🧾 Résumé des reçus par personne\n", "=" * 80 + "\n\n"])
+
+    # 4) Accepted totals per user, and the grand total
+    totals, total_global = await bot.storage.factures.accepted_totals()
+
+    # 5) Stream users and their receipts, already in report order
+    current = None
+    async for rows in bot.storage.factures.report(500):
+        lines = []
+        for discord_id, first, last, rid, amt, desc, created, state in rows:
+            if discord_id != current:
+                if current is not None:
+                    lines.append("\n")
+                current = discord_id
+                total_user = totals.get(discord_id) or decimal.Decimal("0")
+
+                lines.append(f"👤 {first} {last} — Total accepté: {total_user:.2f} $\n")
+                lines.append("-" * 80 + "\n")
+                if rid is None:
+                    lines.append("  _Aucun reçu._\n")
+                    continue
+                lines.append(f"{'Id':<3}  {'Date':<12} {'Description':<35} {'Montant':>10} {'État':>15}\n")
+                lines.append("-" * 80 + "\n")
+
+            date = created.strftime("%Y-%m-%d")
+            desc_short = desc if len(desc) <= 34 else desc[:32] + ".."
+            emoji_state = {
+                "pending": "🕐 Pending",
+                "accepted": "✅ Accepté",
+                "refused": "❌ Refusé"
+            }.get(state, "❓ Inconnu")
+            lines.append(f"#{rid:<3d} {date:<12} {desc_short:<35} {amt:>8.2f} {emoji_state:>15}\n")
+        write(lines)
+
+    if current is not None:
+        write(["\n"])
+    write(["=" * 80 + "\n", f"🧾 Total général: {total_global:.2f} $\n"])
+    report.seek(0)
+
+    # 6) Send the completed report as a file (discord.File closes it once uploaded)
+    file = discord.File(report, filename="recus_admin.txt")
     await interaction.followup.send(
         content="📄 Voici le rapport complet des reçus :",
         file=file,
@@ -477,198 +714,519 @@ async def recus_admin(interaction: discord.Interaction):
 # /update_tel - Update tel number
 # -------------------------------
 @bot.tree.command(description="📞 Met à jour ton numéro de téléphone")
+@auto_defer
 async def update_tel(interaction: discord.Interaction, tel: str):
     discord_id = interaction.user.id
 
-    async with bot.db.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                "UPDATE users SET tel = %s WHERE discord_id = %s", (tel, discord_id)
-            )
+    await bot.storage.users.set_tel(discord_id, tel)
+    bot.directory.update(discord_id, tel=tel)
 
-    await interaction.response.send_message(
+    await reply(
+        interaction,
         f"✅ Ton numéro de téléphone a été mis à jour: `{tel}`", ephemeral=True
     )
 # -------------------------------
 # /update_mail - Update mail
 # -------------------------------
 @bot.tree.command(description="📧 Met à jour ton adresse email")
+@auto_defer
 async def update_mail(interaction: discord.Interaction, mail: str):
     discord_id = interaction.user.id
 
-    async with bot.db.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                "UPDATE users SET email = %s WHERE discord_id = %s", (mail, discord_id)
-            )
+    await bot.storage.users.set_email(discord_id, mail)
+    bot.directory.update(discord_id, email=mail)
 
-    await interaction.response.send_message(
+    await reply(
+        interaction,
         f"✅ Ton adresse email a été mise à jour: `{mail}`", ephemeral=True
     )
 
-class ValidationView(View):
-    def __init__(self, recu_id):
-        super().__init__(timeout=300)
-        self.choice = None
-        self.recu_id = recu_id
-
-    @button(label="Accepter", style=ButtonStyle.success)
-    async def accept(self, interaction: Interaction, button):
-        self.choice = "accepted"
-        await interaction.response.defer()
-        self.stop()
-
-    @button(label="Refuser", style=ButtonStyle.danger)
-    async def refuse(self, interaction: Interaction, button):
-        self.choice = "refused"
-        await interaction.response.defer()
-        self.stop()
-
-    @button(label="Skip", style=ButtonStyle.secondary)
-    async def skip(self, interaction: Interaction, button):
-        self.choice = "skip"
-        await interaction.response.defer()
-        self.stop()
-
-    @button(label="End", style=ButtonStyle.secondary)
-    async def end(self, interaction: Interaction, button):
-        self.choice = "end"
-        await interaction.response.defer()
-        self.stop()
+# -------------------------------
+# /stats - Bot metrics (admin only)
+# -------------------------------
+@bot.tree.command(description="📊 Statistiques internes du bot (admin seulement)")
+@auto_defer
+async def stats(interaction: discord.Interaction):
+    if not await is_admin(interaction.user.id):
+        await reply(interaction, "❌ Admin seulement.", ephemeral=True)
+        return
 
-async def build_embed_and_file(rec):
-    rec_id, user_id, amount, description, created = rec
-    async with bot.db.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("SELECT image_blob FROM factures WHERE id=%s", (rec_id,))
-            row = await cur.fetchone()
+    snap = metrics.snapshot()
+    if not snap:
+        await reply(interaction, "📊 Aucune statistique pour l'instant.", ephemeral=True)
+        return
+
+    width = max(len(name) for name in snap)
+    lines = []
+    for name, value in sorted(snap.items()):
+        shown = f"{value:.3f}" if isinstance(value, float) else str(value)
+        lines.append(f"{name:<{width}}  {shown}")
 
+    text = "\n".join(lines)
+    if len(text) > 1900:
+        # Per-command / per-query series no longer fit in one message
+        await reply(interaction, "📊 Statistiques internes:", file=File(io.BytesIO(text.encode()), "stats.txt"), ephemeral=True)
+        return
+    await reply(interaction, "```\n" + text + "\n```", ephemeral=True)
+
+@bot.tree.command(name="slow_queries", description="🐢 Requêtes SQL les plus lentes depuis le démarrage (admin seulement)")
+@app_commands.describe(nombre="Combien de requêtes afficher (10 par défaut)")
+@auto_defer
+async def slow_queries_top(interaction: discord.Interaction, nombre: app_commands.Range[int, 1, 50] = 10):
+    if not await is_admin(interaction.user.id):
+        await reply(interaction, "❌ Admin seulement.", ephemeral=True)
+        return
+
+    offenders = slow_queries.top(nombre)
+    if not offenders:
+        await reply(interaction, f"🐢 Aucune requête au-dessus de {slow_queries.threshold * 1000:.0f} ms.", ephemeral=True)
+        return
+
+    lines = [f"Seuil {slow_queries.threshold * 1000:.0f} ms, classé par temps total (ce processus seulement)", ""]
+    for rank, o in enumerate(offenders, 1):
+        lines.append(f"{rank:>2}. {o.total:7.2f} s  {o.count:>5}×  moy {o.total / o.count * 1000:7.1f} ms  "
+                     f"max {o.peak * 1000:7.1f} ms  {o.command}")
+        lines.append(f"    {o.query[:300]}")
+        lines.append(f"    plan: {o.plan or 'EXPLAIN en cours'}")
+
+    text = "\n".join(lines)
+    if len(text) > 1900:
+        await reply(interaction, "🐢 Requêtes les plus lentes:", file=File(io.BytesIO(text.encode()), "slow_queries.txt"), ephemeral=True)
+        return
+    await reply(interaction, "```\n" + text + "\n```", ephemeral=True)
+
+def receipt_embed(rec):
+    rec_id, user_id, amount, description, created = rec
     embed = Embed(title=f"Reçu #{rec_id}", description=description, timestamp=created)
     embed.add_field(name="Montant", value=f"{amount:.2f} $", inline=True)
     embed.add_field(name="Par", value=f"<@{user_id}>", inline=True)
+    return embed
+
+async def fetch_legacy_blob(rec_id):
+    """Image of a receipt not moved to the store yet (see `receipt_store.py migrate`)."""
+    return await bot.storage.factures.legacy_blob(rec_id)
 
+async def build_embed_and_file(rec):
+    rec_id = rec[0]
+    row = await bot.storage.factures.image(rec_id)
+
+    embed = receipt_embed(rec)
     file = None
     if row and row[0]:
-        img_bytes = row[0]
-        file = File(io.BytesIO(img_bytes), filename=f"recu_{rec_id}.jpg")
-        embed.set_image(url=f"attachment://recu_{rec_id}.jpg")
+        if bot.receipts.exists(row[0]):
+            filename = f"recu_{rec_id}{extension_for(row[1])}"
+            file = File(bot.receipts.path_for(row[0]), filename=filename)
+            embed.set_image(url=f"attachment://{filename}")
+    elif row:
+        legacy_blob = await fetch_legacy_blob(rec_id)
+        if legacy_blob:
+            filename = f"recu_{rec_id}{extension_for(sniff_mime(legacy_blob[:16]))}"
+            file = File(io.BytesIO(legacy_blob), filename=filename)
+            embed.set_image(url=f"attachment://{filename}")
 
     return embed, file
 
+def read_file(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+async def load_for_review(rec):
+    """Prefetch loader for /validation: the embed and the image bytes, read off the event loop."""
+    rec_id, _owner_id, _amount, _description, _created, digest, mime, _size = rec
+    embed = receipt_embed(rec[:5])
+
+    if digest:
+        try:
+            data = await asyncio.to_thread(read_file, bot.receipts.path_for(digest))
+        except FileNotFoundError:
+            logger.warning(f"Image du reçu #{rec_id} absente du store ({digest})")
+            return embed, None
+    else:
+        data = await fetch_legacy_blob(rec_id)
+        if not data:
+            return embed, None
+        mime = sniff_mime(data[:16])
+
+    filename = f"recu_{rec_id}{extension_for(mime)}"
+    embed.set_image(url=f"attachment://{filename}")
+    return embed, (data, filename)
 
 
 # -------------------------------
 # /validation - Validate receipt - admin only
 # -------------------------------
+# Buttons are persistent and stateless: their custom_id carries the action
+# and the receipt id, and the review state (leases, skips) lives in the DB.
+# A click is handled the same way whether the bot restarted since or not,
+# and an idle session holds no coroutine, view or timer.
+VALIDATION_ACTIONS = {
+    "accept": ("Accepter", ButtonStyle.success),
+    "refuse": ("Refuser",  ButtonStyle.danger),
+    "skip":   ("Skip",     ButtonStyle.secondary),
+    "end":    ("End",      ButtonStyle.secondary),
+}
+
+class ValidationButton(discord.ui.DynamicItem[discord.ui.Button], template=r"recu:(?P<action>accept|refuse|skip|end):(?P<id>[0-9]+)"):
+    def __init__(self, action, rec_id):
+        label, style = VALIDATION_ACTIONS[action]
+        super().__init__(discord.ui.Button(label=label, style=style, custom_id=f"recu:{action}:{rec_id}"))
+        self.action = action
+        self.rec_id = rec_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction: Interaction, item, match):
+        return cls(match["action"], int(match["id"]))
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        return await is_admin(interaction.user.id)
+
+    async def callback(self, interaction: Interaction):
+        current_command.set(f"recu:{self.action}")
+        with metrics.timer("component_seconds", component=f"recu:{self.action}"):
+            await self.handle(interaction)
+
+    async def handle(self, interaction: Interaction):
+        await defer(interaction)
+        admin_id = interaction.user.id
+        queue = review_queue(admin_id)
+        rec_id = self.rec_id
+
+        # Accept / refuse: update state & approver (and drop the lease)
+        if self.action in ("accept", "refuse"):
+            choice = "accepted" if self.action == "accept" else "refused"
+            owner_id = await queue.decide(rec_id, choice)
+            if owner_id is None:
+                # Double click or a button from an earlier session: the
+                # receipt now on screen is still open, don't post another
+                await interaction.edit_original_response(
+                    content=f"⚠️ Reçu #{rec_id} déjà traité.",
+                    embed=None, attachments=[], view=None
+                )
+                return
+
+            # Queue the owner's notification, sent as one summary DM per owner
+            bot.notifier.add(owner_id, rec_id, choice, admin_id)
+            await interaction.edit_original_response(
+                content=f"✅ Reçu #{rec_id} **{choice.upper()}**",
+                embed=None, attachments=[], view=None
+            )
+
+        # Skip hands the receipt back to the queue
+        elif self.action == "skip":
+            await queue.skip(rec_id)
+            await interaction.edit_original_response(
+                content=f"⏩ Reçu #{rec_id} ignoré (pour l'instant).",
+                embed=None, attachments=[], view=None
+            )
+
+        # End releases everything this admin still holds
+        else:
+            await end_review(admin_id)
+            await interaction.edit_original_response(
+                content=f"❌ Validation interrompue au reçu #{rec_id}.",
+                embed=None, attachments=[], view=None
+            )
+            return
+
+        await send_next_receipt(admin_id, interaction.channel)
+
+def validation_view(rec_id) -> View:
+    view = View(timeout=None)
+    for action in VALIDATION_ACTIONS:
+        view.add_item(ValidationButton(action, rec_id))
+    return view
+
+def review_queue(admin_id) -> ReviewQueue:
+    return ReviewQueue(bot.storage.factures, admin_id,
+                       batch_size=VALIDATION_BATCH, lease_seconds=VALIDATION_LEASE_SECONDS)
+
+def review_cost(rec) -> int:
+    # Not yet moved by `receipt_store.py migrate`: no image_size, but the whole
+    # image_blob gets loaded, so count it at the upload limit
+    size = rec[7]
+    return RECU_MAX_BYTES if size is None else size
+
+def review_lookahead(admin_id) -> LookaheadCache:
+    # Per-admin, in memory only: a by-id cache of loaded receipts, never the
+    # source of what comes next (another process may have handled a click)
+    if admin_id not in bot.review_lookahead:
+        bot.review_lookahead[admin_id] = LookaheadCache(
+            load_for_review,
+            key=lambda rec: rec[0],
+            cost=review_cost,
+            budget=VALIDATION_PREFETCH_BYTES,
+        )
+    return bot.review_lookahead[admin_id]
+
+async def send_next_receipt(admin_id, channel, upcoming=None):
+    """Post the admin's next leased receipt with its buttons, or close the session.
+
+    The next receipts are read from the DB on every call (`upcoming` lets
+    /validation pass the batch it just claimed).
+    """
+    if upcoming is None:
+        upcoming = await review_queue(admin_id).upcoming(VALIDATION_PREFETCH + 1)
+
+    if not upcoming:
+        await end_review(admin_id)
+        await channel.send("🎉 Validation terminée.")
+        return
+
+    rec = upcoming[0]
+    # Load the next receipts (embed + image) while the admin decides on this
+    # one; anything no longer leased to this admin is dropped
+    lookahead = review_lookahead(admin_id)
+    lookahead.want(upcoming)
+    embed, image = await lookahead.take(rec)
+
+    file = File(io.BytesIO(image[0]), filename=image[1]) if image else None
+    await channel.send(embed=embed, file=file, view=validation_view(rec[0]))
+
+async def end_review(admin_id):
+    lookahead = bot.review_lookahead.pop(admin_id, None)
+    if lookahead is not None:
+        lookahead.clear()
+    await review_queue(admin_id).release()
+    # End of session: owners get their summary DM now rather than after the debounce
+    await bot.notifier.flush()
+
 @bot.tree.command(
     name="validation",
-    description="Valider les reçus en attente (admin seulement, en DM seulement)"
+    description="Valider les reçus en attente (admin seulement, en DM seulement)",
+    extras={"ephemeral": False}
 )
+@auto_defer
 async def validation(interaction: Interaction):
     # ── 0) Admin check ──
     if not await is_admin(interaction.user.id):
-        await interaction.response.send_message(
+        await reply(
+            interaction,
             "❌ Admin seulement.", ephemeral=True
         )
         return
 
     # ── 1) Defer and grab the DM channel ──
-    await interaction.response.defer()
+    await defer(interaction)
     # If this command was invoked in a guild, this will still open a DM:
     channel = await interaction.user.create_dm()
 
-    # ── 2) Load pending receipts ──
-    async with bot.db.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                "SELECT id, discord_id, amount, description, created_at "
-                "FROM factures WHERE state='pending' ORDER BY created_at"
-            )
-            pending = await cur.fetchall()
+    # ── 2) Fresh session: drop leases / skips left over from a previous one ──
+    queue = review_queue(interaction.user.id)
+    await end_review(interaction.user.id)
 
-    if not pending:
+    # 2a) Prevent self‐validation
+    for rec_id in await queue.own_pending():
+        await channel.send(
+            f"⚠️ Vous ne pouvez pas valider votre propre reçu #{rec_id}."
+        )
+
+    # ── 3) Lease a batch and post the first receipt; the buttons drive the rest ──
+    upcoming = await queue.upcoming(VALIDATION_PREFETCH + 1)
+    if not upcoming:
         await interaction.followup.send("✅ Aucun reçu en attente.")
         return
 
-    # ── 3) Loop through each pending receipt ──
-    for rec in pending:
-        rec_id, owner_id, amount, description, created_at = rec
+    await send_next_receipt(interaction.user.id, channel, upcoming)
+    await interaction.followup.send("📬 Les reçus à valider arrivent en DM.")
+    logger.debug("Validation session started.")
 
-        # 3a) Prevent self‐validation
-        if owner_id == interaction.user.id:
-            await channel.send(
-                f"⚠️ Vous ne pouvez pas valider votre propre reçu #{rec_id}."
-            )
-            continue
-
-        # 3b) Show the receipt + buttons
-        embed, file = await build_embed_and_file(rec)
-        view = ValidationView(rec_id)
-        message = await channel.send(embed=embed, file=file, view=view)
-
-        await view.wait()
-
-        # 3c) If accepted or refused, update state & approver
-        if view.choice in ("accepted", "refused"):
-            async with bot.db.acquire() as conn:
-                async with conn.cursor() as cur:
-                    await cur.execute(
-                        """
-                        UPDATE factures
-                           SET state    = %s,
-                               approver = %s
-                         WHERE id       = %s
-                        """,
-                        (view.choice, interaction.user.id, rec_id)
-                    )
-
-            # Notify the owner
-            try:
-                user = await bot.fetch_user(owner_id)
-                await user.send(
-                    f"🧾 Votre reçu **#{rec_id}** a été **"
-                    f"{view.choice.upper()}** par <@{interaction.user.id}>."
-                )
-            except Exception as e:
-                logger.error(f"Erreur en notifiant {owner_id}: {e}")
+# -------------------------------
+# /validation_lot - Bulk accept/refuse (admin only)
+# -------------------------------
+# Persistent like the /validation buttons: the lot on screen and the receipts
+# ticked in its select menu are kept in `review_lots`, the running counts in
+# the buttons' custom_id, so any process can handle any click. An abandoned
+# lot holds nothing but its leases, which expire.
+LOT_ACTIONS = {
+    "accept": ("Accepter la sélection", ButtonStyle.success),
+    "refuse": ("Refuser la sélection",  ButtonStyle.danger),
+    "next":   ("Lot suivant",           ButtonStyle.secondary),
+    "end":    ("End",                   ButtonStyle.secondary),
+}
+
+def lot_queue(admin_id) -> ReviewQueue:
+    # A select menu holds at most 25 options
+    return ReviewQueue(bot.storage.factures, admin_id, batch_size=25, lease_seconds=VALIDATION_LEASE_SECONDS)
+
+def render_lot(lot, accepted, refused) -> str:
+    return (
+        f"📋 **{len(lot)} reçu(s) dans ce lot** — sélectionne puis accepte ou refuse.\n"
+        f"Traités: ✅ {accepted} · ❌ {refused}"
+    )
 
-            # Edit the admin’s DM message
-            await message.edit(
-                content=f"✅ Reçu #{rec_id} **{view.choice.upper()}**",
-                embed=None, attachments=[], view=None
-            )
+def lot_view(lot, accepted, refused) -> View:
+    view = View(timeout=None)
+    view.add_item(LotPicker.for_lot(lot))
+    for action in LOT_ACTIONS:
+        view.add_item(LotButton(action, accepted, refused))
+    return view
+
+class LotPicker(discord.ui.DynamicItem[discord.ui.Select], template=r"lot:pick"):
+    def __init__(self, select):
+        super().__init__(select)
+
+    @classmethod
+    def for_lot(cls, lot):
+        options = []
+        for (rec_id, owner_id, amount, description, created, *_image), _picked in lot:
+            options.append(discord.SelectOption(
+                label=f"#{rec_id} — {amount:.2f} $ — {description}"[:100],
+                description=f"{created:%Y-%m-%d} · {bot.directory.name(owner_id)}"[:100],
+                value=str(rec_id),
+            ))
+        return cls(discord.ui.Select(
+            custom_id="lot:pick", placeholder="Choisir les reçus…",
+            min_values=1, max_values=len(options), options=options, row=0,
+        ))
+
+    @classmethod
+    async def from_custom_id(cls, interaction: Interaction, item, match):
+        return cls(item)
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        return await is_admin(interaction.user.id)
+
+    async def callback(self, interaction: Interaction):
+        current_command.set("lot:pick")
+        with metrics.timer("component_seconds", component="lot:pick"):
+            # Stored before answering: the accept / refuse click may land on another process
+            await lot_queue(interaction.user.id).pick([int(value) for value in self.item.values])
+            await defer(interaction)
+
+class LotButton(discord.ui.DynamicItem[discord.ui.Button],
+                template=r"lot:(?P<action>accept|refuse|next|end):(?P<accepted>[0-9]+):(?P<refused>[0-9]+)"):
+    def __init__(self, action, accepted, refused):
+        label, style = LOT_ACTIONS[action]
+        super().__init__(discord.ui.Button(
+            label=label, style=style, row=1, custom_id=f"lot:{action}:{accepted}:{refused}"
+        ))
+        self.action = action
+        self.done   = {"accepted": accepted, "refused": refused}
+
+    @classmethod
+    async def from_custom_id(cls, interaction: Interaction, item, match):
+        return cls(match["action"], int(match["accepted"]), int(match["refused"]))
+
+    async def interaction_check(self, interaction: Interaction) -> bool:
+        return await is_admin(interaction.user.id)
+
+    async def callback(self, interaction: Interaction):
+        current_command.set(f"lot:{self.action}")
+        with metrics.timer("component_seconds", component=f"lot:{self.action}"):
+            await self.handle(interaction)
+
+    async def handle(self, interaction: Interaction):
+        queue = lot_queue(interaction.user.id)
+
+        # Accept / refuse the ticked receipts, in one transaction
+        if self.action in ("accept", "refuse"):
+            picked = [rec[0] for rec, is_picked in await queue.lot() if is_picked]
+            if not picked:
+                await reply(interaction, "☝️ Sélectionne d'abord des reçus.", ephemeral=True)
+                return
+            await defer(interaction)
 
-        # 3d) Skip just edits the message and continues
-        elif view.choice == "skip":
-            await message.edit(
-                content=f"⏩ Reçu #{rec_id} ignoré (pour l'instant).",
-                embed=None, attachments=[], view=None
-            )
-            continue
+            choice = "accepted" if self.action == "accept" else "refused"
+            decided = await queue.decide_many(picked, choice)
+            self.done[choice] += len(decided)
+            # Owners get one summary DM (debounced, flushed when the session ends)
+            for rec_id, owner_id in decided:
+                bot.notifier.add(owner_id, rec_id, choice, queue.admin_id)
+            lot = await queue.lot() or await queue.next_lot()
+
+        elif self.action == "next":
+            await defer(interaction)
+            lot = await queue.next_lot()
 
-        # 3e) End or timeout breaks out of the loop
-        elif view.choice == "end":
-            await message.edit(
-                content=f"❌ Validation interrompue au reçu #{rec_id}.",
-                embed=None, attachments=[], view=None
-            )
-            break
         else:
-            await message.edit(
-                content=f"⏰ Timeout sur reçu #{rec_id}, validation arrêtée.",
-                embed=None, attachments=[], view=None
-            )
-            break
+            await defer(interaction)
+            await self.finish(interaction, queue, "❌ Validation par lot terminée.")
+            return
+
+        if not lot:
+            await self.finish(interaction, queue, "🎉 Plus aucun reçu en attente.")
+            return
+        accepted, refused = self.done["accepted"], self.done["refused"]
+        await interaction.edit_original_response(
+            content=render_lot(lot, accepted, refused), view=lot_view(lot, accepted, refused)
+        )
+
+    async def finish(self, interaction: Interaction, queue, headline):
+        await queue.end_lot()
+        await bot.notifier.flush()
+        await interaction.edit_original_response(
+            content=f"{headline}\nTraités: ✅ {self.done['accepted']} · ❌ {self.done['refused']}",
+            view=None
+        )
+
+@bot.tree.command(
+    name="validation_lot",
+    description="Accepter/refuser des reçus en attente par lot (admin seulement)"
+)
+@auto_defer
+async def validation_lot(interaction: Interaction):
+    if not await is_admin(interaction.user.id):
+        await reply(interaction, "❌ Admin seulement.", ephemeral=True)
+        return
 
-    # ── 4) Final follow‐up in DM ──
-    await interaction.followup.send("🎉 Validation terminée.")
-    logger.debug("Validation command complete.")
+    await defer(interaction, ephemeral=True)
+
+    # Fresh session: a lot left over from a previous one goes back to the queue
+    queue = lot_queue(interaction.user.id)
+    await queue.end_lot()
+    lot = await queue.next_lot()
+    if not lot:
+        await interaction.followup.send("✅ Aucun reçu en attente.", ephemeral=True)
+        return
+
+    await interaction.followup.send(render_lot(lot, 0, 0), view=lot_view(lot, 0, 0), ephemeral=True)
 
 # -------------------------------
 # Main entry point
 # -------------------------------
 async def main():
-    await bot.start(TOKEN)
+    # SIGTERM (systemd stop) / Ctrl-C close the gateway; cleanup runs in the finally
+    loop = asyncio.get_running_loop()
+    if INTERACTIONS_MODE == "http":
+        stopping = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stopping.set)
+        try:
+            await serve_interactions(
+                bot, TOKEN, os.getenv("INTERACTIONS_PUBLIC_KEY"), stop_event=stopping,
+                host=os.getenv("INTERACTIONS_HOST", "127.0.0.1"),
+                port=int(os.getenv("INTERACTIONS_PORT", "8080")),
+                reuse_port=INTERACTIONS_WORKERS > 1,
+            )
+        finally:
+            await stop()
+            await shutdown()
+        return
 
-if __name__ == "__main__":
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.create_task(stop()))
+
+    try:
+        await bot.start(TOKEN)
+    finally:
+        await shutdown()
+
+def run_worker(index):
+    global WORKER_INDEX
+    WORKER_INDEX = index
     asyncio.run(main())
+
+if __name__ == "__main__":
+    if INTERACTIONS_MODE == "http" and INTERACTIONS_WORKERS > 1:
+        # Forked workers share the port through SO_REUSEPORT; the kernel spreads connections
+        workers = [multiprocessing.Process(target=run_worker, args=(i,), name=f"interactions-{i}")
+                   for i in range(INTERACTIONS_WORKERS)]
+        for worker in workers:
+            worker.start()
+        # Pass SIGTERM / Ctrl-C on; each worker shuts down cleanly on its own
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: [worker.terminate() for worker in workers])
+        for worker in workers:
+            worker.join()
+    else:
+        asyncio.run(main())
@@ -0,0 +1,107 @@
+# gateway_session.py
+
+# -------------------------------
+# Gateway session kept across restarts
+# -------------------------------
+# On a graceful shutdown the session id, last sequence number and resume URL
+# of the gateway websocket are written to a small JSON file, and the socket
+# is closed with a non-1000 code (1000 tells Discord to drop the session).
+# The next start RESUMEs that session instead of IDENTIFYing: no session
+# start is spent and Discord replays the events missed during the restart.
+#
+# discord.py always opens its first connection with IDENTIFY, so the client
+# module is pointed at ResumableWebSocket (`install()`), which starts from
+# the saved session when there is one. If Discord refuses the RESUME
+# (INVALID_SESSION) the library falls back to a normal IDENTIFY by itself.
+#
+# After a resumed restart no READY/GUILD_CREATE is received: on_ready does not
+# fire and the guild cache starts empty. Interactions carry what they need.
+import json
+import logging
+import os
+import time
+
+import discord.client
+import yarl
+from discord.gateway import DiscordWebSocket
+
+logger = logging.getLogger(__name__)
+
+# Close code that ends the connection but keeps the session resumable
+KEEP_SESSION_CLOSE_CODE = 4000
+
+
+class SessionFile:
+    """Session saved on shutdown, handed out once on the next start if still fresh."""
+
+    def __init__(self, path, window=120.0):
+        self.path   = path
+        self.window = window
+
+    def save(self, ws, user_id):
+        if ws is None or ws.session_id is None or ws.sequence is None:
+            return False
+        state = {
+            "user_id":    user_id,
+            "session_id": ws.session_id,
+            "sequence":   ws.sequence,
+            "resume_url": str(ws.gateway),
+            "saved_at":   time.time(),
+        }
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.path)
+        return True
+
+    def take(self, user_id):
+        """Return the saved session for `user_id` if within the resume window; the file is consumed either way."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        finally:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+        age = time.time() - state.get("saved_at", 0)
+        if state.get("user_id") != user_id or not 0 <= age <= self.window:
+            logger.info(f"Session gateway sauvegardée ignorée (âge {age:.0f}s)")
+            return None
+        return state
+
+
+class ResumableWebSocket(DiscordWebSocket):
+    @classmethod
+    async def from_client(cls, client, *, initial=False, **kwargs):
+        saved = getattr(client, "saved_session", None)
+        if saved is not None:
+            client.saved_session = None
+            kwargs.update(
+                gateway=yarl.URL(saved["resume_url"]),
+                session=saved["session_id"],
+                sequence=saved["sequence"],
+                resume=True,
+            )
+            initial = False
+            logger.info(f"RESUME de la session {saved['session_id']} (seq {saved['sequence']})")
+
+        ws = await super().from_client(client, initial=initial, **kwargs)
+        ws.client = client
+        return ws
+
+    async def close(self, code=KEEP_SESSION_CLOSE_CODE):
+        # Client.close() always passes 1000, which invalidates the session
+        client = getattr(self, "client", None)
+        if code == 1000 and getattr(client, "keep_gateway_session", False):
+            code = KEEP_SESSION_CLOSE_CODE
+        await super().close(code)
+
+
+def install():
+    discord.client.DiscordWebSocket = ResumableWebSocket
+
+
+def default_path() -> str:
+    return os.getenv("GATEWAY_SESSION_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".gateway_session.json"))
@@ -0,0 +1,86 @@
+# instrumentation.py
+
+# -------------------------------
+# Command and Discord REST metrics
+# -------------------------------
+#   command_seconds{command,status}    dispatch -> handler finished
+#   command_ack_seconds{command}       dispatch -> first response / defer (Discord allows 3 s)
+#   discord_rest_seconds{method,route} every REST call made by discord.py
+#   discord_rate_limited{scope}        429 responses (discord.py waits and retries them)
+#   discord_bucket_exhausted           responses that left a rate-limit bucket at 0
+# DB time is in db_query_seconds / db_pool_wait_seconds (db.py), statements
+# over SLOW_QUERY_MS in db_slow_queries{command} and slow_queries.py.
+import re
+import time
+
+import aiohttp
+from discord import app_commands
+
+from metrics import metrics
+from slow_queries import current_command
+
+_SNOWFLAKE = re.compile(r"/\d{15,21}(?=/|$)")
+_TOKEN     = re.compile(r"/[A-Za-z0-9_.\-]{60,}(?=/|$)")
+
+
+def started(interaction):
+    return interaction.extras.get("started")
+
+
+def command_name(interaction):
+    command = interaction.command
+    return command.qualified_name if command else "unknown"
+
+
+def acked(interaction):
+    """Record time-to-ack for the first response to `interaction` (see replies.py)."""
+    t0 = started(interaction)
+    if t0 is not None and not interaction.extras.get("acked"):
+        interaction.extras["acked"] = True
+        metrics.observe("command_ack_seconds", time.perf_counter() - t0, command=command_name(interaction))
+
+
+class InstrumentedTree(app_commands.CommandTree):
+    """CommandTree timing every slash command, successful or not."""
+
+    async def interaction_check(self, interaction) -> bool:
+        # HTTP mode stamps the request arrival before dispatching; keep that
+        interaction.extras.setdefault("started", time.perf_counter())
+        # Each interaction runs in its own task: attributes its slow queries
+        current_command.set(command_name(interaction))
+        return True
+
+    def completed(self, interaction, status):
+        t0 = started(interaction)
+        if t0 is not None:
+            metrics.observe("command_seconds", time.perf_counter() - t0, command=command_name(interaction), status=status)
+
+    async def on_error(self, interaction, error):
+        self.completed(interaction, "error")
+        await super().on_error(interaction, error)
+
+
+def route_of(url) -> str:
+    path = url.path.split("/api/v10", 1)[-1]
+    return _SNOWFLAKE.sub("/:id", _TOKEN.sub("/:token", path))
+
+
+def rest_trace() -> aiohttp.TraceConfig:
+    """aiohttp trace hooks for discord.py's HTTP client (`Client(http_trace=...)`)."""
+    trace = aiohttp.TraceConfig()
+
+    async def on_start(session, ctx, params):
+        ctx.started = time.perf_counter()
+
+    async def on_end(session, ctx, params):
+        response = params.response
+        metrics.observe("discord_rest_seconds", time.perf_counter() - ctx.started,
+                        method=params.method, route=route_of(params.url))
+        if response.status == 429:
+            metrics.inc("discord_rate_limited", scope=response.headers.get("X-RateLimit-Scope", "unknown"))
+        elif response.headers.get("X-RateLimit-Remaining") == "0":
+            metrics.inc("discord_bucket_exhausted")
+
+    trace.on_request_start.append(on_start)
+    trace.on_request_end.append(on_end)
+    return trace
@@ -0,0 +1,152 @@
+# interactions_http.py
+
+# -------------------------------
+# HTTP interactions endpoint (alternative to the gateway)
+# -------------------------------
+# Discord POSTs every interaction to INTERACTIONS_URL (set in the developer
+# portal) instead of sending it over the gateway websocket. Each request is
+#
+#   1. verified: Ed25519 signature of timestamp + body with the app's public key
+#   2. ACKed at once as deferred (type 5 for commands, 6 for components), and
+#   3. handed to the same app_commands tree / persistent items as the gateway
+#      path, with the interaction already marked as deferred, so handlers
+#      answer through followups (see replies.py).
+#
+# The response is written before the handler is scheduled: Discord must have
+# the ACK before the first followup arrives.
+#
+# The server keeps no state of its own, so several worker processes can bind
+# the same port with SO_REUSEPORT (INTERACTIONS_WORKERS in discordbot.py).
+# Every view the bot sends is persistent (DynamicItem, state in the custom_id
+# or the DB), so any worker can handle a click on it.
+#
+# Signature verification needs PyNaCl (`pip install pynacl`).
+import json
+import logging
+import time
+
+import discord
+from aiohttp import web
+
+from metrics import metrics
+
+try:
+    from nacl.exceptions import BadSignatureError
+    from nacl.signing import VerifyKey
+except ImportError:
+    VerifyKey = None
+
+logger = logging.getLogger(__name__)
+
+PING, APPLICATION_COMMAND, COMPONENT, AUTOCOMPLETE, MODAL_SUBMIT = 1, 2, 3, 4, 5
+EPHEMERAL = 1 << 6
+
+# Requests signed longer ago than this are refused (replayed captures)
+MAX_CLOCK_SKEW = 300
+
+
+class InteractionServer:
+    def __init__(self, client, public_key, *, host="127.0.0.1", port=8080, path="/interactions", reuse_port=False):
+        if VerifyKey is None:
+            raise RuntimeError("PyNaCl est requis pour le mode HTTP (pip install pynacl)")
+
+        self.client     = client
+        self.verify_key = VerifyKey(bytes.fromhex(public_key))
+        self.host       = host
+        self.port       = port
+        self.path       = path
+        self.reuse_port = reuse_port
+        self._runner    = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port, reuse_port=self.reuse_port or None)
+        await site.start()
+        logger.info(f"Interactions HTTP sur http://{self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def verify(self, signature, timestamp, body) -> bool:
+        try:
+            if abs(time.time() - int(timestamp)) > MAX_CLOCK_SKEW:
+                return False
+            self.verify_key.verify(timestamp.encode() + body, bytes.fromhex(signature))
+            return True
+        except (BadSignatureError, ValueError, TypeError):
+            return False
+
+    async def handle(self, request):
+        started = time.perf_counter()
+        body    = await request.read()
+        if not self.verify(request.headers.get("X-Signature-Ed25519"), request.headers.get("X-Signature-Timestamp"), body):
+            metrics.inc("interactions_http_rejected")
+            return web.Response(status=401, text="invalid request signature")
+
+        data = json.loads(body)
+        metrics.inc("interactions_http_requests")
+        if data["type"] == PING:
+            return web.json_response({"type": discord.InteractionResponseType.pong.value})
+
+        ack = self.ack_for(data)
+        if ack is None:
+            return web.Response(status=400, text="unsupported interaction type")
+
+        response = web.json_response(ack)
+        await response.prepare(request)
+        await response.write_eof()
+        metrics.observe("interactions_http_ack_seconds", time.perf_counter() - started)
+
+        self.dispatch(data, discord.InteractionResponseType(ack["type"]), started)
+        return response
+
+    def ack_for(self, data):
+        if data["type"] == APPLICATION_COMMAND:
+            # Visibility of the deferred reply is fixed by the ACK: commands
+            # answering publicly say so with extras={"ephemeral": False}
+            command = self.client.tree.get_command(data["data"]["name"])
+            ephemeral = command.extras.get("ephemeral", True) if command else True
+            return {"type": discord.InteractionResponseType.deferred_channel_message.value,
+                    "data": {"flags": EPHEMERAL if ephemeral else 0}}
+        if data["type"] in (COMPONENT, MODAL_SUBMIT):
+            return {"type": discord.InteractionResponseType.deferred_message_update.value}
+        if data["type"] == AUTOCOMPLETE:
+            # Autocomplete cannot be deferred; the bot defines none
+            return {"type": discord.InteractionResponseType.autocomplete_result.value, "data": {"choices": []}}
+        return None
+
+    def dispatch(self, data, ack_type, started=None):
+        # Same routing as ConnectionState.parse_interaction_create, with the
+        # interaction already acknowledged
+        state = self.client._connection
+        interaction = discord.Interaction(data=data, state=state)
+        interaction.response._response_type = ack_type
+        if started is not None:
+            # Timed from the request's arrival (command_seconds); the ACK is already out
+            interaction.extras.update(started=started, acked=True)
+            if data["type"] == APPLICATION_COMMAND:
+                metrics.observe("command_ack_seconds", time.perf_counter() - started, command=data["data"]["name"])
+
+        if data["type"] == APPLICATION_COMMAND:
+            self.client.tree._from_interaction(interaction)
+        elif data["type"] == COMPONENT:
+            state._view_store.dispatch_view(data["data"]["component_type"], data["data"]["custom_id"], interaction)
+        elif data["type"] == MODAL_SUBMIT:
+            state._view_store.dispatch_modal(data["data"]["custom_id"], interaction, data["data"]["components"])
+        self.client.dispatch("interaction", interaction)
+
+
+async def serve(client, token, public_key, *, stop_event, **options):
+    """Log in over REST only (no gateway) and serve interactions until `stop_event` is set."""
+    server = InteractionServer(client, public_key, **options)
+    await client.login(token)
+    await server.start()
+    try:
+        await stop_event.wait()
+    finally:
+        await server.stop()
@@ -0,0 +1,131 @@
+# metrics.py
+
+# -------------------------------
+# In-process counters, gauges and histograms
+# -------------------------------
+# Every series may carry labels (`metrics.inc("x", command="stock")`).
+# `snapshot()` feeds /stats; `render()` is the Prometheus text format served
+# by `start_server()` on METRICS_PORT.
+import contextlib
+import math
+import time
+from collections import defaultdict
+
+from aiohttp import web
+
+# Latency buckets (seconds), from a cache hit to a slow Discord upload
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "peak")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)    # last slot is +Inf
+        self.count  = 0
+        self.total  = 0.0
+        self.peak   = 0.0
+
+    def add(self, seconds):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        self.counts[i] += 1
+        self.count     += 1
+        self.total     += seconds
+        self.peak       = max(self.peak, seconds)
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _series(name, key, extra=()):
+    pairs = key + tuple(extra)
+    if not pairs:
+        return name
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return f"{name}{{{inner}}}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metrics:
+    """Small registry shared by every part of the bot."""
+
+    def __init__(self):
+        self.counters = defaultdict(lambda: defaultdict(int))          # name -> labels -> value
+        self.gauges   = {}                                             # name -> callable returning the current value
+        self.timings  = defaultdict(lambda: defaultdict(Histogram))    # name -> labels -> Histogram
+
+    def inc(self, name, value=1, **labels):
+        self.counters[name][_key(labels)] += value
+
+    def gauge(self, name, fn):
+        self.gauges[name] = fn
+
+    def observe(self, name, seconds, **labels):
+        self.timings[name][_key(labels)].add(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> dict:
+        snap = {}
+        for name, series in self.counters.items():
+            for key, value in series.items():
+                snap[_series(name, key)] = value
+        for name, fn in self.gauges.items():
+            snap[name] = fn()
+        for name, series in self.timings.items():
+            for key, hist in series.items():
+                snap[_series(f"{name}_count", key)] = hist.count
+                snap[_series(f"{name}_avg", key)]   = hist.total / hist.count if hist.count else 0.0
+                snap[_series(f"{name}_max", key)]   = hist.peak
+        return snap
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for name, series in sorted(self.counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            lines.extend(f"{_series(name, key)} {value}" for key, value in sorted(series.items()))
+        for name, fn in sorted(self.gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {fn()}")
+        for name, series in sorted(self.timings.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for key, hist in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (math.inf,), hist.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    lines.append(f"{_series(f'{name}_bucket', key, [('le', le)])} {cumulative}")
+                lines.append(f"{_series(f'{name}_sum', key)} {hist.total}")
+                lines.append(f"{_series(f'{name}_count', key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+async def start_server(host, port):
+    """Serve GET /metrics; returns the aiohttp runner (call `cleanup()` to stop)."""
+    async def handle(request):
+        return web.Response(text=metrics.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
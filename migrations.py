@@ -0,0 +1,610 @@
+# migrations.py
+
+# -------------------------------
+# Versioned schema migrations + EXPLAIN check
+# -------------------------------
+# Every change to the schema is a numbered migration with a MySQL and a
+# SQLite version. `migrate()` applies the ones missing from
+# `schema_migrations`, in order, under a lock (several HTTP workers start at
+# once); `storage.prepare()` calls it at startup.
+#
+# MySQL DDL is not transactional, so each MySQL step is idempotent
+# (IF NOT EXISTS, ensure_columns, ensure_index): a migration interrupted
+# halfway simply runs again. SQLite runs the whole batch in one transaction.
+# Never edit a migration that has shipped: add a new one.
+#
+#   python migrations.py status     # applied / pending versions
+#   python migrations.py migrate
+#   python migrations.py check      # EXPLAIN every repository query, flag full table scans
+#
+# `check` runs each repository method against a recorder that captures the
+# SQL instead of executing it, then EXPLAINs the captured statements on the
+# real database: the statements checked are exactly the ones the bot runs.
+# Statements that only run after a hit (decide's follow-up SELECT,
+# decide_many's UPDATE) are reached by giving those samples canned rows.
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+from datetime import datetime
+from typing import NamedTuple
+
+from dotenv import load_dotenv
+
+from db import PinnedConnection, ensure_columns
+from storage import open_storage
+
+
+class Migration(NamedTuple):
+    version: int
+    name:    str
+    mysql:   list     # SQL strings or `async fn(db)` steps
+    sqlite:  list     # SQL strings
+
+
+# -------------------------------
+# MySQL steps
+# -------------------------------
+async def ensure_index(db, table, name, columns):
+    """Create index `name` unless an index already starts with `columns` (e.g. one made by hand)."""
+    rows = await db.fetchall(
+        """
+        SELECT INDEX_NAME, COLUMN_NAME
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+        """,
+        (table,)
+    )
+    existing = {}
+    for index, column in rows:
+        existing.setdefault(index, []).append(column)
+    if not any(cols[:len(columns)] == list(columns) for cols in existing.values()):
+        await db.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+
+
+def index(table, name, *columns):
+    async def step(db):
+        await ensure_index(db, table, name, columns)
+    return step
+
+
+async def receipt_image_columns(db):
+    # Images moved to the receipt store; image_blob stays (nullable) until `receipt_store.py migrate`
+    existing = await ensure_columns(db, "factures", {
+        "image_sha256": "CHAR(64) NULL",
+        "image_size":   "INT UNSIGNED NULL",
+        "image_mime":   "VARCHAR(64) NULL",
+    })
+    blob = existing.get("image_blob")
+    if blob and blob[1] == "NO":
+        await db.execute(f"ALTER TABLE factures MODIFY image_blob {blob[0]} NULL")
+
+
+async def review_lease_columns(db):
+    await ensure_columns(db, "factures", {
+        "lease_owner":      "BIGINT NULL",
+        "lease_expires_at": "DATETIME NULL",
+        "skipped_by":       "BIGINT NULL",
+    })
+
+
+# -------------------------------
+# Migrations
+# -------------------------------
+MIGRATIONS = [
+    Migration(1, "base tables", mysql=[
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            discord_id BIGINT PRIMARY KEY,
+            first_name VARCHAR(64)  NOT NULL,
+            last_name  VARCHAR(64)  NOT NULL,
+            tel        VARCHAR(32)  NULL,
+            email      VARCHAR(255) NULL,
+            role       VARCHAR(16)  NOT NULL DEFAULT 'MEMBER'
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS stock (
+            id       INT AUTO_INCREMENT PRIMARY KEY,
+            item     VARCHAR(128)  NOT NULL,
+            size     VARCHAR(16)   NOT NULL,
+            quantity INT           NOT NULL,
+            prix     DECIMAL(10,2) NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS factures (
+            id          INT AUTO_INCREMENT PRIMARY KEY,
+            discord_id  BIGINT        NOT NULL,
+            amount      DECIMAL(10,2) NOT NULL,
+            description VARCHAR(255)  NOT NULL,
+            image_blob  LONGBLOB      NULL,
+            state       ENUM('pending', 'accepted', 'refused') NOT NULL DEFAULT 'pending',
+            approver    BIGINT        NULL,
+            created_at  DATETIME      NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ], sqlite=[
+        # SQLite deployments started after the image store and the leases: all columns from the start
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            discord_id INTEGER PRIMARY KEY,
+            first_name TEXT NOT NULL,
+            last_name  TEXT NOT NULL,
+            tel        TEXT NULL,
+            email      TEXT NULL,
+            role       TEXT NOT NULL DEFAULT 'MEMBER'
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS stock (
+            id       INTEGER PRIMARY KEY AUTOINCREMENT,
+            item     TEXT          NOT NULL,
+            size     TEXT          NOT NULL,
+            quantity INTEGER       NOT NULL,
+            prix     DECIMAL(10,2) NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS factures (
+            id               INTEGER PRIMARY KEY AUTOINCREMENT,
+            discord_id       INTEGER       NOT NULL,
+            amount           DECIMAL(10,2) NOT NULL,
+            description      TEXT          NOT NULL,
+            image_blob       BLOB          NULL,
+            image_sha256     TEXT          NULL,
+            image_size       INTEGER       NULL,
+            image_mime       TEXT          NULL,
+            state            TEXT          NOT NULL DEFAULT 'pending' CHECK (state IN ('pending', 'accepted', 'refused')),
+            approver         INTEGER       NULL,
+            lease_owner      INTEGER       NULL,
+            lease_expires_at DATETIME      NULL,
+            skipped_by       INTEGER       NULL,
+            created_at       DATETIME      NOT NULL
+        )
+        """,
+    ]),
+
+    Migration(2, "receipt images on disk", mysql=[receipt_image_columns], sqlite=[]),
+
+    Migration(3, "validation leases", mysql=[review_lease_columns], sqlite=[]),
+
+    Migration(4, "mail outbox", mysql=[
+        """
+        CREATE TABLE IF NOT EXISTS mail_outbox (
+            id              BIGINT AUTO_INCREMENT PRIMARY KEY,
+            recipients      VARCHAR(1024) NOT NULL,
+            body            MEDIUMTEXT    NOT NULL,
+            state           ENUM('pending', 'sent', 'failed') NOT NULL DEFAULT 'pending',
+            attempts        INT           NOT NULL DEFAULT 0,
+            last_error      VARCHAR(255)  NULL,
+            next_attempt_at DATETIME      NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            created_at      DATETIME      NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            sent_at         DATETIME      NULL,
+            KEY idx_outbox_due (state, next_attempt_at)
+        )
+        """,
+    ], sqlite=[
+        """
+        CREATE TABLE IF NOT EXISTS mail_outbox (
+            id              INTEGER PRIMARY KEY AUTOINCREMENT,
+            recipients      TEXT     NOT NULL,
+            body            TEXT     NOT NULL,
+            state           TEXT     NOT NULL DEFAULT 'pending' CHECK (state IN ('pending', 'sent', 'failed')),
+            attempts        INTEGER  NOT NULL DEFAULT 0,
+            last_error      TEXT     NULL,
+            next_attempt_at DATETIME NOT NULL,
+            created_at      DATETIME NOT NULL,
+            sent_at         DATETIME NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_outbox_due ON mail_outbox (state, next_attempt_at)",
+    ]),
+
+    # One index per hot query (InnoDB / SQLite indexes end with the primary key):
+    #   users_discord          role lookups, the directory / report joins
+    #   users_name             directory and /recus_admin order, no sort
+    #   stock_listing          /stock: covers the whole query, read in display order
+    #   factures_owner         /recu_info pages (discord_id, created_at DESC, id DESC), own_pending, report join
+    #   factures_state         /validation claim: oldest pending first
+    #   factures_accepted      /recus_admin totals, answered from the index alone
+    #   factures_lease         leased / release / renew: an admin's live leases
+    #   factures_skipped       release of an admin's skips
+    #   factures_digest        receipt store gc
+    Migration(5, "hot query indexes", mysql=[
+        index("users",    "idx_users_discord",     "discord_id"),
+        index("users",    "idx_users_name",        "last_name", "first_name", "discord_id"),
+        index("stock",    "idx_stock_listing",     "item", "size", "quantity", "prix"),
+        index("factures", "idx_factures_owner",    "discord_id", "created_at"),
+        index("factures", "idx_factures_state",    "state", "created_at"),
+        index("factures", "idx_factures_accepted", "state", "discord_id", "amount"),
+        index("factures", "idx_factures_lease",    "lease_owner", "state", "created_at"),
+        index("factures", "idx_factures_skipped",  "skipped_by"),
+        index("factures", "idx_factures_digest",   "image_sha256"),
+    ], sqlite=[
+        # users.discord_id is the rowid
+        "CREATE INDEX IF NOT EXISTS idx_users_name        ON users (last_name, first_name, discord_id)",
+        "CREATE INDEX IF NOT EXISTS idx_stock_listing     ON stock (item, size, quantity, prix)",
+        "CREATE INDEX IF NOT EXISTS idx_factures_owner    ON factures (discord_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_factures_state    ON factures (state, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_factures_accepted ON factures (state, discord_id, amount)",
+        "CREATE INDEX IF NOT EXISTS idx_factures_lease    ON factures (lease_owner, state, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_factures_skipped  ON factures (skipped_by)",
+        "CREATE INDEX IF NOT EXISTS idx_factures_digest   ON factures (image_sha256)",
+    ]),
+
+    # /validation_lot: the receipts shown in an admin's lot session (in_lot =
+    # the lot on screen) and the ones ticked in its select menu, so any HTTP
+    # worker can handle the next click
+    Migration(6, "bulk validation lots", mysql=[
+        """
+        CREATE TABLE IF NOT EXISTS review_lots (
+            admin_id   BIGINT     NOT NULL,
+            facture_id INT        NOT NULL,
+            in_lot     TINYINT(1) NOT NULL DEFAULT 1,
+            picked     TINYINT(1) NOT NULL DEFAULT 0,
+            PRIMARY KEY (admin_id, facture_id)
+        )
+        """,
+    ], sqlite=[
+        """
+        CREATE TABLE IF NOT EXISTS review_lots (
+            admin_id   INTEGER NOT NULL,
+            facture_id INTEGER NOT NULL,
+            in_lot     INTEGER NOT NULL DEFAULT 1,
+            picked     INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (admin_id, facture_id)
+        )
+        """,
+    ]),
+]
+
+VERSIONS_TABLE = {
+    "mysql":  "CREATE TABLE IF NOT EXISTS schema_migrations "
+              "(version INT PRIMARY KEY, name VARCHAR(128) NOT NULL, applied_at DATETIME NOT NULL)",
+    "sqlite": "CREATE TABLE IF NOT EXISTS schema_migrations "
+              "(version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at DATETIME NOT NULL)",
+}
+
+
+# -------------------------------
+# Runner
+# -------------------------------
+@contextlib.asynccontextmanager
+async def migration_lock(storage):
+    """Hold the migration lock; yields the db (execute / fetchall) to run the steps on."""
+    db = storage.db
+    if storage.backend == "sqlite":
+        # One connection: the whole batch is one write transaction
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            await db.execute("ROLLBACK")
+            raise
+        await db.execute("COMMIT")
+        return
+
+    # MySQL: a named lock belongs to a connection, so the steps run on that
+    # same connection (with DB_POOL_MAX=1 there is no other one to take)
+    async with db.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT GET_LOCK('team_bot_migrations', 120)")
+            (locked,) = await cur.fetchone()
+            if locked != 1:
+                raise RuntimeError("Verrou des migrations non obtenu (une autre instance migre ?)")
+            try:
+                yield PinnedConnection(conn)
+            finally:
+                await cur.execute("SELECT RELEASE_LOCK('team_bot_migrations')")
+
+
+async def applied_versions(storage, db=None) -> dict:
+    db = db or storage.db
+    await db.execute(VERSIONS_TABLE[storage.backend])
+    return dict(await db.fetchall("SELECT version, name FROM schema_migrations"))
+
+
+async def migrate(storage, verbose=True):
+    """Apply the pending migrations; returns the versions applied."""
+    done = []
+    async with migration_lock(storage) as db:
+        applied = await applied_versions(storage, db)
+        for migration in MIGRATIONS:
+            if migration.version in applied:
+                continue
+            for step in getattr(migration, storage.backend):
+                if callable(step):
+                    await step(db)
+                else:
+                    await db.execute(step)
+            mark = db.placeholder
+            await db.execute(
+                f"INSERT INTO schema_migrations (version, name, applied_at) VALUES ({mark}, {mark}, {mark})",
+                (migration.version, migration.name, datetime.now())
+            )
+            done.append(migration.version)
+            if verbose:
+                print(f"🧱  Migration {migration.version} appliquée: {migration.name}")
+    return done
+
+
+# -------------------------------
+# EXPLAIN check
+# -------------------------------
+ADMIN_ID = 100000000000000001
+USER_ID  = 100000000000000002
+
+# Representative calls: (repository, method, args[, rows the recorder returns])
+SAMPLES = [
+    ("stock",    "in_stock",        ()),
+    ("stock",    "buy",             (1, 1, USER_ID)),
+    ("users",    "directory",       ()),
+    ("users",    "roles",           (1024,)),
+    ("users",    "role",            (USER_ID,)),
+    ("users",    "set_tel",         (USER_ID, "418-555-0000")),
+    ("users",    "set_email",       (USER_ID, "x@example.test")),
+    ("factures", "add",             (USER_ID, 10.0, "check", "0" * 64, 1, "image/png")),
+    ("factures", "page",            (USER_ID, 13)),
+    ("factures", "page",            (USER_ID, 13, (datetime(2026, 1, 1), 100))),
+    ("factures", "page",            (USER_ID, 12, None, (datetime(2026, 1, 1), 100))),
+    ("factures", "delete",          (1, USER_ID)),
+    ("factures", "get",             (1,)),
+    ("factures", "image",           (1,)),
+    ("factures", "legacy_blob",     (1,)),
+    ("factures", "digests",         ()),
+    ("factures", "accepted_totals", ()),
+    ("factures", "report",          ()),
+    ("factures", "claim",           (ADMIN_ID, 900, 10, (1, 2))),
+    ("factures", "leased",          (ADMIN_ID, 4)),
+    # The statements after a hit only run when there is a row: canned result rows
+    ("factures", "decide",          (1, "accepted", ADMIN_ID, 900), [(USER_ID,)]),
+    ("factures", "decide_many",     ((1, 2), "accepted", ADMIN_ID, 900), [(1, USER_ID), (2, USER_ID)]),
+    ("factures", "skip",            (1, ADMIN_ID, 900)),
+    ("factures", "release",         (ADMIN_ID,)),
+    ("factures", "release_ids",     ((1, 2), ADMIN_ID)),
+    ("factures", "own_pending",     (ADMIN_ID,)),
+    ("factures", "lot",             (ADMIN_ID,)),
+    ("factures", "lot_seen",        (ADMIN_ID,)),
+    ("factures", "add_lot",         (ADMIN_ID, (1, 2))),
+    ("factures", "pick",            (ADMIN_ID, (1, 2))),
+    ("factures", "clear_lot",       (ADMIN_ID,)),
+    ("mail",     "enqueue",         ("x@example.test", "body")),
+    ("mail",     "due",             (25,)),
+    ("mail",     "sent",            ((1, 2),)),
+    ("mail",     "failed",          (1, 8, "error")),
+    ("mail",     "retry",           (1, 2, "error", 60)),
+    ("mail",     "pending",         ()),
+]
+
+# These read every row by design: a scan is the plan
+EXPECTED_SCANS = {"users.directory", "users.roles", "factures.report"}
+
+
+class _RecordingCursor:
+    lastrowid = None
+
+    def __init__(self, statements, rows):
+        self.statements = statements
+        self.rows       = rows      # canned result of the current sample, usually none
+
+    @property
+    def rowcount(self):
+        return len(self.rows)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    # aiomysql (async) and sqlite3 (sync) flavours share the same names
+    def execute(self, sql, args=()):
+        if not sql.strip().upper().startswith(("BEGIN", "COMMIT", "ROLLBACK")):
+            self.statements.append((sql, tuple(args or ())))
+        return self._result(self)
+
+    def executemany(self, sql, rows):
+        return self.execute(sql, rows[0] if rows else ())
+
+    def fetchone(self):
+        return self._result(self.rows[0] if self.rows else None)
+
+    def fetchall(self):
+        return self._result(list(self.rows))
+
+    def fetchmany(self, size=None):
+        return self._result([])     # streamed results (the report) stop at once
+
+    def close(self):
+        return self._result(None)
+
+    def _result(self, value):
+        return value
+
+
+class _AsyncRecordingCursor(_RecordingCursor):
+    def _result(self, value):
+        async def result():
+            return value
+        return result()
+
+
+class MySQLRecorder:
+    """Stands in for db.Database: records statements, returns the sample's canned rows."""
+
+    def __init__(self):
+        self.statements = []
+        self.rows       = []
+
+    @contextlib.asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    def cursor(self, cursorclass=None):
+        return _AsyncRecordingCursor(self.statements, self.rows)
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class SQLiteRecorder:
+    """Stands in for storage_sqlite.SQLiteDatabase."""
+
+    def __init__(self):
+        self.statements = []
+        self.rows       = []
+        self.conn = _RecordingCursor(self.statements, self.rows)
+
+    async def run(self, fn, *args, label=None):
+        return fn(self.conn, *args)
+
+    async def transaction(self, fn, *args):
+        return fn(self.conn, *args)
+
+    async def execute(self, sql, params=()):
+        return self.conn.execute(sql, params).rowcount
+
+    async def executemany(self, sql, rows):
+        self.conn.executemany(sql, rows)
+
+    async def fetchall(self, sql, params=()):
+        return self.conn.execute(sql, params).fetchall()
+
+    async def fetchone(self, sql, params=()):
+        return self.conn.execute(sql, params).fetchone()
+
+
+async def captured_statements(storage):
+    """[(label, sql, args)] for every sample call, captured without touching the database."""
+    recorder = MySQLRecorder() if storage.backend == "mysql" else SQLiteRecorder()
+    captured = []
+    for repo_name, method, args, *rows in SAMPLES:
+        repo = type(getattr(storage, repo_name))(recorder)
+        recorder.statements.clear()
+        recorder.rows[:] = rows[0] if rows else []
+        result = getattr(repo, method)(*args)
+        try:
+            if hasattr(result, "__aiter__"):
+                async for _rows in result:
+                    pass
+            else:
+                await result
+        except (TypeError, ValueError):
+            pass    # unpacking an empty result, after the statement was captured
+        label = f"{repo_name}.{method}"
+        if any(seen.split("#")[0] == label for seen, _sql, _args in captured):
+            label += "'"    # a second sample of the same method
+        for n, (sql, sql_args) in enumerate(recorder.statements, 1):
+            captured.append((label if len(recorder.statements) == 1 else f"{label}#{n}", sql, sql_args))
+    return captured
+
+
+async def explain(storage, sql, args):
+    """[(table, full scan?, notes)] for one statement."""
+    plan = []
+    if storage.backend == "sqlite":
+        derived = set()     # materialized subqueries: reading them back is not a table scan
+        for _id, _parent, _unused, detail in await storage.db.fetchall(f"EXPLAIN QUERY PLAN {sql}", args):
+            if detail.startswith(("MATERIALIZE ", "CO-ROUTINE ")):
+                derived.add(detail.split()[1])
+            elif detail.startswith(("SCAN ", "SEARCH ")):
+                table = detail.split()[1]
+                if table in derived:
+                    continue
+                full  = detail.startswith("SCAN ") and "USING" not in detail and not table.startswith("(")
+                plan.append((table, full, ""))
+            elif detail.startswith("USE TEMP B-TREE"):
+                plan.append(("", False, detail.lower()))
+        return plan
+
+    async with storage.db.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(f"EXPLAIN {sql}", args)
+            names = [column[0].lower() for column in cur.description]
+            for row in await cur.fetchall():
+                row = dict(zip(names, row))
+                table = row.get("table") or ""
+                if table.startswith("<"):
+                    continue    # derived table / union result
+                extra = row.get("extra") or ""
+                notes = ", ".join(note for note in ("Using filesort", "Using temporary") if note in extra)
+                plan.append((table, row.get("type") == "ALL", notes.lower()))
+    return plan
+
+
+async def describe_plan(storage, sql, args) -> str:
+    """explain() on one line, for the slow-query log."""
+    parts = []
+    for table, scan, notes in await explain(storage, sql, args):
+        access = f"{table}: {'scan complet' if scan else 'index'}" if table else ""
+        parts.append(", ".join(part for part in (access, notes) if part))
+    return "; ".join(parts) or "aucune lecture"
+
+
+async def check(storage) -> int:
+    """EXPLAIN every captured statement; returns the number of unexpected full table scans."""
+    statements = await captured_statements(storage)
+    print(f"🔍  EXPLAIN de {len(statements)} requête(s) ({storage.describe()})")
+    width = max(len(label) for label, _sql, _args in statements)
+    unexpected = 0
+    for label, sql, args in statements:
+        plan = await explain(storage, sql, args)
+        scans = [table for table, scan, _notes in plan if scan]
+        notes = "; ".join(notes for _table, _scan, notes in plan if notes)
+        if scans and label.split("#")[0] in EXPECTED_SCANS:
+            status, text = "⚪", f"scan complet de {', '.join(scans)} (attendu)"
+        elif scans:
+            status, text = "🔴", f"scan complet de {', '.join(scans)}"
+            unexpected += 1
+        elif plan:
+            status, text = "✅", "index"
+        else:
+            status, text = "✅", "aucune lecture"
+        print(f"{status} {label:<{width}}  {text}{f' — {notes}' if notes else ''}")
+
+    if unexpected:
+        print(f"\n🔴 {unexpected} scan(s) complet(s) inattendu(s). Sur une table presque vide, "
+              f"l'optimiseur peut préférer un scan: vérifier avec des données réalistes.")
+    return unexpected
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Schema migrations")
+    parser.add_argument("command", choices=["status", "migrate", "check"])
+    args = parser.parse_args()
+
+    load_dotenv()
+    storage = await open_storage(password=os.getenv("DB_PASS"))
+    try:
+        if args.command == "status":
+            applied = await applied_versions(storage)
+            for migration in MIGRATIONS:
+                mark = "✅" if migration.version in applied else "⏳"
+                print(f"{mark} {migration.version:>3}  {migration.name}")
+        elif args.command == "migrate":
+            done = await migrate(storage)
+            print(f"✅  Schéma à jour ({len(done)} migration(s) appliquée(s))")
+        else:
+            # EXPLAIN needs every table and index the repositories expect
+            applied = await applied_versions(storage)
+            pending = [str(m.version) for m in MIGRATIONS if m.version not in applied]
+            if pending:
+                print(f"⏳  Migration(s) {', '.join(pending)} non appliquée(s): "
+                      f"lancer `python migrations.py migrate` d'abord.")
+                sys.exit(2)
+            sys.exit(1 if await check(storage) else 0)
+    finally:
+        await storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+# notifier.py
+
+# -------------------------------
+# Coalesced DMs to receipt owners
+# -------------------------------
+# Validation decisions are queued per owner and sent as one summary DM when
+# the admin's session ends, or once no new decision for that owner arrived
+# for `debounce` seconds (capped at `max_delay` after the first one).
+#
+# A single worker sends the DMs one after the other. discord.py's HTTP client
+# already waits on the per-route buckets reported in the X-RateLimit headers
+# (and retries 429s), so a serial sender never bursts into those limits.
+import asyncio
+import logging
+from collections import defaultdict
+
+import discord
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LABELS = {"accepted": "✅ ACCEPTED", "refused": "❌ REFUSED"}
+
+
+class OwnerNotifier:
+    def __init__(self, client, debounce=30.0, max_delay=300.0):
+        self.client    = client
+        self.debounce  = debounce
+        self.max_delay = max_delay
+        self._pending  = defaultdict(list)   # owner_id -> [(rec_id, choice, admin_id)]
+        self._first    = {}                  # owner_id -> loop time of the oldest queued decision
+        self._timers   = {}                  # owner_id -> TimerHandle
+        self._ready    = asyncio.Queue()
+        self._task     = None
+
+        metrics.gauge("notifier_pending_owners", lambda: len(self._pending))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(), name="owner-notifier")
+
+    def add(self, owner_id, rec_id, choice, admin_id):
+        loop = asyncio.get_running_loop()
+        self._pending[owner_id].append((rec_id, choice, admin_id))
+        self._first.setdefault(owner_id, loop.time())
+
+        # Debounce: restart the owner's timer, but never past max_delay
+        if owner_id in self._timers:
+            self._timers.pop(owner_id).cancel()
+        delay = min(self.debounce, self._first[owner_id] + self.max_delay - loop.time())
+        self._timers[owner_id] = loop.call_later(max(delay, 0), self._mark_ready, owner_id)
+
+    async def flush(self, owner_ids=None):
+        """Send now (end of a validation session) and wait until those DMs went out."""
+        owners = [o for o in (self._pending if owner_ids is None else owner_ids) if o in self._pending]
+        for owner_id in owners:
+            self._mark_ready(owner_id)
+        await self._ready.join()
+
+    async def close(self):
+        await self.flush()
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def _mark_ready(self, owner_id):
+        timer = self._timers.pop(owner_id, None)
+        if timer:
+            timer.cancel()
+        if owner_id in self._pending:
+            self._first.pop(owner_id, None)
+            self._ready.put_nowait((owner_id, self._pending.pop(owner_id)))
+
+    async def _run(self):
+        while True:
+            owner_id, decisions = await self._ready.get()
+            try:
+                await self._send(owner_id, decisions)
+            except Exception as e:
+                logger.error(f"Erreur en notifiant {owner_id}: {e}")
+            finally:
+                self._ready.task_done()
+
+    async def _send(self, owner_id, decisions):
+        # Cached user first; otherwise a bare Object is enough to open the DM channel
+        user = self.client.get_user(owner_id)
+        metrics.inc("notifier_user_cache_hits" if user else "notifier_user_cache_misses")
+        channel = await self.client.create_dm(user or discord.Object(id=owner_id))
+
+        grouped = defaultdict(list)
+        for rec_id, choice, admin_id in decisions:
+            grouped[choice, admin_id].append(f"**#{rec_id}**")
+
+        lines = ["🧾 Mise à jour de vos reçus:"]
+        for (choice, admin_id), receipts in grouped.items():
+            lines.append(f"{LABELS.get(choice, choice.upper())} par <@{admin_id}>: {', '.join(receipts)}")
+
+        await channel.send("\n".join(lines))
+        metrics.inc("notifier_dms_sent")
+        metrics.inc("notifier_decisions_sent", len(decisions))
@@ -0,0 +1,147 @@
+# outbox.py
+
+# -------------------------------
+# Persistent email outbox
+# -------------------------------
+# Purchases enqueue a row in `mail_outbox`; a background task drains it
+# through sendmail without ever blocking the event loop. Delivery is
+# at-least-once: a row only leaves the queue once sendmail exited with 0.
+# The queue's statements are in the storage backends (`storage.mail`), the
+# table comes from migration 4.
+import asyncio
+import logging
+import time
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SENDMAIL    = "/usr/sbin/sendmail"
+SENDER_NAME = "Siboire - Café William"
+
+
+class MailOutbox:
+    def __init__(self, mail, *, concurrency=4, batch_size=25, max_attempts=8,
+                 base_delay=30, max_delay=3600, batch_window=2.0,
+                 poll_interval=60.0, send_timeout=60.0):
+        self.mail          = mail            # storage.mail
+        self.concurrency   = concurrency
+        self.batch_size    = batch_size
+        self.max_attempts  = max_attempts
+        self.base_delay    = base_delay      # seconds, doubled per attempt
+        self.max_delay     = max_delay
+        self.batch_window  = batch_window    # wait this long after a wake-up so bursts share a batch
+        self.poll_interval = poll_interval   # retries are picked up at least this often
+        self.send_timeout  = send_timeout
+
+        self.depth   = 0
+        self._wake   = asyncio.Event()
+        self._sem    = asyncio.Semaphore(concurrency)
+        self._task   = None
+
+        metrics.gauge("outbox_queue_depth", lambda: self.depth)
+
+    # ── Lifecycle ──
+    async def start(self, deliver=True):
+        """With `deliver=False` this process only enqueues (another one sends)."""
+        await self._refresh_depth()
+        if deliver:
+            self._task = asyncio.create_task(self._run(), name="mail-outbox")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ── Producer side ──
+    async def enqueue(self, recipients, body):
+        await self.mail.enqueue(",".join(recipients), body)
+        self.depth += 1
+        metrics.inc("outbox_enqueued_total")
+        self._wake.set()
+
+    # ── Worker ──
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                batch = await self.mail.due(self.batch_size)
+            except Exception as e:
+                logger.error(f"Outbox: lecture de la file impossible: {e}")
+                batch = []
+
+            if not batch:
+                # Queue drained: sleep until a purchase wakes us or a retry comes due
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                    await asyncio.sleep(self.batch_window)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            results = await asyncio.gather(*(self._deliver(row) for row in batch))
+            try:
+                await self._record(batch, results)
+            except Exception as e:
+                logger.error(f"Outbox: mise à jour de la file impossible: {e}")
+                await asyncio.sleep(self.base_delay)
+
+    async def _deliver(self, row):
+        _id, recipients, body, _attempts = row
+        cmd = [SENDMAIL, "-F", SENDER_NAME] + recipients.split(",")
+
+        async with self._sem:
+            start = time.perf_counter()
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                try:
+                    _, stderr = await asyncio.wait_for(
+                        proc.communicate(body.encode()), self.send_timeout
+                    )
+                except asyncio.TimeoutError:
+                    proc.kill()
+                    await proc.wait()
+                    return "sendmail timeout"
+            except OSError as e:
+                return str(e)
+            finally:
+                metrics.observe("outbox_send_seconds", time.perf_counter() - start)
+
+        if proc.returncode != 0:
+            return f"sendmail exit {proc.returncode}: {stderr.decode(errors='replace').strip()}"
+        return None
+
+    async def _record(self, batch, results):
+        sent = [row[0] for row, error in zip(batch, results) if error is None]
+        if sent:
+            await self.mail.sent(sent)
+            metrics.inc("outbox_sent_total", len(sent))
+
+        for (mail_id, _recipients, _body, attempts), error in zip(batch, results):
+            if error is None:
+                continue
+            attempts += 1
+            if attempts >= self.max_attempts:
+                logger.error(f"❌ Erreur d'envoi de l'email #{mail_id}, abandon: {error}")
+                await self.mail.failed(mail_id, attempts, error[:255])
+                metrics.inc("outbox_failed_total")
+            else:
+                delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+                logger.warning(f"Erreur d'envoi de l'email #{mail_id} (essai {attempts}), "
+                               f"nouvel essai dans {delay}s: {error}")
+                await self.mail.retry(mail_id, attempts, error[:255], delay)
+                metrics.inc("outbox_retries_total")
+
+        await self._refresh_depth()
+
+    async def _refresh_depth(self):
+        self.depth = await self.mail.pending()
@@ -0,0 +1,62 @@
+# prefetch.py
+
+# -------------------------------
+# Look-ahead loader for review loops
+# -------------------------------
+import asyncio
+
+from metrics import metrics
+
+
+class LookaheadCache:
+    """Background `load(item)` for the items coming up next, under a memory budget.
+
+    `want(items)` schedules loads for the upcoming items (in order) and drops
+    anything no longer upcoming; their summed `cost(item)` (bytes) stays under
+    `budget`, except that one item is always allowed so an oversized receipt
+    cannot stall the look-ahead. `take(item)` returns the loaded value,
+    waiting for it or loading it on the spot on a miss (e.g. after a restart).
+    """
+
+    def __init__(self, load, *, key, cost=lambda item: 0, budget=32 * 1024 * 1024):
+        self.budget  = budget
+        self._load   = load
+        self._key    = key
+        self._cost   = cost
+        self._tasks  = {}       # key -> (task, cost)
+        self._held   = 0
+
+    def want(self, items):
+        keys = {self._key(item) for item in items}
+        for key in [key for key in self._tasks if key not in keys]:
+            self._drop(key)
+
+        for item in items:
+            key = self._key(item)
+            if key in self._tasks:
+                continue
+            cost = self._cost(item)
+            if self._tasks and self._held + cost > self.budget:
+                break
+            self._tasks[key] = (asyncio.create_task(self._load(item)), cost)
+            self._held += cost
+
+    async def take(self, item):
+        entry = self._tasks.pop(self._key(item), None)
+        if entry is None:
+            metrics.inc("prefetch_misses")
+            return await self._load(item)
+
+        task, cost = entry
+        self._held -= cost
+        metrics.inc("prefetch_hits" if task.done() else "prefetch_waits")
+        return await task
+
+    def clear(self):
+        for key in list(self._tasks):
+            self._drop(key)
+
+    def _drop(self, key):
+        task, cost = self._tasks.pop(key)
+        task.cancel()
+        self._held -= cost
@@ -0,0 +1,261 @@
+# receipt_store.py
+
+# -------------------------------
+# Content-addressed storage for receipt images
+# -------------------------------
+# Images live on disk as <root>/ab/cd/<sha256>; `factures` only keeps the
+# digest, size and mime type. Identical uploads share one file.
+#
+#   python receipt_store.py migrate   # move legacy factures.image_blob rows to disk
+#   python receipt_store.py gc        # delete files no receipt references anymore
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+
+from dotenv import load_dotenv
+
+from storage import open_storage
+
+MIME_EXTENSIONS = {
+    "image/jpeg":      ".jpg",
+    "image/png":       ".png",
+    "image/gif":       ".gif",
+    "image/webp":      ".webp",
+    "application/pdf": ".pdf",
+}
+
+
+def sniff_mime(head: bytes) -> str:
+    """Guess the mime type from the first bytes of the file."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"%PDF"):
+        return "application/pdf"
+    return "application/octet-stream"
+
+
+def extension_for(mime) -> str:
+    return MIME_EXTENSIONS.get(mime, ".bin")
+
+
+class ReceiptStore:
+    def __init__(self, root):
+        self.root = root
+
+    def path_for(self, digest) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest) -> bool:
+        return os.path.exists(self.path_for(digest))
+
+    def put_bytes(self, data: bytes):
+        """Store `data`, return (digest, size). Blocking: run it in a thread."""
+        digest = hashlib.sha256(data).hexdigest()
+        path   = self.path_for(digest)
+        if os.path.exists(path):
+            os.utime(path)    # fresh mtime keeps it out of a concurrent gc
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write next to the target then rename, so a crash never leaves a truncated file
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+        return digest, len(data)
+
+    def open_upload(self):
+        """Start an incremental write; blocking like put_bytes."""
+        incoming = os.path.join(self.root, ".incoming")
+        os.makedirs(incoming, exist_ok=True)
+        return ReceiptUpload(self, incoming)
+
+    def digests(self):
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if ".incoming" in dirnames:
+                dirnames.remove(".incoming")
+            for name in filenames:
+                if not name.startswith(".tmp-"):
+                    yield name
+
+
+class ReceiptUpload:
+    """Temp file + running sha256; `commit()` moves it to its content address."""
+
+    def __init__(self, store, incoming):
+        self.store = store
+        self.size  = 0
+        self._hash = hashlib.sha256()
+        fd, self._tmp = tempfile.mkstemp(dir=incoming, prefix=".tmp-")
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        self._hash.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        self._file.close()
+        digest = self._hash.hexdigest()
+        path   = self.store.path_for(digest)
+        if os.path.exists(path):
+            os.unlink(self._tmp)
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._tmp, path)
+        return digest, self.size
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._tmp):
+            os.unlink(self._tmp)
+
+
+class ReceiptRejected(Exception):
+    """Upload refused; the message is shown to the user as is."""
+
+
+async def stream_to_store(session, url, store, max_bytes, chunk_size=64 * 1024):
+    """Download `url` into the store chunk by chunk, return (digest, size, mime).
+
+    At most one chunk is held in memory, whatever the attachment size.
+    """
+    upload = await asyncio.to_thread(store.open_upload)
+    mime   = None
+    head   = b""     # held back until there is enough to sniff (reads can be a few bytes)
+
+    def sniff(data):
+        mime = sniff_mime(data[:16])
+        if mime not in MIME_EXTENSIONS:
+            raise ReceiptRejected("❌ Format non supporté (JPEG, PNG, GIF, WEBP ou PDF).")
+        return mime
+
+    async def write(data):
+        if upload.size + len(data) > max_bytes:
+            raise ReceiptRejected(f"❌ Fichier trop gros (max {max_bytes // (1024 * 1024)} Mo).")
+        await asyncio.to_thread(upload.write, data)
+
+    try:
+        async with session.get(url) as resp:
+            resp.raise_for_status()
+            async for chunk in resp.content.iter_chunked(chunk_size):
+                if mime is None:
+                    head += chunk
+                    if len(head) < 16:
+                        continue
+                    mime, chunk, head = sniff(head), head, b""
+                await write(chunk)
+
+        if mime is None:
+            if not head:
+                raise ReceiptRejected("❌ Fichier vide.")
+            # Shorter than 16 bytes in total
+            mime = sniff(head)
+            await write(head)
+        digest, size = await asyncio.to_thread(upload.commit)
+        return digest, size, mime
+    except BaseException:
+        await asyncio.to_thread(upload.abort)
+        raise
+
+
+async def migrate_blobs(db, store, batch_size=50, keep_blobs=False):
+    """Stream legacy `image_blob` rows to the store, one blob in memory at a time."""
+    moved, last_id = 0, 0
+    while True:
+        async with db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    SELECT id FROM factures
+                    WHERE id > %s AND image_sha256 IS NULL AND image_blob IS NOT NULL
+                    ORDER BY id
+                    LIMIT %s
+                    """,
+                    (last_id, batch_size)
+                )
+                ids = [row[0] for row in await cur.fetchall()]
+                if not ids:
+                    return moved
+
+                updates = []
+                for rec_id in ids:
+                    await cur.execute("SELECT image_blob FROM factures WHERE id = %s", (rec_id,))
+                    (blob,) = await cur.fetchone()
+                    digest, size = await asyncio.to_thread(store.put_bytes, blob)
+                    updates.append((digest, size, sniff_mime(blob[:16]), rec_id))
+                    del blob
+
+                if keep_blobs:
+                    sql = "UPDATE factures SET image_sha256 = %s, image_size = %s, image_mime = %s WHERE id = %s"
+                else:
+                    sql = ("UPDATE factures SET image_sha256 = %s, image_size = %s, image_mime = %s, "
+                           "image_blob = NULL WHERE id = %s")
+                await cur.executemany(sql, updates)
+
+        moved  += len(ids)
+        last_id = ids[-1]
+        print(f"📦  {moved} reçu(s) migré(s) (dernier id {last_id})")
+
+
+async def collect_garbage(factures, store, grace=3600):
+    """Delete stored files that no receipt references anymore (e.g. after /recu_enleve).
+
+    Files younger than `grace` seconds are kept: /recu writes the file before
+    inserting its row.
+    """
+    referenced = await factures.digests()
+
+    removed, cutoff = 0, time.time() - grace
+    for digest in list(store.digests()):
+        path = store.path_for(digest)
+        if digest not in referenced and os.path.getmtime(path) < cutoff:
+            os.unlink(path)
+            removed += 1
+    return removed
+
+
+def default_root() -> str:
+    return os.getenv("RECEIPTS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "receipts"))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Receipt image store maintenance")
+    parser.add_argument("command", choices=["migrate", "gc"])
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--keep-blobs", action="store_true", help="migrate without clearing image_blob")
+    args = parser.parse_args()
+
+    load_dotenv()
+    storage = await open_storage(password=os.getenv("DB_PASS"))
+    store   = ReceiptStore(default_root())
+    try:
+        await storage.prepare()
+        if args.command == "migrate":
+            if storage.backend != "mysql":
+                print("✅  Rien à migrer: les images blob n'existent que dans les anciennes bases MySQL")
+                return
+            moved = await migrate_blobs(storage.db, store, args.batch_size, args.keep_blobs)
+            print(f"✅  Migration terminée: {moved} reçu(s) déplacé(s) vers {store.root}")
+        else:
+            removed = await collect_garbage(storage.factures, store)
+            print(f"🗑️  {removed} fichier(s) orphelin(s) supprimé(s)")
+    finally:
+        await storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+# replies.py
+
+# -------------------------------
+# Interaction replies that work before or after the ACK
+# -------------------------------
+# An interaction can be acknowledged before its handler answers: by the
+# HTTP endpoint (interactions_http.py), or by `auto_defer` when the handler
+# runs close to Discord's 3-second deadline. Handlers go through these
+# helpers, which use the initial response while it is still free and the
+# followup webhook / original-response edit otherwise. A per-interaction lock
+# keeps a late handler reply and the auto-defer from both taking the
+# initial response.
+import asyncio
+import contextlib
+import functools
+import logging
+import os
+
+import discord
+
+from instrumentation import acked
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Seconds a command may run before it is deferred for it (Discord gives 3 s)
+AUTO_DEFER_BUDGET = float(os.getenv("AUTO_DEFER_BUDGET", "2.0"))
+
+
+@contextlib.asynccontextmanager
+async def _initial_response(interaction):
+    """Hold the interaction's lock; yields True while the initial response is still free."""
+    async with interaction.extras.setdefault("reply_lock", asyncio.Lock()):
+        yield not interaction.response.is_done()
+
+
+async def reply(interaction, content=None, **kwargs):
+    """`response.send_message`, or `followup.send` once the interaction is acknowledged."""
+    async with _initial_response(interaction) as free:
+        if free:
+            await interaction.response.send_message(content, **kwargs)
+            acked(interaction)
+            return
+    return await interaction.followup.send(content, **kwargs)
+
+
+async def defer(interaction, **kwargs):
+    """`response.defer`, a no-op when the interaction is already acknowledged."""
+    async with _initial_response(interaction) as free:
+        if free:
+            await interaction.response.defer(**kwargs)
+            acked(interaction)
+
+
+async def edit(interaction, **kwargs):
+    """Edit the message a component belongs to (`response.edit_message` or `edit_original_response`)."""
+    async with _initial_response(interaction) as free:
+        if free:
+            await interaction.response.edit_message(**kwargs)
+            acked(interaction)
+            return
+    await interaction.edit_original_response(**kwargs)
+
+
+def auto_defer(func):
+    """Defer a slash command for it if it has not answered within AUTO_DEFER_BUDGET seconds.
+
+    The deferred reply is ephemeral unless the command says otherwise with
+    extras={"ephemeral": False}; the handler's later `reply()` becomes its followup.
+    """
+    @functools.wraps(func)
+    async def wrapper(interaction, *args, **kwargs):
+        guard = asyncio.create_task(_defer_after(interaction, AUTO_DEFER_BUDGET))
+        try:
+            return await func(interaction, *args, **kwargs)
+        finally:
+            guard.cancel()
+
+    return wrapper
+
+
+async def _defer_after(interaction, budget):
+    await asyncio.sleep(budget)
+    command = interaction.command
+    async with _initial_response(interaction) as free:
+        if not free:
+            return
+        try:
+            await interaction.response.defer(ephemeral=command.extras.get("ephemeral", True), thinking=True)
+        except discord.HTTPException as e:
+            logger.warning(f"Auto-defer de /{command.qualified_name} échoué: {e}")
+            return
+        acked(interaction)
+    metrics.inc("auto_defer", command=command.qualified_name)
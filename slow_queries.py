@@ -0,0 +1,172 @@
+# slow_queries.py
+
+# -------------------------------
+# Slow-query log
+# -------------------------------
+# Every statement goes through `slow_queries.observe()` (db.TimedCursor for
+# MySQL, storage_sqlite.TimedConnection for SQLite). One slower than
+# SLOW_QUERY_MS is:
+#   - counted per statement and calling command (`top()`, /slow_queries),
+#   - EXPLAINed in a background task, at most once per statement every
+#     EXPLAIN_EVERY seconds (the plan is reused in between),
+#   - written as one JSON line to a rotating file (SLOW_QUERY_LOG).
+# Parameters are never logged, only their type (and length for strings /
+# bytes): they carry discord ids, emails and phone numbers.
+#
+# The calling command comes from the `current_command` context variable,
+# set by the command tree and the /validation buttons for the task handling
+# the interaction.
+import asyncio
+import contextvars
+import decimal
+import json
+import logging
+import logging.handlers
+import os
+import re
+import time
+from datetime import datetime
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+current_command = contextvars.ContextVar("current_command", default="-")
+
+EXPLAIN_EVERY   = 600.0
+EXPLAIN_TIMEOUT = 5.0
+
+
+def collapse(sql) -> str:
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def is_batch(args) -> bool:
+    """executemany() parameters: a list of rows."""
+    return isinstance(args, list) and bool(args) and isinstance(args[0], (list, tuple, dict))
+
+
+def redact(args):
+    """The shape of the parameters, without their values."""
+    if args is None:
+        return []
+    if is_batch(args):
+        return {"rows": len(args), "first": redact(args[0])}
+    if isinstance(args, dict):
+        return {key: _shape(value) for key, value in args.items()}
+    if not isinstance(args, (list, tuple)):
+        return [_shape(args)]
+    return [_shape(value) for value in args]
+
+
+def _shape(value):
+    if value is None:
+        return None
+    if isinstance(value, (str, bytes, bytearray)):
+        return f"{type(value).__name__}({len(value)})"
+    if isinstance(value, (list, tuple)):
+        return f"{type(value).__name__}({len(value)})"
+    if isinstance(value, (bool, int, float, decimal.Decimal, datetime)):
+        return type(value).__name__
+    return "?"
+
+
+class Offender:
+    __slots__ = ("query", "command", "count", "total", "peak", "plan", "last_seen")
+
+    def __init__(self, query, command):
+        self.query     = query
+        self.command   = command
+        self.count     = 0
+        self.total     = 0.0
+        self.peak      = 0.0
+        self.plan      = None
+        self.last_seen = None
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self.threshold = float(os.getenv("SLOW_QUERY_MS", "100")) / 1000
+        self.explainer = None     # async (sql, args) -> plan text, set by configure()
+        self.offenders = {}       # (query, command) -> Offender
+        self._plans    = {}       # query -> (plan, explained_at)
+        self._tasks    = set()
+        self._file     = None
+
+    def configure(self, path=None, explainer=None, max_bytes=5 * 1024 * 1024, backups=3):
+        """Start writing to `path` (rotating) and EXPLAIN through `explainer`."""
+        self.explainer = explainer
+        if path and self._file is None:
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._file = logging.getLogger("slow_queries.file")
+            self._file.propagate = False
+            self._file.setLevel(logging.INFO)
+            self._file.addHandler(handler)
+
+    def observe(self, sql, args, seconds, command=None):
+        if seconds < self.threshold or sql.lstrip()[:7].upper() == "EXPLAIN":
+            return
+        query   = collapse(sql)
+        command = command or current_command.get()
+        metrics.inc("db_slow_queries", command=command)
+
+        offender = self.offenders.get((query, command))
+        if offender is None:
+            offender = self.offenders[query, command] = Offender(query, command)
+        offender.count    += 1
+        offender.total    += seconds
+        offender.peak      = max(offender.peak, seconds)
+        offender.last_seen = datetime.now()
+
+        entry = {
+            "at":      offender.last_seen.isoformat(timespec="seconds"),
+            "ms":      round(seconds * 1000, 1),
+            "command": command,
+            "query":   query,
+            "params":  redact(args),
+        }
+        plan, explained_at = self._plans.get(query, (None, 0.0))
+        if self.explainer is None or time.monotonic() - explained_at < EXPLAIN_EVERY:
+            entry["plan"] = offender.plan = plan
+            self._write(entry)
+            return
+
+        # Claim the EXPLAIN now so a burst of the same statement runs it once
+        self._plans[query] = (plan, time.monotonic())
+        if is_batch(args):
+            args = args[0]
+        task = asyncio.get_running_loop().create_task(self._explain(entry, offender, sql, args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(self, entry, offender, sql, args):
+        try:
+            plan = await asyncio.wait_for(self.explainer(sql, args), EXPLAIN_TIMEOUT)
+        except Exception as e:
+            plan = f"EXPLAIN impossible: {type(e).__name__}: {e}"
+        self._plans[entry["query"]] = (plan, time.monotonic())
+        entry["plan"] = offender.plan = plan
+        self._write(entry)
+
+    def _write(self, entry):
+        if self._file is not None:
+            self._file.info(json.dumps(entry, ensure_ascii=False, default=str))
+        else:
+            logger.warning(f"Requête lente ({entry['ms']} ms, {entry['command']}): {entry['query'][:200]}")
+
+    def top(self, n=10):
+        """The `n` statements / commands that spent the most time over the threshold."""
+        return sorted(self.offenders.values(), key=lambda o: o.total, reverse=True)[:n]
+
+
+slow_queries = SlowQueryLog()
+
+
+def default_path(worker=0) -> str:
+    """SLOW_QUERY_LOG; HTTP workers other than the first get their own file (rotation is per process)."""
+    path = os.getenv("SLOW_QUERY_LOG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "slow_queries.log"))
+    if worker:
+        root, ext = os.path.splitext(path)
+        path = f"{root}.{worker}{ext}"
+    return path
@@ -0,0 +1,35 @@
+# storage.py
+
+# -------------------------------
+# Data-access layer
+# -------------------------------
+# The bot never writes SQL inline: it talks to four repositories, each with
+# a MySQL (storage_mysql.py) and an embedded SQLite (storage_sqlite.py)
+# implementation.
+#
+#   storage.stock      in_stock(), buy()
+#   storage.users      directory(), roles(), role(), set_tel(), set_email()
+#   storage.factures   receipts, the /recus_admin report, the /validation leases and lots
+#   storage.mail       the email outbox queue
+#
+# plus prepare() (apply the pending migrations.py migrations), describe() and close().
+# Rows are plain tuples in the column order documented on each method of the
+# MySQL repositories; DATETIME / DECIMAL come back as datetime / Decimal on
+# both backends.
+#
+# DB_BACKEND=mysql (default, DB_* variables) or sqlite (SQLITE_PATH).
+import os
+
+BACKENDS = ("mysql", "sqlite")
+
+
+async def open_storage(backend=None, *, password=None, path=None, **overrides):
+    """Connect to the configured backend; call `prepare()` before use."""
+    backend = backend or os.getenv("DB_BACKEND", "mysql")
+    if backend == "mysql":
+        from storage_mysql import MySQLStorage
+        return await MySQLStorage.create(password, **overrides)
+    if backend == "sqlite":
+        from storage_sqlite import SQLiteStorage
+        return await SQLiteStorage.create(path)
+    raise ValueError(f"DB_BACKEND inconnu: {backend!r} (attendu: {', '.join(BACKENDS)})")
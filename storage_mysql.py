@@ -0,0 +1,527 @@
+# storage_mysql.py
+
+# -------------------------------
+# MySQL repositories (aiomysql pool from db.py)
+# -------------------------------
+# The reference implementation of the interface described in storage.py;
+# every statement here is the one the handlers used to run inline.
+# Targets MySQL 5.7+ / MariaDB 10.1+: no window functions, CTEs or SKIP LOCKED.
+import decimal
+
+from db import Database, TimedSSCursor
+from migrations import migrate
+
+REVIEW_COLUMNS = "id, discord_id, amount, description, created_at, image_sha256, image_mime, image_size"
+LOT_COLUMNS    = ", ".join(f"f.{column}" for column in REVIEW_COLUMNS.split(", "))
+
+
+class MySQLStorage:
+    backend = "mysql"
+
+    def __init__(self, db: Database):
+        self.db       = db
+        self.stock    = StockRepository(db)
+        self.users    = UserRepository(db)
+        self.factures = ReceiptRepository(db)
+        self.mail     = MailRepository(db)
+
+    @classmethod
+    async def create(cls, password, **overrides):
+        return cls(await Database.create(password, **overrides))
+
+    async def prepare(self):
+        """Apply the pending schema migrations (migrations.py)."""
+        await migrate(self, verbose=True)
+
+    def describe(self) -> str:
+        return f"MySQL, pool de {self.db.pool.size} connexion(s)"
+
+    async def close(self):
+        await self.db.close()
+
+
+class StockRepository:
+    def __init__(self, db):
+        self.db = db
+
+    async def in_stock(self):
+        """(id, item, size, quantity, prix) of every item left, in display order."""
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT id, item, size, quantity, prix FROM stock WHERE quantity > 0 ORDER BY item, size")
+                return await cur.fetchall()
+
+    async def buy(self, item_id, quantity, buyer_id):
+        """Take `quantity` of an item if enough is left.
+
+        Returns (bought, row) with row = (item, size, quantity left, prix, buyer email),
+        or None if the item does not exist.
+        """
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                # Conditional decrement: the check and the write are one statement,
+                # so concurrent buyers can never oversell
+                await cur.execute(
+                    "UPDATE stock SET quantity = quantity - %s WHERE id = %s AND quantity >= %s",
+                    (quantity, item_id, quantity)
+                )
+                bought = cur.rowcount == 1
+
+                # Item info + buyer email, on the same connection checkout
+                await cur.execute(
+                    """
+                    SELECT s.item, s.size, s.quantity, s.prix, u.email
+                    FROM stock s
+                    LEFT JOIN users u ON u.discord_id = %s
+                    WHERE s.id = %s
+                    """,
+                    (buyer_id, item_id)
+                )
+                return bought, await cur.fetchone()
+
+
+class UserRepository:
+    def __init__(self, db):
+        self.db = db
+
+    async def directory(self):
+        """(discord_id, first_name, last_name, tel, email), sorted by name."""
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT discord_id, first_name, last_name, tel, email FROM users ORDER BY last_name, first_name")
+                return await cur.fetchall()
+
+    async def roles(self, limit):
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT discord_id, role FROM users LIMIT %s", (limit,))
+                return await cur.fetchall()
+
+    async def role(self, discord_id):
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT role FROM users WHERE discord_id = %s", (discord_id,))
+                row = await cur.fetchone()
+        return row[0] if row else None
+
+    async def set_tel(self, discord_id, tel):
+        await self._set("tel", discord_id, tel)
+
+    async def set_email(self, discord_id, email):
+        await self._set("email", discord_id, email)
+
+    async def _set(self, column, discord_id, value):
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(f"UPDATE users SET {column} = %s WHERE discord_id = %s", (value, discord_id))
+
+
+class ReceiptRepository:
+    """`factures`: the receipts, their image digests and the /validation leases."""
+
+    def __init__(self, db):
+        self.db = db
+
+    # ── Receipts ──
+    async def add(self, discord_id, amount, description, digest, size, mime):
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    INSERT INTO factures
+                      (discord_id, amount, description, image_sha256, image_size, image_mime, created_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                    """,
+                    (discord_id, amount, description, digest, size, mime)
+                )
+
+    async def page(self, discord_id, limit, after=None, before=None):
+        """Up to `limit` of a user's receipts, newest first, keyset-paginated on (created_at, id).
+
+        Rows are (id, amount, description, created_at, state, total): on the
+        first page `total` is the user's accepted total (a one-row derived
+        table over every receipt of the user, joined before LIMIT), NULL after.
+        `before` reads the `limit` receipts just newer than the cursor (paging back).
+        """
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                if before is not None:
+                    created, fid = before
+                    await cur.execute("""
+                        SELECT id, amount, description, created_at, state, NULL
+                        FROM factures
+                        WHERE discord_id = %s
+                          AND (created_at > %s OR (created_at = %s AND id > %s))
+                        ORDER BY created_at, id
+                        LIMIT %s
+                    """, (discord_id, created, created, fid, limit))
+                    return (await cur.fetchall())[::-1]
+                if after is None:
+                    await cur.execute("""
+                        SELECT f.id, f.amount, f.description, f.created_at, f.state, t.total
+                        FROM factures f
+                        CROSS JOIN (
+                            SELECT SUM(CASE WHEN state = 'accepted' THEN amount ELSE 0 END) AS total
+                            FROM factures
+                            WHERE discord_id = %s
+                        ) t
+                        WHERE f.discord_id = %s
+                        ORDER BY f.created_at DESC, f.id DESC
+                        LIMIT %s
+                    """, (discord_id, discord_id, limit))
+                else:
+                    created, fid = after
+                    await cur.execute("""
+                        SELECT id, amount, description, created_at, state, NULL
+                        FROM factures
+                        WHERE discord_id = %s
+                          AND (created_at < %s OR (created_at = %s AND id < %s))
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s
+                    """, (discord_id, created, created, fid, limit))
+                return await cur.fetchall()
+
+    async def delete(self, rec_id, discord_id) -> bool:
+        """Delete one of the user's own receipts; False if there is no such receipt."""
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("DELETE FROM factures WHERE id = %s AND discord_id = %s", (rec_id, discord_id))
+                return cur.rowcount == 1
+
+    async def get(self, rec_id):
+        """(id, discord_id, amount, description, created_at, state) or None."""
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT id, discord_id, amount, description, created_at, state FROM factures WHERE id = %s",
+                    (rec_id,)
+                )
+                return await cur.fetchone()
+
+    async def image(self, rec_id):
+        """(image_sha256, image_mime) or None."""
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT image_sha256, image_mime FROM factures WHERE id = %s", (rec_id,))
+                return await cur.fetchone()
+
+    async def legacy_blob(self, rec_id):
+        """Image of a receipt not moved to the store yet (see `receipt_store.py migrate`)."""
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT image_blob FROM factures WHERE id = %s", (rec_id,))
+                row = await cur.fetchone()
+        return row[0] if row else None
+
+    async def digests(self):
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT DISTINCT image_sha256 FROM factures WHERE image_sha256 IS NOT NULL")
+                return {row[0] for row in await cur.fetchall()}
+
+    # ── /recus_admin report ──
+    async def accepted_totals(self):
+        """({discord_id: accepted total}, grand total) over the registered users."""
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                # The grand total is the ROLLUP row (discord_id NULL)
+                await cur.execute("""
+                    SELECT f.discord_id, SUM(f.amount)
+                    FROM factures f
+                    JOIN users u ON u.discord_id = f.discord_id
+                    WHERE f.state = 'accepted'
+                    GROUP BY f.discord_id WITH ROLLUP
+                """)
+                totals = dict(await cur.fetchall())
+        return totals, totals.pop(None, None) or decimal.Decimal("0")
+
+    async def report(self, chunk=500):
+        """Every user with their receipts, in report order, `chunk` rows at a time (unbuffered cursor).
+
+        Rows are (discord_id, first_name, last_name, id, amount, description,
+        created_at, state); users without receipts come with NULL receipt columns.
+        """
+        async with self.db.acquire() as conn:
+            async with conn.cursor(TimedSSCursor) as cur:
+                await cur.execute("""
+                    SELECT u.discord_id, u.first_name, u.last_name,
+                           f.id, f.amount, f.description, f.created_at, f.state
+                    FROM users u
+                    LEFT JOIN factures f ON f.discord_id = u.discord_id
+                    ORDER BY u.last_name, u.first_name, u.discord_id, f.created_at
+                """)
+                while rows := await cur.fetchmany(chunk):
+                    yield rows
+
+    # ── /validation leases (see validation_queue.py) ──
+    async def claim(self, admin_id, lease_seconds, limit, exclude=()):
+        """Lease up to `limit` more pending receipts; returns the admin's `limit` oldest leases."""
+        skip   = f"AND id NOT IN ({','.join(['%s'] * len(exclude))})" if exclude else ""
+        params = [admin_id, lease_seconds, admin_id, admin_id, admin_id, *exclude, limit]
+
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"""
+                    UPDATE factures
+                       SET lease_owner      = %s,
+                           lease_expires_at = NOW() + INTERVAL %s SECOND
+                     WHERE state = 'pending'
+                       AND discord_id <> %s
+                       AND (lease_expires_at IS NULL OR lease_expires_at < NOW() OR lease_owner = %s)
+                       AND (skipped_by IS NULL OR skipped_by <> %s)
+                       {skip}
+                     ORDER BY created_at
+                     LIMIT %s
+                    """,
+                    params
+                )
+                await cur.execute(
+                    f"""
+                    SELECT {REVIEW_COLUMNS}
+                    FROM factures
+                    WHERE lease_owner = %s AND state = 'pending' {skip}
+                    ORDER BY created_at
+                    LIMIT %s
+                    """,
+                    [admin_id, *exclude, limit]
+                )
+                return await cur.fetchall()
+
+    async def leased(self, admin_id, limit):
+        """The admin's next `limit` receipts whose lease is still live."""
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"""
+                    SELECT {REVIEW_COLUMNS}
+                    FROM factures
+                    WHERE lease_owner = %s AND state = 'pending' AND lease_expires_at >= NOW()
+                    ORDER BY created_at
+                    LIMIT %s
+                    """,
+                    (admin_id, limit)
+                )
+                return await cur.fetchall()
+
+    async def decide(self, rec_id, choice, admin_id, lease_seconds):
+        """Record the decision; returns the owner id, or None if the receipt was no longer
+        pending or is leased to another admin."""
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    UPDATE factures
+                       SET state            = %s,
+                           approver         = %s,
+                           lease_owner      = NULL,
+                           lease_expires_at = NULL
+                     WHERE id = %s AND state = 'pending' AND discord_id <> %s
+                       AND (lease_owner = %s OR lease_owner IS NULL OR lease_expires_at < NOW())
+                    """,
+                    (choice, admin_id, rec_id, admin_id, admin_id)
+                )
+                owner_id = None
+                if cur.rowcount == 1:
+                    await cur.execute("SELECT discord_id FROM factures WHERE id = %s", (rec_id,))
+                    (owner_id,) = await cur.fetchone()
+                await self._renew(cur, admin_id, lease_seconds)
+        return owner_id
+
+    async def decide_many(self, rec_ids, choice, admin_id, lease_seconds):
+        """One decision for many leased receipts, in a single transaction; returns [(id, owner_id)] decided."""
+        placeholders = ",".join(["%s"] * len(rec_ids))
+
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await conn.begin()
+                try:
+                    await cur.execute(
+                        f"""
+                        SELECT id, discord_id FROM factures
+                        WHERE id IN ({placeholders}) AND state = 'pending' AND lease_owner = %s
+                        FOR UPDATE
+                        """,
+                        list(rec_ids) + [admin_id]
+                    )
+                    decided = await cur.fetchall()
+
+                    if decided:
+                        ids = [rec_id for rec_id, _owner in decided]
+                        await cur.execute(
+                            f"""
+                            UPDATE factures
+                               SET state            = %s,
+                                   approver         = %s,
+                                   lease_owner      = NULL,
+                                   lease_expires_at = NULL
+                             WHERE id IN ({",".join(["%s"] * len(ids))})
+                            """,
+                            [choice, admin_id] + ids
+                        )
+                    await self._renew(cur, admin_id, lease_seconds)
+                    await conn.commit()
+                except BaseException:
+                    await conn.rollback()
+                    raise
+        return list(decided)
+
+    async def skip(self, rec_id, admin_id, lease_seconds):
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "UPDATE factures SET lease_owner = NULL, lease_expires_at = NULL, skipped_by = %s "
+                    "WHERE id = %s AND (lease_owner = %s OR lease_owner IS NULL)",
+                    (admin_id, rec_id, admin_id)
+                )
+                await self._renew(cur, admin_id, lease_seconds)
+
+    async def release(self, admin_id):
+        """Give back every lease and skip of the admin."""
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "UPDATE factures SET lease_owner = NULL, lease_expires_at = NULL "
+                    "WHERE lease_owner = %s AND state = 'pending'",
+                    (admin_id,)
+                )
+                await cur.execute("UPDATE factures SET skipped_by = NULL WHERE skipped_by = %s", (admin_id,))
+
+    async def release_ids(self, rec_ids, admin_id):
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"UPDATE factures SET lease_owner = NULL, lease_expires_at = NULL "
+                    f"WHERE id IN ({','.join(['%s'] * len(rec_ids))}) AND lease_owner = %s",
+                    list(rec_ids) + [admin_id]
+                )
+
+    async def own_pending(self, admin_id):
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT id FROM factures WHERE state = 'pending' AND discord_id = %s ORDER BY created_at",
+                    (admin_id,)
+                )
+                return [row[0] for row in await cur.fetchall()]
+
+    # ── /validation_lot (review_lots, migration 6) ──
+    async def lot(self, admin_id):
+        """(REVIEW_COLUMNS..., picked) of the admin's lot on screen, still pending and leased to them."""
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"""
+                    SELECT {LOT_COLUMNS}, l.picked
+                    FROM review_lots l
+                    JOIN factures f ON f.id = l.facture_id
+                    WHERE l.admin_id = %s AND l.in_lot = 1 AND f.state = 'pending' AND f.lease_owner = %s
+                    ORDER BY f.created_at
+                    """,
+                    (admin_id, admin_id)
+                )
+                return await cur.fetchall()
+
+    async def lot_seen(self, admin_id):
+        """Ids of every receipt shown in the admin's lot session."""
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT facture_id FROM review_lots WHERE admin_id = %s", (admin_id,))
+                return [row[0] for row in await cur.fetchall()]
+
+    async def add_lot(self, admin_id, rec_ids):
+        """The lot on screen becomes `rec_ids`; the previous ones stay as seen."""
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("UPDATE review_lots SET in_lot = 0, picked = 0 WHERE admin_id = %s", (admin_id,))
+                if rec_ids:
+                    await cur.execute(
+                        f"INSERT INTO review_lots (admin_id, facture_id) "
+                        f"VALUES {','.join(['(%s, %s)'] * len(rec_ids))} "
+                        f"ON DUPLICATE KEY UPDATE in_lot = 1",
+                        [value for rec_id in rec_ids for value in (admin_id, rec_id)]
+                    )
+
+    async def pick(self, admin_id, rec_ids):
+        """The receipts ticked in the lot's select menu (replaces the previous choice)."""
+        picked = f"facture_id IN ({','.join(['%s'] * len(rec_ids))})" if rec_ids else "0"
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"UPDATE review_lots SET picked = {picked} WHERE admin_id = %s AND in_lot = 1",
+                    list(rec_ids) + [admin_id]
+                )
+
+    async def clear_lot(self, admin_id):
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("DELETE FROM review_lots WHERE admin_id = %s", (admin_id,))
+
+    async def _renew(self, cur, admin_id, lease_seconds):
+        # The session is alive: push back the expiry of what it still holds
+        await cur.execute(
+            "UPDATE factures SET lease_expires_at = NOW() + INTERVAL %s SECOND "
+            "WHERE lease_owner = %s AND state = 'pending'",
+            (lease_seconds, admin_id)
+        )
+
+
+class MailRepository:
+    """`mail_outbox` (see outbox.py)."""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def enqueue(self, recipients, body):
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("INSERT INTO mail_outbox (recipients, body) VALUES (%s, %s)", (recipients, body))
+
+    async def due(self, limit):
+        """(id, recipients, body, attempts) of the pending mails whose next attempt is due."""
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    SELECT id, recipients, body, attempts
+                    FROM mail_outbox
+                    WHERE state = 'pending' AND next_attempt_at <= NOW()
+                    ORDER BY next_attempt_at
+                    LIMIT %s
+                    """,
+                    (limit,)
+                )
+                return await cur.fetchall()
+
+    async def sent(self, mail_ids):
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    f"UPDATE mail_outbox SET state = 'sent', sent_at = NOW() "
+                    f"WHERE id IN ({','.join(['%s'] * len(mail_ids))})",
+                    list(mail_ids)
+                )
+
+    async def failed(self, mail_id, attempts, error):
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "UPDATE mail_outbox SET state = 'failed', attempts = %s, last_error = %s WHERE id = %s",
+                    (attempts, error, mail_id)
+                )
+
+    async def retry(self, mail_id, attempts, error, delay):
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "UPDATE mail_outbox SET attempts = %s, last_error = %s, "
+                    "next_attempt_at = NOW() + INTERVAL %s SECOND WHERE id = %s",
+                    (attempts, error, delay, mail_id)
+                )
+
+    async def pending(self) -> int:
+        async with self.db.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute("SELECT COUNT(*) FROM mail_outbox WHERE state = 'pending'")
+                (count,) = await cur.fetchone()
+        return count
@@ -0,0 +1,527 @@
+# storage_sqlite.py
+
+# -------------------------------
+# Embedded SQLite repositories
+# -------------------------------
+# Same interface as storage_mysql.py, on a single SQLite file: no server to
+# run, for small deployments, CI and benchmarks. sqlite3 is blocking, so the
+# connection lives on one dedicated thread and every call is shipped to it
+# with run_in_executor; statements are serialized, which is also what SQLite
+# does with writers. Multi-statement operations run as one BEGIN IMMEDIATE
+# transaction on that thread, so they are atomic even across HTTP workers
+# sharing the file. The schema comes from migrations.py.
+#
+# MySQL's NOW() / INTERVAL become Python datetimes passed as parameters, the
+# ROLLUP total is summed here, UPDATE ... LIMIT becomes UPDATE ... WHERE id IN
+# (SELECT ... LIMIT). DATETIME and DECIMAL columns read back as datetime and
+# Decimal, like aiomysql returns them. A DECIMAL column still stores a REAL
+# and SUM() has no declared type, so money is summed in integer cents
+# (CENTS) and turned back into a Decimal with from_cents().
+import asyncio
+import contextvars
+import decimal
+import functools
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from db import query_label
+from metrics import metrics
+from migrations import migrate
+from slow_queries import current_command, slow_queries
+
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" ", "seconds"))
+sqlite3.register_adapter(decimal.Decimal, str)
+sqlite3.register_converter("DATETIME", lambda b: datetime.fromisoformat(b.decode()))
+sqlite3.register_converter("DECIMAL", lambda b: decimal.Decimal(b.decode()))
+
+REVIEW_COLUMNS = "id, discord_id, amount, description, created_at, image_sha256, image_mime, image_size"
+LOT_COLUMNS    = ", ".join(f"f.{column}" for column in REVIEW_COLUMNS.split(", "))
+
+
+def default_path() -> str:
+    return os.getenv("SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.sqlite3"))
+
+
+# Amount in integer cents, for exact sums
+CENTS = "CAST(ROUND({} * 100) AS INTEGER)"
+
+
+def from_cents(cents):
+    return None if cents is None else decimal.Decimal(cents).scaleb(-2)
+
+
+def placeholders(values) -> str:
+    return ",".join("?" * len(values))
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection handing every statement slower than the threshold to the
+    slow-query log, back on the event loop (`loop` is set by SQLiteDatabase)."""
+
+    loop = None
+
+    def execute(self, sql, parameters=(), /):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._observe(sql, parameters, time.perf_counter() - started)
+
+    def executemany(self, sql, parameters, /):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            self._observe(sql, parameters, time.perf_counter() - started)
+
+    def _observe(self, sql, parameters, seconds):
+        if seconds >= slow_queries.threshold and self.loop is not None:
+            if not isinstance(parameters, (list, tuple, dict)):
+                parameters = None   # executemany() iterator, already consumed
+            self.loop.call_soon_threadsafe(slow_queries.observe, sql, parameters, seconds, current_command.get())
+
+
+class SQLiteDatabase:
+    """One sqlite3 connection, used only from its own thread."""
+
+    placeholder = "?"
+
+    def __init__(self, path):
+        self.path      = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        self._conn     = None
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+
+        def connect():
+            # isolation_level=None: autocommit, transactions are explicit
+            conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES, isolation_level=None,
+                                   factory=TimedConnection)
+            conn.loop = loop
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA busy_timeout = 5000")
+            return conn
+        self._conn = await loop.run_in_executor(self._executor, connect)
+
+    async def run(self, fn, *args, label=None):
+        """Call fn(conn, *args) on the connection's thread, timed in db_query_seconds."""
+        loop = asyncio.get_running_loop()
+        # Carry the context over so the slow-query log knows the calling command
+        call = functools.partial(contextvars.copy_context().run, fn, self._conn, *args)
+        with metrics.timer("db_query_seconds", query=label or fn.__name__):
+            return await loop.run_in_executor(self._executor, call)
+
+    async def transaction(self, fn, *args):
+        """fn(conn, *args) inside BEGIN IMMEDIATE ... COMMIT (ROLLBACK on error)."""
+        def atomically(conn, *args):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn, *args)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+        return await self.run(atomically, *args, label=fn.__name__)
+
+    async def execute(self, sql, params=()) -> int:
+        """Run one statement; returns the affected row count."""
+        return await self.run(lambda conn: conn.execute(sql, params).rowcount, label=query_label(sql))
+
+    async def executemany(self, sql, rows):
+        await self.run(lambda conn: conn.executemany(sql, rows).rowcount, label=query_label(sql))
+
+    async def fetchall(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall(), label=query_label(sql))
+
+    async def fetchone(self, sql, params=()):
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone(), label=query_label(sql))
+
+    async def close(self):
+        if self._conn is not None:
+            await self.run(lambda conn: conn.close(), label="close")
+            self._conn = None
+        self._executor.shutdown(wait=True)
+
+
+class SQLiteStorage:
+    backend = "sqlite"
+
+    def __init__(self, db: SQLiteDatabase):
+        self.db       = db
+        self.stock    = StockRepository(db)
+        self.users    = UserRepository(db)
+        self.factures = ReceiptRepository(db)
+        self.mail     = MailRepository(db)
+
+    @classmethod
+    async def create(cls, path=None):
+        db = SQLiteDatabase(path or default_path())
+        await db.open()
+        return cls(db)
+
+    async def prepare(self):
+        """Apply the pending schema migrations (migrations.py)."""
+        await migrate(self, verbose=True)
+
+    def describe(self) -> str:
+        return f"SQLite, {self.db.path}"
+
+    async def close(self):
+        await self.db.close()
+
+
+class StockRepository:
+    def __init__(self, db):
+        self.db = db
+
+    async def in_stock(self):
+        return await self.db.fetchall(
+            "SELECT id, item, size, quantity, prix FROM stock WHERE quantity > 0 ORDER BY item, size"
+        )
+
+    async def buy(self, item_id, quantity, buyer_id):
+        def buy(conn):
+            bought = conn.execute(
+                "UPDATE stock SET quantity = quantity - ? WHERE id = ? AND quantity >= ?",
+                (quantity, item_id, quantity)
+            ).rowcount == 1
+            row = conn.execute(
+                """
+                SELECT s.item, s.size, s.quantity, s.prix, u.email
+                FROM stock s
+                LEFT JOIN users u ON u.discord_id = ?
+                WHERE s.id = ?
+                """,
+                (buyer_id, item_id)
+            ).fetchone()
+            return bought, row
+        return await self.db.transaction(buy)
+
+
+class UserRepository:
+    def __init__(self, db):
+        self.db = db
+
+    async def directory(self):
+        return await self.db.fetchall(
+            "SELECT discord_id, first_name, last_name, tel, email FROM users ORDER BY last_name, first_name"
+        )
+
+    async def roles(self, limit):
+        return await self.db.fetchall("SELECT discord_id, role FROM users LIMIT ?", (limit,))
+
+    async def role(self, discord_id):
+        row = await self.db.fetchone("SELECT role FROM users WHERE discord_id = ?", (discord_id,))
+        return row[0] if row else None
+
+    async def set_tel(self, discord_id, tel):
+        await self.db.execute("UPDATE users SET tel = ? WHERE discord_id = ?", (tel, discord_id))
+
+    async def set_email(self, discord_id, email):
+        await self.db.execute("UPDATE users SET email = ? WHERE discord_id = ?", (email, discord_id))
+
+
+class ReceiptRepository:
+    def __init__(self, db):
+        self.db = db
+
+    # ── Receipts ──
+    async def add(self, discord_id, amount, description, digest, size, mime):
+        await self.db.execute(
+            """
+            INSERT INTO factures
+              (discord_id, amount, description, image_sha256, image_size, image_mime, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (discord_id, amount, description, digest, size, mime, datetime.now())
+        )
+
+    async def page(self, discord_id, limit, after=None, before=None):
+        if before is not None:
+            created, fid = before
+            rows = await self.db.fetchall("""
+                SELECT id, amount, description, created_at, state, NULL
+                FROM factures
+                WHERE discord_id = ?
+                  AND (created_at > ? OR (created_at = ? AND id > ?))
+                ORDER BY created_at, id
+                LIMIT ?
+            """, (discord_id, created, created, fid, limit))
+            return rows[::-1]
+        if after is None:
+            rows = await self.db.fetchall(f"""
+                SELECT f.id, f.amount, f.description, f.created_at, f.state, t.total
+                FROM factures f
+                CROSS JOIN (
+                    SELECT SUM(CASE WHEN state = 'accepted' THEN {CENTS.format("amount")} ELSE 0 END) AS total
+                    FROM factures
+                    WHERE discord_id = ?
+                ) t
+                WHERE f.discord_id = ?
+                ORDER BY f.created_at DESC, f.id DESC
+                LIMIT ?
+            """, (discord_id, discord_id, limit))
+            return [row[:5] + (from_cents(row[5]),) for row in rows]
+        created, fid = after
+        return await self.db.fetchall("""
+            SELECT id, amount, description, created_at, state, NULL
+            FROM factures
+            WHERE discord_id = ?
+              AND (created_at < ? OR (created_at = ? AND id < ?))
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, (discord_id, created, created, fid, limit))
+
+    async def delete(self, rec_id, discord_id) -> bool:
+        return await self.db.execute("DELETE FROM factures WHERE id = ? AND discord_id = ?", (rec_id, discord_id)) == 1
+
+    async def get(self, rec_id):
+        return await self.db.fetchone(
+            "SELECT id, discord_id, amount, description, created_at, state FROM factures WHERE id = ?", (rec_id,)
+        )
+
+    async def image(self, rec_id):
+        return await self.db.fetchone("SELECT image_sha256, image_mime FROM factures WHERE id = ?", (rec_id,))
+
+    async def legacy_blob(self, rec_id):
+        row = await self.db.fetchone("SELECT image_blob FROM factures WHERE id = ?", (rec_id,))
+        return row[0] if row else None
+
+    async def digests(self):
+        rows = await self.db.fetchall("SELECT DISTINCT image_sha256 FROM factures WHERE image_sha256 IS NOT NULL")
+        return {row[0] for row in rows}
+
+    # ── /recus_admin report ──
+    async def accepted_totals(self):
+        rows = await self.db.fetchall(f"""
+            SELECT f.discord_id, SUM({CENTS.format("f.amount")})
+            FROM factures f
+            JOIN users u ON u.discord_id = f.discord_id
+            WHERE f.state = 'accepted'
+            GROUP BY f.discord_id
+        """)
+        totals = {discord_id: from_cents(total) for discord_id, total in rows}
+        return totals, sum(totals.values(), decimal.Decimal("0"))
+
+    async def report(self, chunk=500):
+        cur = await self.db.run(lambda conn: conn.execute("""
+            SELECT u.discord_id, u.first_name, u.last_name,
+                   f.id, f.amount, f.description, f.created_at, f.state
+            FROM users u
+            LEFT JOIN factures f ON f.discord_id = u.discord_id
+            ORDER BY u.last_name, u.first_name, u.discord_id, f.created_at
+        """), label="report")
+        try:
+            while rows := await self.db.run(lambda conn: cur.fetchmany(chunk), label="report_fetch"):
+                yield rows
+        finally:
+            await self.db.run(lambda conn: cur.close(), label="report_close")
+
+    # ── /validation leases ──
+    async def claim(self, admin_id, lease_seconds, limit, exclude=()):
+        skip = f"AND id NOT IN ({placeholders(exclude)})" if exclude else ""
+
+        def claim(conn):
+            now = datetime.now()
+            conn.execute(
+                f"""
+                UPDATE factures
+                   SET lease_owner = ?, lease_expires_at = ?
+                 WHERE id IN (
+                       SELECT id FROM factures
+                       WHERE state = 'pending'
+                         AND discord_id <> ?
+                         AND (lease_expires_at IS NULL OR lease_expires_at < ? OR lease_owner = ?)
+                         AND (skipped_by IS NULL OR skipped_by <> ?)
+                         {skip}
+                       ORDER BY created_at
+                       LIMIT ?)
+                """,
+                [admin_id, now + timedelta(seconds=lease_seconds), admin_id, now, admin_id, admin_id, *exclude, limit]
+            )
+            return conn.execute(
+                f"""
+                SELECT {REVIEW_COLUMNS}
+                FROM factures
+                WHERE lease_owner = ? AND state = 'pending' {skip}
+                ORDER BY created_at
+                LIMIT ?
+                """,
+                [admin_id, *exclude, limit]
+            ).fetchall()
+        return await self.db.transaction(claim)
+
+    async def leased(self, admin_id, limit):
+        return await self.db.fetchall(
+            f"""
+            SELECT {REVIEW_COLUMNS}
+            FROM factures
+            WHERE lease_owner = ? AND state = 'pending' AND lease_expires_at >= ?
+            ORDER BY created_at
+            LIMIT ?
+            """,
+            (admin_id, datetime.now(), limit)
+        )
+
+    async def decide(self, rec_id, choice, admin_id, lease_seconds):
+        def decide(conn):
+            row = conn.execute(
+                """
+                UPDATE factures
+                   SET state = ?, approver = ?, lease_owner = NULL, lease_expires_at = NULL
+                 WHERE id = ? AND state = 'pending' AND discord_id <> ?
+                   AND (lease_owner = ? OR lease_owner IS NULL OR lease_expires_at < ?)
+                RETURNING discord_id
+                """,
+                (choice, admin_id, rec_id, admin_id, admin_id, datetime.now())
+            ).fetchone()
+            self._renew(conn, admin_id, lease_seconds)
+            return row[0] if row else None
+        return await self.db.transaction(decide)
+
+    async def decide_many(self, rec_ids, choice, admin_id, lease_seconds):
+        def decide_many(conn):
+            decided = conn.execute(
+                f"SELECT id, discord_id FROM factures "
+                f"WHERE id IN ({placeholders(rec_ids)}) AND state = 'pending' AND lease_owner = ?",
+                [*rec_ids, admin_id]
+            ).fetchall()
+            if decided:
+                ids = [rec_id for rec_id, _owner in decided]
+                conn.execute(
+                    f"UPDATE factures SET state = ?, approver = ?, lease_owner = NULL, lease_expires_at = NULL "
+                    f"WHERE id IN ({placeholders(ids)})",
+                    [choice, admin_id, *ids]
+                )
+            self._renew(conn, admin_id, lease_seconds)
+            return decided
+        return await self.db.transaction(decide_many)
+
+    async def skip(self, rec_id, admin_id, lease_seconds):
+        def skip(conn):
+            conn.execute(
+                "UPDATE factures SET lease_owner = NULL, lease_expires_at = NULL, skipped_by = ? "
+                "WHERE id = ? AND (lease_owner = ? OR lease_owner IS NULL)",
+                (admin_id, rec_id, admin_id)
+            )
+            self._renew(conn, admin_id, lease_seconds)
+        await self.db.transaction(skip)
+
+    async def release(self, admin_id):
+        def release(conn):
+            conn.execute(
+                "UPDATE factures SET lease_owner = NULL, lease_expires_at = NULL "
+                "WHERE lease_owner = ? AND state = 'pending'",
+                (admin_id,)
+            )
+            conn.execute("UPDATE factures SET skipped_by = NULL WHERE skipped_by = ?", (admin_id,))
+        await self.db.transaction(release)
+
+    async def release_ids(self, rec_ids, admin_id):
+        await self.db.execute(
+            f"UPDATE factures SET lease_owner = NULL, lease_expires_at = NULL "
+            f"WHERE id IN ({placeholders(rec_ids)}) AND lease_owner = ?",
+            [*rec_ids, admin_id]
+        )
+
+    async def own_pending(self, admin_id):
+        rows = await self.db.fetchall(
+            "SELECT id FROM factures WHERE state = 'pending' AND discord_id = ? ORDER BY created_at", (admin_id,)
+        )
+        return [row[0] for row in rows]
+
+    # ── /validation_lot ──
+    async def lot(self, admin_id):
+        return await self.db.fetchall(
+            f"""
+            SELECT {LOT_COLUMNS}, l.picked
+            FROM review_lots l
+            JOIN factures f ON f.id = l.facture_id
+            WHERE l.admin_id = ? AND l.in_lot = 1 AND f.state = 'pending' AND f.lease_owner = ?
+            ORDER BY f.created_at
+            """,
+            (admin_id, admin_id)
+        )
+
+    async def lot_seen(self, admin_id):
+        rows = await self.db.fetchall("SELECT facture_id FROM review_lots WHERE admin_id = ?", (admin_id,))
+        return [row[0] for row in rows]
+
+    async def add_lot(self, admin_id, rec_ids):
+        def add_lot(conn):
+            conn.execute("UPDATE review_lots SET in_lot = 0, picked = 0 WHERE admin_id = ?", (admin_id,))
+            conn.executemany(
+                "INSERT INTO review_lots (admin_id, facture_id) VALUES (?, ?) "
+                "ON CONFLICT (admin_id, facture_id) DO UPDATE SET in_lot = 1",
+                [(admin_id, rec_id) for rec_id in rec_ids]
+            )
+        await self.db.transaction(add_lot)
+
+    async def pick(self, admin_id, rec_ids):
+        picked = f"facture_id IN ({placeholders(rec_ids)})" if rec_ids else "0"
+        await self.db.execute(
+            f"UPDATE review_lots SET picked = {picked} WHERE admin_id = ? AND in_lot = 1",
+            [*rec_ids, admin_id]
+        )
+
+    async def clear_lot(self, admin_id):
+        await self.db.execute("DELETE FROM review_lots WHERE admin_id = ?", (admin_id,))
+
+    @staticmethod
+    def _renew(conn, admin_id, lease_seconds):
+        conn.execute(
+            "UPDATE factures SET lease_expires_at = ? WHERE lease_owner = ? AND state = 'pending'",
+            (datetime.now() + timedelta(seconds=lease_seconds), admin_id)
+        )
+
+
+class MailRepository:
+    def __init__(self, db):
+        self.db = db
+
+    async def enqueue(self, recipients, body):
+        now = datetime.now()
+        await self.db.execute(
+            "INSERT INTO mail_outbox (recipients, body, next_attempt_at, created_at) VALUES (?, ?, ?, ?)",
+            (recipients, body, now, now)
+        )
+
+    async def due(self, limit):
+        return await self.db.fetchall(
+            """
+            SELECT id, recipients, body, attempts
+            FROM mail_outbox
+            WHERE state = 'pending' AND next_attempt_at <= ?
+            ORDER BY next_attempt_at
+            LIMIT ?
+            """,
+            (datetime.now(), limit)
+        )
+
+    async def sent(self, mail_ids):
+        await self.db.execute(
+            f"UPDATE mail_outbox SET state = 'sent', sent_at = ? WHERE id IN ({placeholders(mail_ids)})",
+            [datetime.now(), *mail_ids]
+        )
+
+    async def failed(self, mail_id, attempts, error):
+        await self.db.execute(
+            "UPDATE mail_outbox SET state = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+            (attempts, error, mail_id)
+        )
+
+    async def retry(self, mail_id, attempts, error, delay):
+        await self.db.execute(
+            "UPDATE mail_outbox SET attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+            (attempts, error, datetime.now() + timedelta(seconds=delay), mail_id)
+        )
+
+    async def pending(self) -> int:
+        (count,) = await self.db.fetchone("SELECT COUNT(*) FROM mail_outbox WHERE state = 'pending'")
+        return count
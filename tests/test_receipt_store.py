@@ -0,0 +1,74 @@
+# test_receipt_store.py
+
+# -------------------------------
+# stream_to_store with short network reads
+# -------------------------------
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from receipt_store import ReceiptRejected, ReceiptStore, stream_to_store  # noqa: E402
+
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+class FakeContent:
+    def __init__(self, data, read_size):
+        self.data, self.read_size = data, read_size
+
+    async def iter_chunked(self, _n):
+        for i in range(0, len(self.data), self.read_size):
+            yield self.data[i:i + self.read_size]
+
+
+class FakeResponse:
+    def __init__(self, data, read_size):
+        self.content = FakeContent(data, read_size)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, data, read_size):
+        self.data, self.read_size = data, read_size
+
+    def get(self, _url):
+        return FakeResponse(self.data, self.read_size)
+
+
+class StreamToStoreTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.store = ReceiptStore(tempfile.mkdtemp(prefix="test-receipts-"))
+
+    async def test_signature_split_across_short_reads(self):
+        digest, size, mime = await stream_to_store(FakeSession(PNG, 3), "url", self.store, 1024)
+        self.assertEqual((size, mime), (len(PNG), "image/png"))
+        with open(self.store.path_for(digest), "rb") as f:
+            self.assertEqual(f.read(), PNG)
+
+    async def test_file_shorter_than_the_sniff_window(self):
+        _digest, size, mime = await stream_to_store(FakeSession(b"%PDF-1.4", 2), "url", self.store, 1024)
+        self.assertEqual((size, mime), (8, "application/pdf"))
+
+    async def test_rejects_unknown_format_and_empty_file(self):
+        with self.assertRaises(ReceiptRejected):
+            await stream_to_store(FakeSession(b"MZ\x90\x00" * 8, 3), "url", self.store, 1024)
+        with self.assertRaises(ReceiptRejected):
+            await stream_to_store(FakeSession(b"", 3), "url", self.store, 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+# test_storage_sqlite.py
+
+# -------------------------------
+# SQLite repositories
+# -------------------------------
+# Each test gets a fresh, migrated database file.
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import open_storage  # noqa: E402
+
+ADMIN_A, ADMIN_B, MEMBER, GHOST = 1001, 1002, 2001, 9999
+
+
+class SQLiteRepositoryTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        path = os.path.join(tempfile.mkdtemp(prefix="test-storage-"), "bot.sqlite3")
+        self.storage = await open_storage("sqlite", path=path)
+        await self.storage.prepare()
+        await self.storage.db.executemany(
+            "INSERT INTO users (discord_id, first_name, last_name, email, role) VALUES (?, ?, ?, ?, ?)",
+            [(ADMIN_A, "Ada", "A", "a@example.test", "ADMIN"), (ADMIN_B, "Bob", "B", None, "ADMIN"),
+             (MEMBER, "Max", "M", "m@example.test", "MEMBER")]
+        )
+        self.now = datetime.now().replace(microsecond=0)
+
+    async def asyncTearDown(self):
+        await self.storage.close()
+
+    async def receipts(self, rows):
+        """Insert (discord_id, amount, state, minutes ago); returns the ids in insertion order."""
+        db = self.storage.db
+        await db.executemany(
+            "INSERT INTO factures (discord_id, amount, description, state, created_at) VALUES (?, ?, 'test', ?, ?)",
+            [(owner, Decimal(amount), state, self.now - timedelta(minutes=ago)) for owner, amount, state, ago in rows]
+        )
+        return [row[0] for row in await db.fetchall("SELECT id FROM factures ORDER BY id")][-len(rows):]
+
+    async def states(self):
+        return dict(await self.storage.db.fetchall("SELECT id, state FROM factures"))
+
+    async def test_buy_never_oversells(self):
+        await self.storage.db.execute("INSERT INTO stock (item, size, quantity, prix) VALUES ('Chandail', 'M', 2, 25.50)")
+        (item_id,) = await self.storage.db.fetchone("SELECT id FROM stock")
+
+        bought, row = await self.storage.stock.buy(item_id, 1, MEMBER)
+        self.assertTrue(bought)
+        self.assertEqual(row, ("Chandail", "M", 1, Decimal("25.5"), "m@example.test"))
+
+        bought, row = await self.storage.stock.buy(item_id, 2, MEMBER)
+        self.assertFalse(bought)
+        self.assertEqual(row[2], 1)
+
+        self.assertEqual(await self.storage.stock.buy(item_id + 1, 1, MEMBER), (False, None))
+
+    async def test_page_keyset_order_and_exact_total(self):
+        # Two receipts share created_at: the id breaks the tie
+        ids = await self.receipts([
+            (MEMBER, "0.10", "accepted", 50), (MEMBER, "0.20", "accepted", 40), (MEMBER, "5.00", "pending", 30),
+            (MEMBER, "1.00", "refused", 30), (MEMBER, "0.05", "pending", 10), (ADMIN_A, "7.00", "accepted", 1),
+        ])
+        expected = [ids[4], ids[3], ids[2], ids[1], ids[0]]
+
+        factures = self.storage.factures
+        first = await factures.page(MEMBER, 2)
+        self.assertEqual([row[0] for row in first], expected[:2])
+        self.assertEqual(first[0][5], Decimal("0.30"))
+        self.assertIsInstance(first[0][5], Decimal)
+
+        seen = [row[0] for row in first]
+        after = (first[-1][3], first[-1][0])
+        while rows := await factures.page(MEMBER, 2, after):
+            self.assertIsNone(rows[0][5])
+            seen += [row[0] for row in rows]
+            after = (rows[-1][3], rows[-1][0])
+        self.assertEqual(seen, expected)
+
+    async def test_accepted_totals_are_exact_decimals(self):
+        await self.receipts([
+            (MEMBER, "0.10", "accepted", 3), (MEMBER, "0.20", "accepted", 2), (MEMBER, "9.99", "pending", 1),
+            (ADMIN_B, "19.99", "accepted", 1), (GHOST, "100.00", "accepted", 1),   # not a registered user
+        ])
+        totals, grand = await self.storage.factures.accepted_totals()
+        self.assertEqual(totals, {MEMBER: Decimal("0.30"), ADMIN_B: Decimal("19.99")})
+        self.assertEqual(grand, Decimal("20.29"))
+        self.assertEqual(str(totals[MEMBER]), "0.30")
+
+    async def test_claims_are_disjoint_and_decide_many_keeps_to_its_lease(self):
+        ids = await self.receipts([(MEMBER, "1.00", "pending", 60 - i) for i in range(5)]
+                                  + [(ADMIN_A, "2.00", "pending", 90)])     # A's own: never leased to A
+        factures = self.storage.factures
+
+        leased_a = [row[0] for row in await factures.claim(ADMIN_A, 900, 2)]
+        leased_b = [row[0] for row in await factures.claim(ADMIN_B, 900, 2)]
+        # Oldest first, skipping the admin's own receipt and the other admin's leases
+        self.assertEqual(leased_a, ids[:2])
+        self.assertEqual(leased_b, [ids[5], ids[2]])
+
+        decided = await factures.decide_many(leased_a + leased_b[:1], "accepted", ADMIN_A, 900)
+        self.assertEqual(sorted(decided), sorted((rec_id, MEMBER) for rec_id in leased_a))
+
+        states = await self.states()
+        self.assertEqual([states[rec_id] for rec_id in leased_a], ["accepted", "accepted"])
+        self.assertTrue(all(states[rec_id] == "pending" for rec_id in leased_b))
+
+    async def test_claim_returns_at_most_limit_rows(self):
+        ids = await self.receipts([(MEMBER, "1.00", "pending", 60 - i) for i in range(6)])
+        factures = self.storage.factures
+
+        # Leases from an earlier session stay with the admin, but one claim
+        # still hands back no more than `limit` of them (a Select holds 25)
+        await factures.claim(ADMIN_A, 900, 4)
+        leased = [row[0] for row in await factures.claim(ADMIN_A, 900, 3)]
+        self.assertEqual(leased, ids[:3])
+
+
+if __name__ == "__main__":
+    unittest.main()
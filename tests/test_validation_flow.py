@@ -0,0 +1,208 @@
+# test_validation_flow.py
+
+# -------------------------------
+# /validation, /validation_lot and /recu_info components against SQLite
+# -------------------------------
+# Uses the fake Discord objects from bench/loadtest.py. A "second process"
+# is simulated by emptying bot.review_lookahead, the only per-process state,
+# or by rebuilding a component from its custom_id alone (dispatch()).
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+os.environ.setdefault("SLOW_QUERY_LOG", os.path.join(tempfile.mkdtemp(prefix="test-slow-queries-"), "slow.log"))
+
+from loadtest import PNG, FakeDMClient, FakeInteraction, FakeUser, discordbot, execute  # noqa: E402
+from storage import open_storage  # noqa: E402
+
+bot = discordbot.bot
+
+ADMIN, OTHER_ADMIN, MEMBER = 1001, 1002, 2001
+
+
+class ValidationFlowTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        path = os.path.join(tempfile.mkdtemp(prefix="test-validation-"), "bot.sqlite3")
+        self.storage = await open_storage("sqlite", path=path)
+        await discordbot.init_services(self.storage, deliver_mail=False, dm_client=FakeDMClient())
+
+        digest, size = bot.receipts.put_bytes(PNG)
+        await execute(
+            self.storage,
+            "INSERT INTO users (discord_id, first_name, last_name, role) VALUES (%s, %s, %s, %s)",
+            [(ADMIN, "Ada", "Admin", "ADMIN"), (OTHER_ADMIN, "Otto", "Admin", "ADMIN"), (MEMBER, "Max", "Membre", "MEMBER")]
+        )
+        now = datetime.now().replace(microsecond=0)
+        await execute(
+            self.storage,
+            """
+            INSERT INTO factures (discord_id, amount, description, state, image_sha256, image_size, image_mime, created_at)
+            VALUES (%s, %s, %s, 'pending', %s, %s, 'image/png', %s)
+            """,
+            [(MEMBER, 10 + i, f"Reçu {i}", digest, size, now - timedelta(minutes=10 - i)) for i in range(5)]
+        )
+        self.ids = [row[0] for row in await execute(self.storage, "SELECT id FROM factures ORDER BY created_at", fetch=True)]
+        bot.roles.invalidate()
+        await bot.roles.warm()
+
+        self.admin = FakeUser(ADMIN, "Ada Admin")
+        self.other = FakeUser(OTHER_ADMIN, "Otto Admin")
+
+    async def asyncTearDown(self):
+        await bot.notifier.close()
+        await bot.outbox.stop()
+        await bot.http_session.close()
+        await self.storage.close()
+
+    async def start(self, admin, command="validation"):
+        interaction = FakeInteraction(admin, bot.tree.get_command(command))
+        await bot.tree.interaction_check(interaction)
+        await bot.tree.get_command(command).callback(interaction)
+        return interaction
+
+    async def dispatch(self, user, component, values=None):
+        """Run a component the way a process that never saw its view would: from the custom_id."""
+        interaction = FakeInteraction(user)
+        match = component.template.fullmatch(component.custom_id)
+        clicked = await type(component).from_custom_id(interaction, component.item, match)
+        if values is not None:
+            clicked.item._refresh_state(interaction, {"values": [str(value) for value in values]})
+        await clicked.callback(interaction)
+        return interaction
+
+    @staticmethod
+    def sent(interaction):
+        """(content, {custom_id prefix: component}) of the last message sent or edited."""
+        _kind, content, kwargs = interaction.calls[-1]
+        view = kwargs.get("view")
+        components = {child.custom_id.split(":")[1]: child for child in view.children} if view else {}
+        return content or kwargs.get("content"), components
+
+    async def click(self, admin, action, rec_id):
+        interaction = FakeInteraction(admin)
+        await discordbot.ValidationButton(action, rec_id).callback(interaction)
+        return interaction
+
+    def posted(self, admin):
+        """Receipt ids posted in the admin's DM, in order."""
+        return [int(kwargs["embed"].title.split("#")[1]) for _content, kwargs in admin.dm.sent if kwargs.get("embed")]
+
+    async def state(self, rec_id):
+        rows = await execute(self.storage, f"SELECT state FROM factures WHERE id = {int(rec_id)}", fetch=True)
+        return rows[0][0]
+
+    async def test_next_receipt_comes_from_the_db(self):
+        first, second, third, fourth, fifth = self.ids
+        await self.start(self.admin)
+        await self.click(self.admin, "accept", first)
+        self.assertEqual(self.posted(self.admin), [first, second])
+
+        # The click on #second lands on another process, with no look-ahead
+        lookahead, bot.review_lookahead = bot.review_lookahead, {}
+        await self.click(self.admin, "accept", second)
+        bot.review_lookahead = lookahead
+        self.assertEqual(self.posted(self.admin), [first, second, third])
+
+        # Back on the first process: nothing already decided comes back
+        for rec_id in (third, fourth, fifth):
+            await self.click(self.admin, "accept", rec_id)
+        self.assertEqual(self.posted(self.admin), [first, second, third, fourth, fifth])
+        self.assertEqual(self.admin.dm.sent[-1][0], "🎉 Validation terminée.")
+        for rec_id in self.ids:
+            self.assertEqual(await self.state(rec_id), "accepted")
+
+    async def test_repeat_click_does_not_post_another_receipt(self):
+        first, second, *_rest = self.ids
+        await self.start(self.admin)
+        await self.click(self.admin, "accept", first)
+        self.assertEqual(self.posted(self.admin), [first, second])
+
+        interaction = await self.click(self.admin, "accept", first)
+        self.assertIn("déjà traité", interaction.calls[-1][2]["content"])
+        self.assertEqual(self.posted(self.admin), [first, second])
+        self.assertEqual(await self.state(second), "pending")
+
+    async def test_stale_button_cannot_decide_another_admins_lease(self):
+        first, *_rest = self.ids
+        await self.start(self.admin)
+
+        interaction = await self.click(self.other, "refuse", first)
+        self.assertIn("déjà traité", interaction.calls[-1][2]["content"])
+        self.assertEqual(await self.state(first), "pending")
+        self.assertEqual(self.posted(self.other), [])
+
+    async def test_bulk_lot_clicks_need_no_view_in_memory(self):
+        first, second, third, fourth, fifth = self.ids
+        interaction = await self.start(self.admin, "validation_lot")
+        _content, components = self.sent(interaction)
+        self.assertEqual([option.value for option in components["pick"].item.options],
+                         [str(rec_id) for rec_id in self.ids])
+
+        # Pick, then accept: each click rebuilt from its custom_id, the selection read from the DB
+        await self.dispatch(self.admin, components["pick"], [first, third])
+        interaction = await self.dispatch(self.admin, components["accept"])
+        content, components = self.sent(interaction)
+        self.assertIn("Traités: ✅ 2 · ❌ 0", content)
+        self.assertEqual([option.value for option in components["pick"].item.options],
+                         [str(second), str(fourth), str(fifth)])
+        self.assertEqual([await self.state(rec_id) for rec_id in self.ids],
+                         ["accepted", "pending", "accepted", "pending", "pending"])
+
+        # Nothing picked in this lot yet
+        interaction = await self.dispatch(self.admin, components["refuse"])
+        self.assertIn("Sélectionne d'abord", interaction.calls[-1][1])
+
+        # Every receipt left was already shown: the next lot is empty and the leases go back
+        interaction = await self.dispatch(self.admin, components["next"])
+        content, components = self.sent(interaction)
+        self.assertIn("Plus aucun reçu", content)
+        self.assertIn("Traités: ✅ 2 · ❌ 0", content)
+        leases = await execute(self.storage, "SELECT COUNT(*) FROM factures WHERE lease_owner IS NOT NULL", fetch=True)
+        self.assertEqual(leases[0][0], 0)
+
+    async def test_recu_info_pages_need_no_view_in_memory(self):
+        now = datetime.now().replace(microsecond=0)
+        await execute(
+            self.storage,
+            "INSERT INTO factures (discord_id, amount, description, state, created_at) VALUES (%s, %s, %s, 'accepted', %s)",
+            [(MEMBER, 1, f"Vieux {i}", now - timedelta(days=1, minutes=i)) for i in range(20)]
+        )
+        newest_first = [row[0] for row in await execute(
+            self.storage, f"SELECT id FROM factures WHERE discord_id = {MEMBER} ORDER BY created_at DESC, id DESC", fetch=True
+        )]
+        member = FakeUser(MEMBER, "Max Membre")
+        size = discordbot.RECU_PAGE_SIZE
+
+        def shown(content):
+            return [int(line.split("`#")[1].split("`")[0]) for line in content.splitlines() if line.startswith("`#")]
+
+        content, components = self.sent(await self.start(member, "recu_info"))
+        self.assertEqual(shown(content), newest_first[:size])
+        self.assertIn("`20.00 $`", content)
+        self.assertTrue(components["prev"].item.disabled)
+
+        # 25 receipts: forward to the last page, then back, each click on a "fresh process"
+        content, components = self.sent(await self.dispatch(member, components["next"]))
+        self.assertEqual(shown(content), newest_first[size:2 * size])
+        content, components = self.sent(await self.dispatch(member, components["next"]))
+        self.assertEqual(shown(content), newest_first[2 * size:])
+        self.assertIn("(page 3)", content)
+        self.assertIn("`20.00 $`", content)
+        self.assertTrue(components["next"].item.disabled)
+
+        content, components = self.sent(await self.dispatch(member, components["prev"]))
+        self.assertEqual(shown(content), newest_first[size:2 * size])
+        self.assertIn("(page 2)", content)
+        content, components = self.sent(await self.dispatch(member, components["prev"]))
+        self.assertEqual(shown(content), newest_first[:size])
+        self.assertIn("(page 1)", content)
+        self.assertTrue(components["prev"].item.disabled)
+        self.assertFalse(components["next"].item.disabled)
+
+
+if __name__ == "__main__":
+    unittest.main()
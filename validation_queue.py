@@ -0,0 +1,88 @@
+# validation_queue.py
+
+# -------------------------------
+# Leased review queue for /validation
+# -------------------------------
+# Pending receipts are claimed in small batches by stamping them with the
+# reviewing admin and a lease expiry. A claim is one UPDATE ... LIMIT, so two
+# admins reviewing at the same time always get disjoint batches. Leases are
+# released when the session ends (End, timeout); a crashed session's leases
+# simply expire and the receipts go back to the queue.
+#
+# The whole review state lives in `factures` (lease + skipped_by), so a
+# ReviewQueue is cheap to rebuild for each button click, in any process.
+# The statements themselves are in the storage backends (`storage.factures`),
+# the lease columns come from migration 3.
+class ReviewQueue:
+    def __init__(self, factures, admin_id, batch_size=10, lease_seconds=900):
+        self.factures      = factures    # storage.factures
+        self.admin_id      = admin_id
+        self.batch_size    = batch_size
+        self.lease_seconds = lease_seconds
+        self.seen          = set()     # shown by this instance, never claimed again by it
+
+    async def claim(self):
+        """Lease the next batch of pending receipts not owned by this admin."""
+        batch = await self.factures.claim(self.admin_id, self.lease_seconds, self.batch_size, exclude=tuple(self.seen))
+        self.seen.update(rec[0] for rec in batch)
+        return batch
+
+    async def upcoming(self, limit):
+        """The next `limit` receipts leased to this admin, claiming a new batch when none are left."""
+        rows = await self.factures.leased(self.admin_id, limit)
+        return list(rows) or list(await self.claim())[:limit]
+
+    async def decide(self, rec_id, choice):
+        """Record the decision; returns the owner id, or None if the receipt was no longer
+        pending or is leased to another admin."""
+        return await self.factures.decide(rec_id, choice, self.admin_id, self.lease_seconds)
+
+    async def skip(self, rec_id):
+        """Hand a skipped receipt back to the other admins; this admin won't see it again this session."""
+        await self.factures.skip(rec_id, self.admin_id, self.lease_seconds)
+
+    async def release(self):
+        """End of session: leases go back to the queue and skipped receipts become reviewable again."""
+        await self.factures.release(self.admin_id)
+
+    async def own_pending(self):
+        """Ids of this admin's own pending receipts (they cannot validate them)."""
+        return await self.factures.own_pending(self.admin_id)
+
+    async def decide_many(self, rec_ids, choice):
+        """Apply one decision to many leased receipts in a single transaction.
+
+        Returns [(id, owner_id)] of the receipts actually decided: ones no
+        longer pending or no longer leased to this admin are left alone.
+        """
+        if not rec_ids:
+            return []
+        return list(await self.factures.decide_many(rec_ids, choice, self.admin_id, self.lease_seconds))
+
+    async def release_ids(self, rec_ids):
+        """Give back part of a batch (e.g. moving on to the next one)."""
+        if not rec_ids:
+            return
+        await self.factures.release_ids(rec_ids, self.admin_id)
+
+    # ── /validation_lot: the lot on screen and its selection live in `review_lots` ──
+    async def lot(self):
+        """[(receipt row, picked)] of the lot on screen that is still leased to this admin."""
+        return [(row[:-1], bool(row[-1])) for row in await self.factures.lot(self.admin_id)]
+
+    async def next_lot(self):
+        """Give back the lot on screen and lease the next one, never a receipt already shown this session."""
+        await self.release_ids([rec[0] for rec, _picked in await self.lot()])
+        self.seen.update(await self.factures.lot_seen(self.admin_id))
+        batch = await self.claim()
+        await self.factures.add_lot(self.admin_id, [rec[0] for rec in batch])
+        return [(rec, False) for rec in batch]
+
+    async def pick(self, rec_ids):
+        """Remember the receipts ticked in the lot's select menu."""
+        await self.factures.pick(self.admin_id, rec_ids)
+
+    async def end_lot(self):
+        """End of the lot session: its leases go back to the queue."""
+        await self.release_ids([rec[0] for rec, _picked in await self.lot()])
+        await self.factures.clear_lot(self.admin_id)